@@ -5,6 +5,10 @@ This will populate the database with realistic sample data for demonstration
 
 from app import create_app, db
 from app.models import User, Habit, Exercise, Food, HabitLog, ExerciseLog, FoodLog, WaterLog
+from app.badges import backfill_badges
+from app.energy import refresh_energy_profile
+from app.habits import rebuild_habit_streaks
+from app.summaries import rebuild_daily_summaries
 from werkzeug.security import generate_password_hash
 from datetime import datetime, timedelta
 import random
@@ -85,6 +89,9 @@ def add_sample_data():
         
         for user in users:
             db.session.add(user)
+        db.session.flush()
+        for user in users:
+            refresh_energy_profile(user)
         db.session.commit()
         print(f"✓ Added {len(users)} users")
         
@@ -195,6 +202,14 @@ def add_sample_data():
         db.session.commit()
         print(f"✓ Added {len(water_logs)} water logs")
         
+        # Logs were inserted directly, so backfill the daily rollups
+        rebuilt = rebuild_daily_summaries()
+        print(f"✓ Rebuilt {rebuilt} daily summaries")
+        streaks = rebuild_habit_streaks()
+        print(f"✓ Rebuilt streaks for {streaks} habits")
+        _, awarded = backfill_badges()
+        print(f"✓ Awarded {awarded} badges")
+        
         print("\n" + "=" * 60)
         print("SAMPLE DATA ADDED SUCCESSFULLY!")
         print("=" * 60)
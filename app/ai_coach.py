@@ -3,31 +3,350 @@ AI Fitness Coach using Hugging Face
 Provides personalized fitness advice and motivation
 """
 
-from huggingface_hub import InferenceClient
+import hashlib
 import os
 import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime, timedelta
+from flask import current_app
+
+from .coach_backends import (BackendUnavailable, BackendWarmingUp, backend_name_from_env, create_backend,
+                             model_from_env)
+from .coach_intents import router as fallback_router
+
+
+# ---------------------------------
+# Response cache
+# ---------------------------------
+
+class MemoryCacheBackend:
+    """In-process LRU cache with per-entry expiry (thread-safe)."""
+
+    name = 'memory'
+
+    def __init__(self, max_entries=512):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCacheBackend:
+    """On-disk cache in a SQLite table, shared by every worker on the host.
+
+    LRU is approximated with a last_used timestamp; expired rows and the
+    least recently used overflow are pruned on write.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path, max_entries=5000):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        with self._connect() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS ai_response_cache (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    expires_at REAL NOT NULL,
+                    last_used REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS ix_ai_cache_last_used ON ai_response_cache (last_used)")
+
+    @contextmanager
+    def _connect(self):
+        """One transaction on a fresh connection, closed afterwards.
+
+        (A bare ``with sqlite3.connect(...)`` commits but leaves the
+        connection open.)
+        """
+        conn = sqlite3.connect(self.path, timeout=5)
+        try:
+            conn.execute("PRAGMA journal_mode=WAL;")
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def get(self, key):
+        now = time.time()
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT value FROM ai_response_cache WHERE key = ? AND expires_at > ?", (key, now)
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute("UPDATE ai_response_cache SET last_used = ? WHERE key = ?", (now, key))
+            return row[0]
+
+    def set(self, key, value, ttl):
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO ai_response_cache (key, value, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now + ttl, now),
+            )
+            conn.execute("DELETE FROM ai_response_cache WHERE expires_at <= ?", (now,))
+            conn.execute("""
+                DELETE FROM ai_response_cache WHERE key IN (
+                    SELECT key FROM ai_response_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+                )
+            """, (self.max_entries,))
+
+    def __len__(self):
+        with self._connect() as conn:
+            return conn.execute("SELECT count(*) FROM ai_response_cache WHERE expires_at > ?", (time.time(),)).fetchone()[0]
+
+
+class ResponseCache:
+    """Caches model responses keyed on prompt, model and user context.
+
+    Keys are built from the whitespace/case-normalized prompt, the model id
+    and a hash of the user-context block, so two users (or one user whose
+    profile changed) never share an entry.
+    """
+
+    def __init__(self, backend, default_ttl=6 * 3600):
+        self.backend = backend
+        self.default_ttl = default_ttl
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(prompt, model, context=''):
+        normalized = ' '.join(prompt.split()).casefold()
+        context_hash = hashlib.sha256(context.encode('utf-8')).hexdigest()
+        return hashlib.sha256(f"{model}\0{normalized}\0{context_hash}".encode('utf-8')).hexdigest()
+
+    def get(self, key):
+        value = self.backend.get(key)
+        with self._lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        self.backend.set(key, value, ttl or self.default_ttl)
+
+    def stats(self):
+        return {
+            'backend': self.backend.name,
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self.backend),
+        }
+
+
+def cache_from_env():
+    """Build the response cache from AI_CACHE_* env vars (None if disabled)."""
+    backend_name = os.environ.get('AI_CACHE_BACKEND', 'memory').strip().lower()
+    max_entries = int(os.environ.get('AI_CACHE_MAX_ENTRIES', '512'))
+    ttl = int(os.environ.get('AI_CACHE_TTL', str(6 * 3600)))
+    if backend_name in ('', 'none', 'off'):
+        return None
+    if backend_name == 'sqlite':
+        default_path = os.path.join(os.path.dirname(__file__), '..', 'instance', 'ai_cache.sqlite')
+        backend = SQLiteCacheBackend(os.environ.get('AI_CACHE_PATH') or default_path, max_entries)
+    else:
+        backend = MemoryCacheBackend(max_entries)
+    return ResponseCache(backend, default_ttl=ttl)
+
+
+# ---------------------------------
+# Circuit breaker
+# ---------------------------------
+
+class CircuitOpenError(RuntimeError):
+    """Raised instead of calling the provider while the circuit is open."""
+
+
+class CircuitBreaker:
+    """Failure-rate circuit breaker for the Hugging Face provider.
+
+    closed: calls go through; outcomes are kept in a sliding window and the
+        circuit opens once at least ``min_calls`` are recorded and the
+        failure rate reaches ``failure_rate``.
+    open: calls are rejected immediately for ``cooldown`` seconds.
+    half-open: one probe call is let through; success closes the circuit,
+        failure re-opens it for another cooldown.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_rate=0.5, window=20, min_calls=4, cooldown=60):
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._outcomes = deque(maxlen=window)  # True = failure
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.cooldown:
+                return self.HALF_OPEN
+            return self._state
+
+    def allow(self):
+        """Return True if a call may be made now."""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                if time.monotonic() - self._opened_at < self.cooldown:
+                    return False
+                self._state = self.HALF_OPEN
+            # Half-open: a single probe at a time
+            if self._probe_in_flight:
+                return False
+            self._probe_in_flight = True
+            return True
+
+    def record_success(self):
+        """Record a successful call; returns True if it closed the circuit."""
+        with self._lock:
+            closed = self._state == self.HALF_OPEN
+            if closed:
+                self._state = self.CLOSED
+                self._outcomes.clear()
+                self._probe_in_flight = False
+            self._outcomes.append(False)
+            return closed
+
+    def release(self):
+        """Forget a call that ended without an outcome (e.g. the client left).
+
+        Frees the half-open probe slot so the next call can probe instead.
+        """
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            if self._state == self.HALF_OPEN:
+                self._trip()
+                return
+            self._outcomes.append(True)
+            if (len(self._outcomes) >= self.min_calls
+                    and sum(self._outcomes) / len(self._outcomes) >= self.failure_rate):
+                self._trip()
+
+    def _trip(self):
+        self._state = self.OPEN
+        self._opened_at = time.monotonic()
+        self._probe_in_flight = False
+        self._outcomes.clear()
+        print(f"AI coach circuit opened for {self.cooldown}s")
+
+
+def breaker_from_env():
+    return CircuitBreaker(
+        failure_rate=float(os.environ.get('AI_BREAKER_FAILURE_RATE', '0.5')),
+        window=int(os.environ.get('AI_BREAKER_WINDOW', '20')),
+        min_calls=int(os.environ.get('AI_BREAKER_MIN_CALLS', '4')),
+        cooldown=float(os.environ.get('AI_BREAKER_COOLDOWN', '60')),
+    )
+
+
+# ---------------------------------
+# Conversation history budget
+# ---------------------------------
+
+def estimate_tokens(text):
+    """Rough token count (~4 characters per token for English text)."""
+    return len(text) // 4 + 1
+
+
+def _message_tokens(message):
+    # Role markers and separators cost a few tokens per message
+    return estimate_tokens(message['content']) + 4
+
+
+def _clip(text, max_chars):
+    return text if len(text) <= max_chars else text[:max_chars].rstrip() + '…'
+
+
+def _seconds_until_midnight():
+    now = datetime.now()
+    midnight = datetime.combine(now.date() + timedelta(days=1), datetime.min.time())
+    return max(int((midnight - now).total_seconds()), 1)
+
 
 class FitnessCoach:
     """AI-powered fitness coach using Hugging Face"""
     
-    def __init__(self, api_key=None):
+    def __init__(self, api_key=None, backend=None):
         """
         Initialize the AI coach with Hugging Face API
         
         Args:
             api_key: Hugging Face API token (optional, can use free tier)
+            backend: Model backend name (see coach_backends; defaults to
+                AI_COACH_BACKEND). It is imported on first use.
         """
-        self.api_key = api_key or os.environ.get('HUGGINGFACE_API_KEY')
+        self.api_key = api_key
+        self.backend_name = backend or backend_name_from_env()
         # Choose model via env or default
-        self.model = os.environ.get('HUGGINGFACE_MODEL', "mistralai/Mistral-7B-Instruct-v0.2")
+        self.model = model_from_env(self.backend_name)
+        
+        # Latency budget per model call (also the HTTP timeout of each request)
+        self.call_budget = float(os.environ.get('AI_CALL_TIMEOUT', '15'))
         
-        # Initialize client if we have a token (HF Inference API)
+        # Created on first use so the provider SDK is only imported when needed
+        self._backend = None
+        self._backend_error = None
+        self._backend_lock = threading.Lock()
+
+        # Stop hammering a failing provider
+        self.breaker = breaker_from_env()
+
+        # Bound the prompt size however long a chat runs: recent turns are kept
+        # verbatim up to a token budget, older ones are folded into a short note
+        self.max_message_chars = int(os.environ.get('AI_MAX_MESSAGE_CHARS', '2000'))
+        self.history_max_messages = int(os.environ.get('AI_HISTORY_MAX_MESSAGES', '10'))
+        self.history_token_budget = int(os.environ.get('AI_HISTORY_TOKENS', '1200'))
+        self.summary_token_budget = int(os.environ.get('AI_HISTORY_SUMMARY_TOKENS', '150'))
+        self.max_request_bytes = int(os.environ.get('AI_MAX_REQUEST_BYTES', str(64 * 1024)))
+
+        # Cache for repeatable prompts (motivation, workout suggestions)
         try:
-            self.client = InferenceClient(token=self.api_key) if self.api_key else None
+            self.cache = cache_from_env()
         except Exception as e:
-            print(f"Failed to initialize Hugging Face client: {e}")
-            self.client = None
+            print(f"Failed to initialize AI response cache: {e}")
+            self.cache = None
         
     def get_system_prompt(self):
         """System prompt to guide the AI's behavior"""
@@ -65,6 +384,13 @@ User Profile:
 - Fitness Goal: {user.goal.replace('_', ' ').title() if user.goal else 'Not set'}
 - Activity Level: {user.activity_level.replace('_', ' ').title() if user.activity_level else 'Not set'}
 """
+        # Stored targets (app/energy.py), refreshed whenever the profile is saved
+        energy = getattr(user, 'energy_profile', None)
+        if energy is not None and energy.tdee is not None:
+            context += (f"- Daily Energy: BMR {energy.bmr:.0f} kcal, TDEE {energy.tdee:.0f} kcal, "
+                        f"target {energy.target_calories:.0f} kcal\n")
+        if energy is not None and energy.bmi is not None:
+            context += f"- BMI: {energy.bmi:.1f}\n"
         
         if recent_data:
             if recent_data.get('habits_completed'):
@@ -84,6 +410,194 @@ User Profile:
         
         return context
 
+    def _build_messages(self, user_message, user=None, recent_data=None, conversation_history=None):
+        """Assemble the chat messages sent to the model."""
+        messages = [
+            {"role": "system", "content": self.get_system_prompt()}
+        ]
+        
+        # Add user context if available
+        if user:
+            user_context = self.build_user_context(user, recent_data)
+            messages.append({
+                "role": "system", 
+                "content": f"Current user information:\n{user_context}"
+            })
+        
+        # Add conversation history if available
+        if conversation_history:
+            messages.extend(self.compact_history(conversation_history))
+        
+        # Add current user message
+        messages.append({"role": "user", "content": _clip(user_message, self.max_message_chars)})
+        return messages
+
+    def compact_history(self, history):
+        """
+        Fit client-supplied conversation history into the prompt budget.
+        
+        Keeps the most recent turns verbatim (at most history_max_messages,
+        within history_token_budget) and replaces everything older with one
+        system note listing the earlier questions, itself capped at
+        summary_token_budget. Malformed entries are dropped.
+        
+        Args:
+            history: List of {"role": "user"|"assistant", "content": str}
+        Returns:
+            List of messages to insert before the current user message
+        """
+        turns = [
+            {"role": m["role"], "content": _clip(m["content"], self.max_message_chars)}
+            for m in history
+            if isinstance(m, dict) and m.get("role") in ("user", "assistant")
+            and isinstance(m.get("content"), str) and m["content"].strip()
+        ]
+        
+        kept = []
+        used = 0
+        for message in reversed(turns):
+            cost = _message_tokens(message)
+            if len(kept) >= self.history_max_messages or used + cost > self.history_token_budget:
+                break
+            kept.append(message)
+            used += cost
+        kept.reverse()
+        # Don't open the window on an orphaned assistant reply
+        if kept and kept[0]["role"] == "assistant":
+            kept.pop(0)
+        
+        older = turns[:len(turns) - len(kept)]
+        if not older:
+            return kept
+        
+        # Extractive summary: the user's earlier questions, newest first
+        header = f"Summary of {len(older)} earlier messages in this conversation. The user previously asked about:"
+        budget = self.summary_token_budget - estimate_tokens(header)
+        topics = []
+        for message in reversed(older):
+            if message["role"] != "user":
+                continue
+            topic = "- " + _clip(" ".join(message["content"].split()), 120)
+            budget -= estimate_tokens(topic)
+            if budget < 0:
+                break
+            topics.append(topic)
+        if not topics:
+            return kept
+        note = {"role": "system", "content": "\n".join([header] + topics)}
+        return [note] + kept
+
+    @property
+    def backend(self):
+        """The model backend, or None if it is not configured or failed to load."""
+        if self._backend is None and self._backend_error is None:
+            with self._backend_lock:
+                if self._backend is None and self._backend_error is None:
+                    try:
+                        self._backend = create_backend(self.backend_name, self.model,
+                                                       api_key=self.api_key, timeout=self.call_budget)
+                    except BackendUnavailable as e:
+                        self._backend_error = e
+                    except Exception as e:
+                        print(f"Failed to initialize {self.backend_name} AI backend: {e}")
+                        self._backend_error = e
+        return self._backend
+
+    def _check_call_allowed(self):
+        backend = self.backend
+        if backend is None:
+            raise RuntimeError(f"AI backend unavailable: {self._backend_error}")
+        if not self.breaker.allow():
+            raise CircuitOpenError("AI provider circuit is open")
+        return backend
+
+    def _generate(self, messages):
+        """
+        Get a completion from the model backend for the given messages.
+        
+        Calls are refused while the circuit breaker is open and must finish
+        within the call budget.
+        
+        Returns:
+            Model response as string
+        Raises:
+            Exception if no model response could be obtained
+        """
+        backend = self._check_call_allowed()
+        try:
+            text = backend.generate(messages, time.monotonic() + self.call_budget)
+        except BackendWarmingUp:
+            # Not the provider's fault: free a probe slot without an outcome
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record_failure()
+            raise
+        except BaseException:
+            self.breaker.release()
+            raise
+        self._record_success(backend)
+        return text
+
+    def _record_success(self, backend):
+        if self.breaker.record_success() and hasattr(backend, 'reset'):
+            # Recovered: let the backend re-learn what works
+            backend.reset()
+
+    def _generate_stream(self, messages):
+        """
+        Stream a completion from the model backend, yielding text chunks as they arrive.
+        
+        Same circuit breaker and latency budget as _generate(). If the
+        consumer stops early (client disconnect), the call counts as a
+        success once text has arrived; otherwise it is released without an
+        outcome so a half-open probe slot is never left taken.
+        """
+        backend = self._check_call_allowed()
+        received = finished = failed = False
+        try:
+            for text in backend.stream(messages, time.monotonic() + self.call_budget):
+                received = True
+                yield text
+            finished = True
+        except BackendWarmingUp:
+            raise  # released below
+        except Exception:
+            failed = True
+            self.breaker.record_failure()
+            raise
+        finally:
+            if finished or (received and not failed):
+                self._record_success(backend)
+            elif not failed:
+                self.breaker.release()
+
+    def stream_chat(self, user_message, user=None, recent_data=None, conversation_history=None):
+        """
+        Streaming variant of chat(): yields the response in text chunks.
+        
+        If the model fails before sending anything, the fallback response is
+        streamed instead; if it fails midway, the partial answer is kept.
+        """
+        sent_any = False
+        try:
+            messages = self._build_messages(user_message, user, recent_data, conversation_history)
+            for text in self._generate_stream(messages):
+                sent_any = True
+                yield text
+            if sent_any:
+                return
+        except (CircuitOpenError, BackendWarmingUp):
+            pass
+        except Exception as e:
+            print(f"Hugging Face streaming error: {e}" + ("" if sent_any else " - using fallback"))
+            if sent_any:
+                return
+        
+        # Stream the canned answer word by word so the client renders it the same way
+        for piece in re.findall(r"\S+\s*|\s+", self._get_fallback_response(user_message, user)):
+            yield piece
+
     def chat(self, user_message, user=None, recent_data=None, conversation_history=None):
         """
         Send a message to the AI coach and get a response
@@ -97,75 +611,13 @@ User Profile:
         Returns:
             AI coach's response as string
         """
+        import requests
         try:
-            # Build the conversation
-            messages = [
-                {"role": "system", "content": self.get_system_prompt()}
-            ]
-            
-            # Add user context if available
-            if user:
-                user_context = self.build_user_context(user, recent_data)
-                messages.append({
-                    "role": "system", 
-                    "content": f"Current user information:\n{user_context}"
-                })
-            
-            # Add conversation history if available
-            if conversation_history:
-                messages.extend(conversation_history)
-            
-            # Add current user message
-            messages.append({"role": "user", "content": user_message})
-            
-            # Get response from Hugging Face (guarded)
-            import requests
-            try:
-                if not self.client:
-                    raise RuntimeError("HF client not initialized (no token)")
-                # First try OpenAI-style chat if supported by the model/endpoint
-                response = self.client.chat_completion(
-                    messages=messages,
-                    model=self.model,
-                    max_tokens=500,
-                    temperature=0.7
-                )
-                assistant_message = response.choices[0].message.content
-                return assistant_message.strip()
-            except Exception as hf_err:
-                print(f"Hugging Face chat_completion failed: {hf_err}. Trying text_generation...")
-                try:
-                    # Flatten chat into a single prompt for models that only support text-generation
-                    def to_prompt(msgs):
-                        parts = []
-                        role_map = {"system": "System", "user": "User", "assistant": "Assistant"}
-                        for m in msgs:
-                            role = role_map.get(m.get("role", "user"), "User")
-                            content = m.get("content", "").strip()
-                            if content:
-                                parts.append(f"{role}: {content}")
-                        parts.append("Assistant:")
-                        return "\n".join(parts)
-
-                    prompt = to_prompt(messages)
-                    tg = self.client.text_generation(
-                        prompt,
-                        model=self.model,
-                        max_new_tokens=500,
-                        temperature=0.7,
-                    )
-                    if isinstance(tg, str):
-                        return tg.strip()
-                    # Some clients return dict-like responses
-                    if isinstance(tg, dict) and tg.get("generated_text"):
-                        return tg["generated_text"].strip()
-                    # If response shape unexpected, fall back
-                    print("Unexpected text_generation response shape; using fallback")
-                    return self._get_fallback_response(user_message, user)
-                except Exception as tg_err:
-                    print(f"Hugging Face text_generation failed: {tg_err}. Using fallback.")
-                    return self._get_fallback_response(user_message, user)
-            
+            messages = self._build_messages(user_message, user, recent_data, conversation_history)
+            return self._generate(messages)
+        except (CircuitOpenError, BackendWarmingUp):
+            # Provider is known to be down (or still loading): answer offline without logging noise
+            return self._get_fallback_response(user_message, user)
         except requests.exceptions.Timeout:
             print("Hugging Face API timeout - using fallback")
             return self._get_fallback_response(user_message, user)
@@ -178,306 +630,49 @@ User Profile:
             return self._get_fallback_response(user_message, user)
     
     def _get_fallback_response(self, user_message, user=None):
-        """Provide a smart response if API fails"""
-        
-        message_lower = user_message.lower()
-
-        # 1) Exercise technique / form questions (e.g., "how to do burpees")
-        if (
-            re.search(r"\bhow\s+(to|do)\b", message_lower)
-            or any(k in message_lower for k in ["form", "technique", "tutorial", "proper form"]) 
-            or any(k in message_lower for k in [
-                "burpee", "push up", "push-up", "squat", "deadlift", "bench press",
-                "plank", "lunge", "shoulder press", "row", "curl", "tricep dip"
-            ])
-        ):
-            return self._exercise_instructions(message_lower, user)
-        
-        # Workout-related responses
-        if any(word in message_lower for word in ['workout', 'exercise', 'train', 'gym', 'fitness']):
-            if user and user.goal == 'lose_weight':
-                return """💪 Perfect timing to ask! For weight loss, here's your workout plan:
-
-**30-Minute Fat Burning Workout:**
-1. Warm-up (5 min): Light jogging or jumping jacks
-2. HIIT Circuit (20 min) - Do each for 45 sec, rest 15 sec:
-   • Burpees
-   • High knees
-   • Mountain climbers
-   • Jump squats
-   • Push-ups
-3. Cool-down (5 min): Stretching
-
-**Frequency:** 4-5 times per week
-**Tip:** Stay consistent and track your progress! 🔥"""
-            
-            elif user and user.goal == 'gain_muscle':
-                return """💪 Let's build some muscle! Here's your workout:
-
-**Strength Training (45 min):**
-**Upper Body:**
-• Bench Press: 4 sets x 8-10 reps
-• Pull-ups: 4 sets x 6-8 reps
-• Shoulder Press: 3 sets x 10 reps
-• Bicep Curls: 3 sets x 12 reps
-
-**Lower Body:**
-• Squats: 4 sets x 8-10 reps
-• Deadlifts: 4 sets x 6-8 reps
-• Leg Press: 3 sets x 12 reps
-
-**Frequency:** 4-5 days/week
-**Pro Tip:** Eat protein within 30 min post-workout! 🏋️"""
-            
-            else:
-                return """💪 Here's a balanced full-body workout for you:
-
-**40-Minute Complete Workout:**
-1. Warm-up (5 min): Dynamic stretching
-2. Circuit (30 min) - 3 rounds:
-   • Push-ups: 12 reps
-   • Squats: 15 reps
-   • Plank: 45 seconds
-   • Lunges: 10 each leg
-   • Dumbbell rows: 12 reps
-   • Rest: 60 seconds
-3. Cool-down (5 min): Static stretches
-
-Do this 3-4 times weekly for best results! 💯"""
-        
-        # Nutrition/diet responses
-        elif any(word in message_lower for word in ['food', 'eat', 'nutrition', 'diet', 'meal', 'calorie', 'protein']):
-            if user and user.goal == 'lose_weight':
-                return """🥗 Nutrition for Weight Loss:
-
-**Daily Calorie Target:** ~500 kcal deficit from maintenance
-
-**Meal Structure:**
-• **Breakfast:** Oatmeal with berries + eggs
-• **Lunch:** Grilled chicken salad with olive oil
-• **Dinner:** Baked fish with vegetables
-• **Snacks:** Greek yogurt, nuts (small portions)
-
-**Key Rules:**
-✅ Drink 3-4 liters water daily
-✅ Protein at every meal (keeps you full)
-✅ Avoid sugary drinks & processed foods
-✅ Eat slowly, track portions
-
-**Pro Tip:** Meal prep on Sundays for the week! 📝"""
-            
-            elif user and user.goal == 'gain_muscle':
-                return """🥗 Nutrition for Muscle Gain:
-
-**Daily Calorie Target:** ~300-500 kcal surplus
-
-**Meal Structure (5-6 meals):**
-• **Meal 1:** Eggs, oats, banana
-• **Meal 2:** Chicken, rice, vegetables
-• **Meal 3:** Tuna sandwich, apple
-• **Meal 4 (Pre-workout):** Protein shake, banana
-• **Meal 5 (Post-workout):** Chicken, sweet potato
-• **Meal 6:** Cottage cheese, nuts
-
-**Macros Target:**
-• Protein: 1.6-2g per kg bodyweight
-• Carbs: 4-6g per kg
-• Fats: 1g per kg
-
-**Muscle-Building Foods:** Chicken, eggs, fish, rice, oats, sweet potato 💪"""
-            
-            else:
-                return """🥗 Balanced Nutrition Guide:
-
-**Plate Method:**
-• 1/2 plate: Vegetables (colorful!)
-• 1/4 plate: Lean protein (chicken, fish, tofu)
-• 1/4 plate: Complex carbs (brown rice, quinoa)
-• Healthy fats: Olive oil, nuts, avocado
-
-**Daily Essentials:**
-✅ 8+ glasses water
-✅ 5 servings fruits/vegetables
-✅ Lean protein each meal
-✅ Whole grains over refined
-✅ Limit processed foods & sugar
-
-**Sample Day:**
-• Breakfast: Oats + banana + almonds
-• Lunch: Grilled chicken salad
-• Snack: Greek yogurt
-• Dinner: Salmon + quinoa + veggies
-
-Stay consistent and you'll see results! 🌟"""
-        
-        # Motivation responses
-        elif any(word in message_lower for word in ['motivate', 'inspire', 'lazy', 'tired', 'give up', 'quit', 'hard']):
-            return f"""🌟 Listen up, {user.name if user and user.name else 'Champion'}!
-
-**Remember This:**
-• You didn't come this far to only come this far
-• Every workout counts, even the short ones
-• Progress > Perfection
-• You're stronger than your excuses
-
-**Quick Motivation Boost:**
-1. Think about WHY you started
-2. Visualize your goal body/strength
-3. Remember how good you feel AFTER working out
-4. You'll regret NOT doing it, never regret doing it
-
-**Right Now:** Put on your workout clothes. Once you're dressed, you're 90% there! 💪
-
-The hardest part is starting - and you're already thinking about it. That's a win! Now GO! 🔥
-
-You've got this! 💯"""
+        """Provide a smart response if API fails (see coach_intents)"""
+        return fallback_router.respond(user_message, user)
+    
+    def cached_chat(self, user_message, user=None, recent_data=None, ttl=None, key_context=None):
+        """
+        Like chat(), but serve repeat prompts from the response cache.
         
-        # Progress/tips responses
-        elif any(word in message_lower for word in ['progress', 'improve', 'better', 'tip', 'advice', 'help']):
-            return """� Tips to Maximize Your Progress:
-
-**Workout Tips:**
-✅ Track everything (reps, weight, time)
-✅ Progressive overload (increase gradually)
-✅ Rest 48 hours between muscle groups
-✅ Get 7-9 hours sleep
-✅ Stay hydrated (3-4L water daily)
-
-**Nutrition Tips:**
-✅ Meal prep weekly
-✅ Protein with every meal
-✅ Don't skip breakfast
-✅ Eat within 30 min post-workout
-✅ Limit cheat meals to 1-2/week
-
-**Mental Game:**
-✅ Set SMART goals
-✅ Take progress photos monthly
-✅ Find a workout buddy
-✅ Celebrate small wins
-✅ Be patient - results take time
-
-**Remember:** Consistency beats intensity! Show up even when motivation is low. 🎯"""
+        Only real model responses are cached; fallbacks are not, so the coach
+        recovers as soon as the API does.
         
-        # Default personalized response
-        else:
-            user_name = user.name if user and user.name else user.username if user else 'there'
-            goal_text = ""
-            if user and user.goal:
-                goal_map = {
-                    'lose_weight': 'weight loss',
-                    'gain_muscle': 'muscle gain',
-                    'maintain_weight': 'maintaining fitness'
-                }
-                goal_text = f" I see your goal is {goal_map.get(user.goal, 'fitness')}."
-            
-            return f"""👋 Hey {user_name}!{goal_text}
-
-I'm your AI fitness coach, here to help with:
-
-🏋️ **Workouts** - Custom plans for your goals
-🥗 **Nutrition** - Meal plans and diet advice  
-💪 **Motivation** - Keep you fired up
-📊 **Progress** - Tips to see results faster
-
-**Try asking me:**
-• "Give me a workout for today"
-• "What should I eat to reach my goal?"
-• "I need motivation to stay consistent"
-• "How can I see results faster?"
-
-I'm here 24/7 to help you crush your fitness goals! What would you like to know? 💪"""
-
-    def _exercise_instructions(self, message_lower, user=None):
-        def steps(title, bullets, tips=None):
-            tips_text = f"\n\nPro tips:\n- " + "\n- ".join(tips) if tips else ""
-            return f"""📘 {title}
-
-1) {bullets[0]}
-2) {bullets[1]}
-3) {bullets[2]}
-4) {bullets[3]}
-5) {bullets[4]}{tips_text}
-
-Want a short demo GIF or common mistakes to avoid?"""
-
-        if "burpee" in message_lower:
-            return steps(
-                "How to do a Burpee (full-body)",
-                [
-                    "Start standing, feet shoulder-width, core tight",
-                    "Squat down and place hands on floor in front of you",
-                    "Jump feet back into a plank (body straight, don’t sag)",
-                    "Do an optional push-up, then jump feet back to hands",
-                    "Explode upward into a jump, arms overhead"
-                ],
-                tips=[
-                    "Keep your chest up as you drop into the squat",
-                    "Brace your core during the plank to protect your lower back",
-                    "Scale it: step back instead of jumping, or skip the push-up"
-                ]
-            )
-
-        if "push" in message_lower and ("up" in message_lower or "push-up" in message_lower):
-            return steps(
-                "Proper Push-up Form",
-                [
-                    "Hands under shoulders, body in a straight line",
-                    "Screw palms into the floor to engage lats",
-                    "Lower chest towards floor, elbows ~45° from body",
-                    "Keep core and glutes tight to avoid sagging",
-                    "Press back up, fully extend without locking elbows"
-                ],
-                tips=["If tough, elevate hands on a bench; if easy, add tempo or weight"]
-            )
+        Args:
+            key_context: Text hashed into the cache key instead of the full
+                user-context block (e.g. to ignore today's running totals)
+        """
+        if not self.cache:
+            return self.chat(user_message, user, recent_data)
 
-        if "squat" in message_lower:
-            return steps(
-                "Bodyweight Squat Basics",
-                [
-                    "Stand shoulder-width, toes slightly out",
-                    "Brace core and keep chest tall",
-                    "Push hips back and bend knees, tracking over toes",
-                    "Descend until thighs are at least parallel",
-                    "Drive through mid-foot to stand up"
-                ],
-                tips=["Knees track with toes, don’t cave in; keep heels down"]
-            )
+        if key_context is None:
+            key_context = self.build_user_context(user, recent_data) if user else ''
+        key = self.cache.make_key(user_message, self.model, key_context)
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
 
-        if "deadlift" in message_lower:
-            return steps(
-                "Conventional Deadlift Cues",
-                [
-                    "Feet hip-width, bar over mid-foot",
-                    "Grip just outside knees, brace belly",
-                    "Hips higher than squat, chest up, back neutral",
-                    "Push floor away, bar stays close/shaves shins",
-                    "Lock out by squeezing glutes, don’t lean back"
-                ],
-                tips=["If rounding, reduce load; think ‘proud chest’"]
-            )
-
-        if "bench" in message_lower and "press" in message_lower:
-            return steps(
-                "Barbell Bench Press Essentials",
-                [
-                    "Feet planted, slight arch, shoulder blades pinched",
-                    "Grip so forearms are vertical at bottom",
-                    "Unrack and set the bar over upper chest",
-                    "Lower to mid/low chest, elbows ~45°",
-                    "Press up, keep wrists straight and shoulder blades tight"
-                ],
-                tips=["Use a spotter; touch chest softly—don’t bounce"]
-            )
+        messages = self._build_messages(user_message, user, recent_data)
+        try:
+            response = self._generate(messages)
+        except (CircuitOpenError, BackendWarmingUp):
+            return self._get_fallback_response(user_message, user)
+        except Exception as e:
+            print(f"Hugging Face API error: {e} - using fallback")
+            return self._get_fallback_response(user_message, user)
+        self.cache.set(key, response, ttl)
+        return response
 
-        # Generic technique help
-        return "🧭 Tell me the exercise name (e.g., burpees, squats, deadlift), and I’ll give you step-by-step form cues and tips!"
-    
     def get_daily_motivation(self, user, recent_data=None):
         """Generate a personalized daily motivation message"""
         prompt = f"Give {user.name or user.username} a brief motivational message to start their day. Consider their goal: {user.goal}. Keep it to 2-3 sentences and inspiring! 💪"
         
-        return self.chat(prompt, user, recent_data)
+        # One message per user per day: key on the profile and date rather
+        # than today's running totals, and expire at midnight
+        key_context = self.build_user_context(user) + f"\nDate: {datetime.now().date().isoformat()}"
+        return self.cached_chat(prompt, user, recent_data, ttl=_seconds_until_midnight(), key_context=key_context)
     
     def analyze_progress(self, user, weekly_data):
         """Analyze user's weekly progress and provide feedback"""
@@ -498,7 +693,7 @@ Provide brief feedback and suggestions for next week."""
         if preferences:
             prompt += f" Preferences: {preferences}"
         
-        return self.chat(prompt, user)
+        return self.cached_chat(prompt, user)
     
     def answer_nutrition_question(self, user, food_item):
         """Answer questions about specific foods"""
@@ -507,6 +702,31 @@ Provide brief feedback and suggestions for next week."""
         return self.chat(prompt, user)
 
 
+_coach_lock = threading.Lock()
+
+
+def get_coach():
+    """Return the app-scoped FitnessCoach, creating it on first use.
+
+    One coach (and so one model backend) is shared by every request and
+    thread in the process; see coach_backends for why that matters.
+    """
+    coach = current_app.extensions.get('fitness_coach')
+    if coach is None:
+        with _coach_lock:
+            coach = current_app.extensions.get('fitness_coach')
+            if coach is None:
+                coach = FitnessCoach()
+                current_app.extensions['fitness_coach'] = coach
+    return coach
+
+
+def reset_coach():
+    """Drop the shared coach so the next get_coach() re-reads env settings."""
+    with _coach_lock:
+        current_app.extensions.pop('fitness_coach', None)
+
+
 # Alternative: Use OpenAI-compatible API (if user has key)
 class FitnessCoachOpenAI:
     """Alternative coach using OpenAI API (requires API key). Not used by default."""
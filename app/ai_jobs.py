@@ -0,0 +1,195 @@
+"""
+Background execution of AI coach calls.
+
+In async mode ``/ai-coach/chat`` submits the model call to a bounded thread
+pool and returns a job id at once; the client polls
+``/ai-coach/jobs/<job_id>`` for the answer. A slow Hugging Face call then
+occupies a pool thread instead of a request worker, and the pool size,
+queue depth and per-user limits cap how much of the box AI traffic can take.
+"""
+
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from types import SimpleNamespace
+
+from flask import current_app
+
+
+class QueueFull(Exception):
+    """The pool already has the maximum number of queued jobs."""
+
+
+class UserLimitReached(Exception):
+    """The user already has the maximum number of active jobs."""
+
+
+class CoachJob:
+    def __init__(self, owner, fallback, timeout):
+        self.id = uuid.uuid4().hex
+        self.owner = owner
+        self.fallback = fallback
+        self.created_at = time.time()
+        self.deadline = self.created_at + timeout
+        self.started_at = None
+        self.finished_at = None
+        self.returned_at = None  # when _run() gave its pool thread back
+        self.response = None
+        self.timed_out = False
+
+    @property
+    def done(self):
+        return self.finished_at is not None
+
+    @property
+    def active(self):
+        """Still queued, or still holding a pool thread (even if answered by the timeout)."""
+        return not self.done or (self.started_at is not None and self.returned_at is None)
+
+    def to_dict(self):
+        data = {'job_id': self.id, 'status': 'done' if self.done else ('running' if self.started_at else 'queued')}
+        if self.done:
+            data['response'] = self.response
+            data['timed_out'] = self.timed_out
+        return data
+
+
+class CoachJobQueue:
+    """Bounded worker pool for AI coach calls with per-user limits."""
+
+    def __init__(self, max_workers=4, max_queue=32, per_user_limit=2, timeout=20, result_ttl=600):
+        self.max_queue = max_queue
+        self.per_user_limit = per_user_limit
+        self.timeout = timeout
+        self.result_ttl = result_ttl
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-coach')
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self.completed = 0
+        self.timeouts = 0
+
+    def submit(self, owner, call, fallback):
+        """Queue ``call()``; ``fallback()`` answers if it fails or times out.
+
+        Raises:
+            UserLimitReached: ``owner`` already has per_user_limit active jobs; a
+                timed-out job counts until its call has actually returned
+            QueueFull: max_queue jobs are already waiting for a worker
+        """
+        job = CoachJob(owner, fallback, self.timeout)
+        self._expire_overdue()
+        with self._lock:
+            self._prune()
+            if sum(1 for j in self._jobs.values() if j.owner == owner and j.active) >= self.per_user_limit:
+                raise UserLimitReached()
+            if sum(1 for j in self._jobs.values() if j.started_at is None) >= self.max_queue:
+                raise QueueFull()
+            self._jobs[job.id] = job
+        self._executor.submit(self._run, job, call)
+        return job
+
+    def _run(self, job, call):
+        job.started_at = time.time()
+        try:
+            if job.started_at >= job.deadline:
+                # Waited in the queue past its deadline; the poller has given up
+                response = job.fallback()
+            else:
+                try:
+                    response = call()
+                except Exception as e:
+                    print(f"AI coach job {job.id} failed: {e} - using fallback")
+                    response = job.fallback()
+            self._finish(job, response)
+        finally:
+            job.returned_at = time.time()
+
+    def _finish(self, job, response, timed_out=False):
+        with self._lock:
+            if job.done:
+                return  # already answered by the timeout path
+            job.response = response
+            job.timed_out = timed_out
+            job.finished_at = time.time()
+            self.completed += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def get(self, job_id, owner):
+        """Return the job if it belongs to ``owner``; applies the timeout."""
+        self._expire_overdue()
+        with self._lock:
+            self._prune()
+            job = self._jobs.get(job_id)
+        if job is None or job.owner != owner:
+            return None
+        return job
+
+    def _expire_overdue(self):
+        """Answer every unfinished job past its deadline with its fallback."""
+        now = time.time()
+        with self._lock:
+            overdue = [j for j in self._jobs.values() if not j.done and now >= j.deadline]
+        for job in overdue:
+            self._finish(job, job.fallback(), timed_out=True)
+
+    def _prune(self):
+        cutoff = time.time() - self.result_ttl
+        for job_id in [j.id for j in self._jobs.values()
+                       if j.done and not j.active and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+    def stats(self):
+        self._expire_overdue()
+        with self._lock:
+            self._prune()
+            jobs = list(self._jobs.values())
+        return {
+            'queue_depth': sum(1 for j in jobs if j.started_at is None),
+            'running': sum(1 for j in jobs if j.started_at is not None and j.returned_at is None),
+            'completed': self.completed,
+            'timeouts': self.timeouts,
+            'max_queue': self.max_queue,
+        }
+
+
+_queue_lock = threading.Lock()
+
+
+def async_mode_enabled():
+    return os.environ.get('AI_COACH_ASYNC', 'false').strip().lower() in ('1', 'true', 'yes')
+
+
+def get_job_queue():
+    """Return the app-scoped job queue, creating it on first use."""
+    queue = current_app.extensions.get('ai_job_queue')
+    if queue is None:
+        with _queue_lock:
+            queue = current_app.extensions.get('ai_job_queue')
+            if queue is None:
+                queue = CoachJobQueue(
+                    max_workers=int(os.environ.get('AI_JOBS_WORKERS', '4')),
+                    max_queue=int(os.environ.get('AI_JOBS_MAX_QUEUE', '32')),
+                    per_user_limit=int(os.environ.get('AI_JOBS_PER_USER', '2')),
+                    timeout=float(os.environ.get('AI_JOBS_TIMEOUT', '20')),
+                )
+                current_app.extensions['ai_job_queue'] = queue
+    return queue
+
+
+def snapshot_user(user):
+    """Copy the profile fields the coach reads, for use outside the request.
+
+    Worker threads have no app context or DB session, so they must not touch
+    the SQLAlchemy user object.
+    """
+    if user is None:
+        return None
+    fields = ('id', 'username', 'name', 'age', 'gender', 'height', 'weight', 'activity_level', 'goal')
+    snapshot = SimpleNamespace(**{field: getattr(user, field, None) for field in fields})
+    energy = getattr(user, 'energy_profile', None)
+    snapshot.energy_profile = None if energy is None else SimpleNamespace(
+        bmr=energy.bmr, tdee=energy.tdee, bmi=energy.bmi, target_calories=energy.target_calories)
+    return snapshot
@@ -0,0 +1,271 @@
+"""
+Achievement badges, awarded from write events.
+
+Each badge is a rule in ``RULES``: once the user's counter ``counter``
+reaches ``threshold`` the badge ``key`` is earned. Counters live in
+``BadgeCounter`` (one row per user and counter) and move with the write
+that changes them, in the same transaction:
+
+    record_progress(user_id, foods_logged=1)     # running totals
+    record_best(user_id, best_habit_streak=12)   # high-water marks
+
+Both are single upserts, so concurrent writers do not lose updates, and
+they only look at the rules of the counters they touched; nothing rescans
+the log tables. Awarding is idempotent: Badge has a unique (user_id, key)
+index and badges are inserted with ON CONFLICT DO NOTHING, so replays and
+races never award twice.
+
+``backfill_badges()`` rebuilds the counters from history in chunks of users
+and awards whatever they already qualify for. Run it (backfill_badges.py)
+after adding rules or importing data directly.
+"""
+
+from collections import namedtuple
+from datetime import date
+
+from . import db, dialect_insert
+from .models import (Badge, BadgeCounter, ExerciseSet, FoodLog, Friendship, Habit, User,
+                     DailySummary, Workout, WorkoutExercise)
+
+# Daily water intake that counts as meeting the goal (matches water.html)
+WATER_GOAL_ML = 2500
+
+# Users processed per transaction by backfill_badges()
+BACKFILL_CHUNK_SIZE = 500
+
+_AWARD_BATCH = 1000
+
+BadgeRule = namedtuple('BadgeRule', 'key name description counter threshold')
+
+RULES = {}
+
+
+def register_rule(key, name, description, counter, threshold):
+    """Add a badge rule to the registry.
+
+    Args:
+        key: Stable identifier stored on awarded Badge rows
+        name: Display name
+        description: One-line explanation shown with the badge
+        counter: BadgeCounter name the rule reads
+        threshold: Counter value that earns the badge
+    """
+    if key in RULES:
+        raise ValueError(f"Duplicate badge rule: {key}")
+    RULES[key] = BadgeRule(key, name, description, counter, threshold)
+    return RULES[key]
+
+
+for threshold, name in ((7, 'Week Streak'), (30, 'Month Streak'), (100, 'Century Streak')):
+    register_rule(f'habit_streak_{threshold}', name,
+                  f'Kept a habit going for {threshold} days in a row', 'best_habit_streak', threshold)
+for threshold, name in ((1, 'First Bite'), (100, 'Food Diary'), (1000, 'Nutrition Pro')):
+    register_rule(f'foods_logged_{threshold}', name,
+                  f'Logged {threshold} meal{"s" if threshold != 1 else ""}', 'foods_logged', threshold)
+for threshold, name in ((1, 'Hydrated'), (7, 'Water Week'), (30, 'Water Month')):
+    register_rule(f'water_goal_{threshold}', name,
+                  f'Reached the {WATER_GOAL_ML} ml water goal on {threshold} '
+                  f'day{"s" if threshold != 1 else ""}', 'water_goal_days', threshold)
+for threshold, name in ((1, 'First Workout'), (10, 'Regular'), (50, 'Dedicated'), (100, 'Iron Habit')):
+    register_rule(f'workouts_{threshold}', name,
+                  f'Finished {threshold} workout{"s" if threshold != 1 else ""}', 'workouts_finished', threshold)
+for threshold, name in ((100, 'Set Builder'), (1000, 'Set Machine')):
+    register_rule(f'sets_{threshold}', name, f'Logged {threshold} sets', 'sets_logged', threshold)
+for threshold, name in ((10_000, 'Ten Tonnes'), (100_000, 'Hundred Tonnes'), (1_000_000, 'Megalifter')):
+    register_rule(f'volume_{threshold}', name,
+                  f'Lifted {threshold:,} kg in total (reps x weight)', 'volume_kg', threshold)
+for threshold, name in ((1, 'Buddy'), (5, 'Squad'), (25, 'Community')):
+    register_rule(f'friends_{threshold}', name,
+                  f'Made {threshold} friend{"s" if threshold != 1 else ""}', 'friends', threshold)
+
+
+def _rules_for(counter):
+    return [rule for rule in RULES.values() if rule.counter == counter]
+
+
+def _award(user_rules):
+    """Insert badges for ``[(user_id, rule)]``, skipping ones already earned.
+
+    Returns:
+        ``[(user_id, rule)]`` for the badges actually inserted.
+    """
+    today = date.today()
+    inserted = []
+    # Batched to stay under SQLite's bound-parameter limit
+    for start in range(0, len(user_rules), _AWARD_BATCH):
+        stmt = dialect_insert(Badge).values([
+            {'user_id': user_id, 'key': rule.key, 'name': rule.name,
+             'description': rule.description, 'date_earned': today}
+            for user_id, rule in user_rules[start:start + _AWARD_BATCH]
+        ])
+        inserted += db.session.execute(
+            stmt.on_conflict_do_nothing(index_elements=['user_id', 'key'])
+            .returning(Badge.user_id, Badge.key)
+        ).all()
+    return [(user_id, RULES[key]) for user_id, key in inserted]
+
+
+def record_progress(user_id, **amounts):
+    """Add ``amounts`` to the user's counters and award any badge crossed.
+
+    Does not commit: callers commit together with the write that caused it.
+    Negative amounts (e.g. removing a friend) never take a badge away.
+
+    Returns:
+        List of BadgeRule for the badges this call awarded.
+    """
+    amounts = {counter: amount for counter, amount in amounts.items() if amount}
+    if not amounts:
+        return []
+    stmt = dialect_insert(BadgeCounter).values([
+        {'user_id': user_id, 'name': counter, 'value': amount} for counter, amount in amounts.items()
+    ])
+    rows = db.session.execute(
+        stmt.on_conflict_do_update(index_elements=['user_id', 'name'],
+                                   set_={'value': BadgeCounter.value + stmt.excluded.value})
+        .returning(BadgeCounter.name, BadgeCounter.value)
+    ).all()
+    crossed = [(user_id, rule) for counter, value in rows for rule in _rules_for(counter)
+               if value - amounts[counter] < rule.threshold <= value]
+    return [rule for _, rule in _award(crossed)]
+
+
+def record_best(user_id, **values):
+    """Raise the user's high-water-mark counters to ``values`` if higher.
+
+    Does not commit. Only a new best can earn a badge, so repeating or
+    lowering a value costs one no-op upsert.
+
+    Returns:
+        List of BadgeRule for the badges this call awarded.
+    """
+    if not values:
+        return []
+    stmt = dialect_insert(BadgeCounter).values([
+        {'user_id': user_id, 'name': counter, 'value': value} for counter, value in values.items()
+    ])
+    rows = db.session.execute(
+        stmt.on_conflict_do_update(index_elements=['user_id', 'name'],
+                                   set_={'value': stmt.excluded.value},
+                                   where=BadgeCounter.value < stmt.excluded.value)
+        .returning(BadgeCounter.name, BadgeCounter.value)
+    ).all()
+    # The previous best is unknown here; _award() skips badges already held
+    due = [(user_id, rule) for counter, value in rows for rule in _rules_for(counter)
+           if rule.threshold <= value]
+    return [rule for _, rule in _award(due)]
+
+
+def set_volume(reps, weight):
+    """Volume of one set in kg (reps x weight); 0 if either is missing."""
+    try:
+        return float(reps or 0) * float(weight or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def record_sets(user_id, sets):
+    """Count logged sets and their volume.
+
+    Args:
+        user_id: Owner of the workout
+        sets: Iterable of dicts with (optional) reps and weight
+    """
+    sets = list(sets)
+    return record_progress(user_id, sets_logged=len(sets),
+                           volume_kg=sum(set_volume(s.get('reps'), s.get('weight')) for s in sets))
+
+
+def record_water_intake(user_id, day_total_ml, amount_ml):
+    """Count a goal day when this log takes the day's water across the goal.
+
+    Args:
+        user_id: User who logged the water
+        day_total_ml: The day's total including this log
+        amount_ml: Amount of this log
+    """
+    if day_total_ml - (amount_ml or 0) < WATER_GOAL_ML <= day_total_ml:
+        return record_progress(user_id, water_goal_days=1)
+    return []
+
+
+def award_due_badges(*user_ids):
+    """Award every badge the users' stored counters already qualify for.
+
+    Reads only BadgeCounter, not history. Does not commit.
+
+    Returns:
+        ``[(user_id, BadgeRule)]`` for the badges awarded.
+    """
+    counters = db.session.execute(db.select(BadgeCounter.user_id, BadgeCounter.name, BadgeCounter.value)
+                                  .where(BadgeCounter.user_id.in_(user_ids)))
+    return _award([(user_id, rule) for user_id, counter, value in counters
+                   for rule in _rules_for(counter) if rule.threshold <= value])
+
+
+def _history_counters(user_ids):
+    """Compute ``{(user_id, counter): value}`` from history for ``user_ids``."""
+    counters = {}
+
+    def add(rows, counter):
+        for user_id, value in rows:
+            if value:
+                key = (user_id, counter)
+                counters[key] = counters.get(key, 0) + value
+
+    add(db.session.query(FoodLog.user_id, db.func.count(FoodLog.id))
+        .filter(FoodLog.user_id.in_(user_ids)).group_by(FoodLog.user_id), 'foods_logged')
+    # Per-day water totals come from the rollup table
+    add(db.session.query(DailySummary.user_id, db.func.count(DailySummary.id))
+        .filter(DailySummary.user_id.in_(user_ids), DailySummary.water_ml >= WATER_GOAL_ML)
+        .group_by(DailySummary.user_id), 'water_goal_days')
+    add(db.session.query(Habit.user_id, db.func.max(Habit.longest_streak))
+        .filter(Habit.user_id.in_(user_ids)).group_by(Habit.user_id), 'best_habit_streak')
+    add(db.session.query(Workout.user_id, db.func.count(Workout.id))
+        .filter(Workout.user_id.in_(user_ids), Workout.duration.isnot(None))
+        .group_by(Workout.user_id), 'workouts_finished')
+
+    set_rows = db.session.query(
+        Workout.user_id, db.func.count(ExerciseSet.id),
+        db.func.sum(db.func.coalesce(ExerciseSet.reps, 0) * db.func.coalesce(ExerciseSet.weight, 0)),
+    ).join(WorkoutExercise, WorkoutExercise.workout_id == Workout.id).join(
+        ExerciseSet, ExerciseSet.workout_exercise_id == WorkoutExercise.id
+    ).filter(Workout.user_id.in_(user_ids)).group_by(Workout.user_id).all()
+    add(((user_id, count) for user_id, count, _ in set_rows), 'sets_logged')
+    add(((user_id, volume) for user_id, _, volume in set_rows), 'volume_kg')
+
+    for column in (Friendship.user_a_id, Friendship.user_b_id):
+        add(db.session.query(column, db.func.count(Friendship.id))
+            .filter(column.in_(user_ids)).group_by(column), 'friends')
+    return counters
+
+
+def backfill_badges(chunk_size=BACKFILL_CHUNK_SIZE):
+    """Rebuild every user's counters from history and award earned badges.
+
+    Walks users in id order, ``chunk_size`` at a time, committing each
+    chunk. Counters are replaced, so run it while the app is quiet or
+    accept that events landing mid-chunk may be recounted on the next run.
+
+    Returns:
+        (users processed, badges awarded)
+    """
+    users = awarded = 0
+    last_id = 0
+    while True:
+        user_ids = list(db.session.scalars(
+            db.select(User.id).where(User.id > last_id).order_by(User.id).limit(chunk_size)))
+        if not user_ids:
+            break
+        counters = _history_counters(user_ids)
+        db.session.execute(db.delete(BadgeCounter).where(BadgeCounter.user_id.in_(user_ids)))
+        if counters:
+            db.session.execute(db.insert(BadgeCounter), [
+                {'user_id': user_id, 'name': counter, 'value': value}
+                for (user_id, counter), value in counters.items()
+            ])
+        awarded += len(award_due_badges(*user_ids))
+        db.session.commit()
+        users += len(user_ids)
+        last_id = user_ids[-1]
+    return users, awarded
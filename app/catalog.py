@@ -0,0 +1,170 @@
+"""
+Process-level cache of the Exercise and Food reference catalogs.
+
+The catalogs almost never change, but several views used to reload them on
+every request. Each worker now keeps one pre-grouped snapshot per catalog,
+tagged with the version number stored in ``catalog_version``. Every writer
+(``manage_exercise_videos()``, the startup seeding and the populate_*
+scripts) calls ``bump_catalog_version()`` before committing; workers read
+the version row at most every CATALOG_CHECK_INTERVAL seconds (default 5)
+and reload only when it has moved. The process that made the write drops
+its own snapshot as soon as the transaction commits.
+
+Snapshots hold plain SimpleNamespace copies of the rows, not ORM objects, so
+they are safe to share between requests and threads. Use ``db.session.get``
+when a route needs a live row to modify or relate to.
+"""
+
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import db, dialect_insert
+from .models import CatalogVersion, Exercise, Food
+
+EXERCISE = 'exercise'
+FOOD = 'food'
+
+_EXERCISE_FIELDS = ('id', 'name', 'category', 'muscle_group', 'equipment', 'description',
+                    'instructions', 'calories_per_minute', 'video_url')
+_FOOD_FIELDS = ('id', 'name', 'category', 'calories_per_serving', 'serving_size', 'description')
+
+# session.info key: catalogs to drop from the cache when the session commits
+_STALE_CATALOGS = 'stale_catalogs'
+
+_cache_lock = threading.Lock()
+
+
+def _cache():
+    """App-scoped ``{catalog name: (checked_at, snapshot)}``.
+
+    Also holds ``'generation'``, bumped whenever snapshots are dropped, so a
+    load that raced a commit is not stored.
+    """
+    cache = current_app.extensions.get('catalog_cache')
+    if cache is None:
+        with _cache_lock:
+            cache = current_app.extensions.setdefault('catalog_cache', {'generation': 0})
+    return cache
+
+
+@event.listens_for(Session, 'after_commit')
+def _drop_committed_catalogs(session):
+    names = session.info.pop(_STALE_CATALOGS, None)
+    if names and has_app_context():
+        cache = _cache()
+        with _cache_lock:
+            cache['generation'] += 1
+            for name in names:
+                cache.pop(name, None)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_stale_catalogs(session):
+    session.info.pop(_STALE_CATALOGS, None)
+
+
+def _stored_version(name):
+    return db.session.scalar(
+        db.select(CatalogVersion.version).where(CatalogVersion.name == name)
+    ) or 0
+
+
+def _rows(model, fields):
+    columns = [getattr(model, field) for field in fields]
+    query = db.select(*columns).order_by(model.category, model.name)
+    return [SimpleNamespace(**row._asdict()) for row in db.session.execute(query)]
+
+
+def _load_exercises(version):
+    exercises = _rows(Exercise, _EXERCISE_FIELDS)
+    by_category = {}
+    by_name = {}
+    for exercise in exercises:
+        by_category.setdefault(exercise.category, []).append(exercise)
+        # First match wins, like the case-insensitive name lookups it replaces
+        by_name.setdefault(exercise.name.lower(), exercise)
+    return SimpleNamespace(
+        version=version,
+        exercises=exercises,
+        by_category=by_category,
+        by_id={exercise.id: exercise for exercise in exercises},
+        by_name=by_name,
+    )
+
+
+def _load_foods(version):
+    foods = _rows(Food, _FOOD_FIELDS)
+    return SimpleNamespace(
+        version=version,
+        categories=sorted({food.category for food in foods}),
+        by_id={food.id: food for food in foods},
+    )
+
+
+_LOADERS = {EXERCISE: _load_exercises, FOOD: _load_foods}
+
+
+def _catalog(name):
+    interval = float(os.environ.get('CATALOG_CHECK_INTERVAL', '5'))
+    cache = _cache()
+    now = time.monotonic()
+    entry = cache.get(name)
+    if entry and now - entry[0] < interval:
+        return entry[1]
+
+    # Read the version before the rows: a write landing in between leaves an
+    # older tag on newer data, which only costs one extra reload
+    generation = cache['generation']
+    version = _stored_version(name)
+    if entry and entry[1].version == version:
+        snapshot = entry[1]
+    else:
+        snapshot = _LOADERS[name](version)
+    with _cache_lock:
+        if cache['generation'] == generation:
+            cache[name] = (now, snapshot)
+    return snapshot
+
+
+def exercise_catalog():
+    """Return the cached exercise catalog.
+
+    Returns:
+        SimpleNamespace with version, exercises (ordered by category and
+        name), by_category, by_id and by_name (lowercased name)
+    """
+    return _catalog(EXERCISE)
+
+
+def food_catalog():
+    """Return the cached food catalog.
+
+    Returns:
+        SimpleNamespace with version, categories (sorted) and by_id
+    """
+    return _catalog(FOOD)
+
+
+def bump_catalog_version(*names):
+    """Mark catalogs as changed so every worker reloads them.
+
+    Does not commit: callers commit together with their catalog writes.
+    A single INSERT ... ON CONFLICT DO UPDATE increments the versions, so
+    concurrent writers (including two first bumps) neither lose bumps nor
+    collide on the primary key. This process drops its cached snapshots
+    once the transaction commits.
+
+    Args:
+        names: Catalog names (EXERCISE, FOOD); both if none given
+    """
+    names = names or tuple(_LOADERS)
+    stmt = dialect_insert(CatalogVersion).values([{'name': name, 'version': 1} for name in names])
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['name'], set_={'version': CatalogVersion.version + 1}))
+    db.session.info.setdefault(_STALE_CATALOGS, set()).update(names)
@@ -0,0 +1,93 @@
+"""
+Model backends for the AI coach.
+
+A backend turns a list of chat messages into a reply. The registry below
+names each backend's module without importing it: the provider SDK
+(huggingface_hub, transformers/torch) is only imported when the coach first
+uses that backend, so importing the app, the coach or its tooling stays
+cheap when AI is disabled or served by another backend.
+
+Backend interface (duck-typed, like the response cache backends):
+
+    name                       registry key
+    model                      model id in use
+    generate(messages, deadline) -> str
+    stream(messages, deadline) -> iterator of str chunks; raises before the
+                                  first chunk if the reply cannot start
+    reset()                    optional: drop per-backend state learned from
+                                  failures (called when the circuit closes)
+
+``deadline`` is a ``time.monotonic()`` value; backends should not start new
+attempts once it has passed. A backend that is still starting up raises
+BackendWarmingUp at once rather than spending the caller's deadline on it. Errors are raised, never swallowed: the coach
+decides on the circuit breaker and the fallback reply.
+"""
+
+import importlib
+import os
+
+# name -> (module, class, model env var, default model, API token env var or None)
+BACKENDS = {
+    'huggingface': ('.huggingface', 'HuggingFaceBackend', 'HUGGINGFACE_MODEL',
+                    'mistralai/Mistral-7B-Instruct-v0.2', 'HUGGINGFACE_API_KEY'),
+    'local': ('.local', 'LocalBackend', 'AI_LOCAL_MODEL',
+              'Qwen/Qwen2.5-0.5B-Instruct', None),
+}
+
+
+class BackendUnavailable(RuntimeError):
+    """The selected backend is not configured (e.g. no API token)."""
+
+
+class BackendWarmingUp(RuntimeError):
+    """The backend is still loading its model; not a provider failure."""
+
+
+def backend_name_from_env():
+    """AI_COACH_BACKEND: 'huggingface' (Inference API, default) or 'local'."""
+    name = os.environ.get('AI_COACH_BACKEND', 'huggingface').strip().lower()
+    if name not in BACKENDS:
+        print(f"Unknown AI_COACH_BACKEND '{name}', using huggingface")
+        name = 'huggingface'
+    return name
+
+
+def model_from_env(name):
+    """Model id the backend will use, resolved without importing it."""
+    _, _, model_env, default_model, _ = BACKENDS[name]
+    return os.environ.get(model_env, default_model)
+
+
+def create_backend(name, model, api_key=None, timeout=15):
+    """
+    Import and construct a backend.
+    
+    Args:
+        name: Registry key
+        model: Model id
+        api_key: Token for backends that need one (falls back to its env var)
+        timeout: Seconds allowed per model call
+    Raises:
+        BackendUnavailable: The backend needs a token and none is set
+        ImportError: The backend's SDK is not installed
+    """
+    module_name, class_name, _, _, token_env = BACKENDS[name]
+    if token_env:
+        api_key = api_key or os.environ.get(token_env)
+        if not api_key:
+            raise BackendUnavailable(f"{name} backend needs {token_env}")
+    module = importlib.import_module(module_name, __name__)
+    return getattr(module, class_name)(model=model, api_key=api_key, timeout=timeout)
+
+
+def to_prompt(messages):
+    """Flatten chat into a single prompt for models that only support text-generation"""
+    parts = []
+    role_map = {"system": "System", "user": "User", "assistant": "Assistant"}
+    for m in messages:
+        role = role_map.get(m.get("role", "user"), "User")
+        content = m.get("content", "").strip()
+        if content:
+            parts.append(f"{role}: {content}")
+    parts.append("Assistant:")
+    return "\n".join(parts)
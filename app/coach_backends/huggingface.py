@@ -0,0 +1,159 @@
+"""
+Hugging Face Inference API backend (the default).
+
+One InferenceClient is shared by every request and thread in the process.
+huggingface_hub routes all clients through its own shared, thread-safe HTTP
+session, so reusing the client keeps connections alive instead of paying
+client setup and a TLS handshake per message.
+"""
+
+import time
+
+from huggingface_hub import InferenceClient
+
+from . import to_prompt
+
+
+class HuggingFaceBackend:
+    """
+    Tries chat_completion first, then text_generation for models that only
+    support plain prompts; whichever works is remembered and used alone
+    afterwards. Falling back to text_generation is only remembered for
+    METHOD_MEMORY_SECONDS (or until reset()), so one transient chat error
+    does not pin the backend to it. Each attempt gets only the time left
+    before the deadline.
+
+    Args:
+        model: Model id on the Inference API
+        api_key: Hugging Face API token
+        timeout: HTTP timeout of each request, in seconds
+    """
+
+    name = 'huggingface'
+
+    # How long a fallback to text_generation is trusted before chat is retried
+    METHOD_MEMORY_SECONDS = 300
+
+    def __init__(self, model, api_key, timeout=15):
+        self.model = model
+        self.api_key = api_key
+        self.timeout = timeout
+        self.client = InferenceClient(token=api_key, timeout=timeout)
+        self._method = None  # 'chat' or 'text_generation' once one has worked
+        self._method_expires = None  # monotonic time, for text_generation only
+
+    def reset(self):
+        """Forget which method worked (the coach calls this when its circuit closes)."""
+        self._method = None
+        self._method_expires = None
+
+    def _remember(self, method):
+        self._method = method
+        self._method_expires = (time.monotonic() + self.METHOD_MEMORY_SECONDS
+                                if method == 'text_generation' else None)
+
+    def _methods_to_try(self):
+        """chat_completion then text_generation, or only the one known to work."""
+        method, expires = self._method, self._method_expires
+        if method and (expires is None or time.monotonic() < expires):
+            return [method]
+        return ['chat', 'text_generation']
+
+    def _client_for(self, deadline):
+        """The shared client, or one whose HTTP timeout ends at ``deadline``.
+
+        The shared client's timeout cannot be changed per call (other threads
+        use it); clients are cheap since they all share one HTTP session.
+        """
+        remaining = deadline - time.monotonic()
+        # Slack so the first attempt (just after the deadline was set) shares
+        if remaining >= self.timeout * 0.9:
+            return self.client
+        return InferenceClient(token=self.api_key, timeout=max(remaining, 0.1))
+
+    def _call_chat_completion(self, client, messages):
+        response = client.chat_completion(
+            messages=messages,
+            model=self.model,
+            max_tokens=500,
+            temperature=0.7
+        )
+        assistant_message = response.choices[0].message.content
+        return assistant_message.strip()
+
+    def _call_text_generation(self, client, messages):
+        tg = client.text_generation(
+            to_prompt(messages),
+            model=self.model,
+            max_new_tokens=500,
+            temperature=0.7,
+        )
+        if isinstance(tg, str):
+            return tg.strip()
+        # Some clients return dict-like responses
+        if isinstance(tg, dict) and tg.get("generated_text"):
+            return tg["generated_text"].strip()
+        raise ValueError("Unexpected text_generation response shape")
+
+    def generate(self, messages, deadline):
+        last_err = None
+        for method in self._methods_to_try():
+            if time.monotonic() >= deadline:
+                break
+            call = self._call_chat_completion if method == 'chat' else self._call_text_generation
+            try:
+                text = call(self._client_for(deadline), messages)
+            except Exception as hf_err:
+                last_err = hf_err
+                print(f"Hugging Face {method} failed: {hf_err}")
+                continue
+            self._remember(method)
+            return text
+        raise last_err or TimeoutError("AI call budget exhausted")
+
+    def _stream_chat_completion(self, client, messages):
+        for chunk in client.chat_completion(
+            messages=messages,
+            model=self.model,
+            max_tokens=500,
+            temperature=0.7,
+            stream=True
+        ):
+            delta = chunk.choices[0].delta.content if chunk.choices else None
+            if delta:
+                yield delta
+
+    def _stream_text_generation(self, client, messages):
+        for token in client.text_generation(
+            to_prompt(messages),
+            model=self.model,
+            max_new_tokens=500,
+            temperature=0.7,
+            stream=True,
+        ):
+            # Plain str unless details=True, in which case token.token.text
+            text = token if isinstance(token, str) else getattr(getattr(token, 'token', None), 'text', '')
+            if text:
+                yield text
+
+    def stream(self, messages, deadline):
+        """A method is only abandoned if it fails before producing any output."""
+        started = False
+        last_err = None
+        for method in self._methods_to_try():
+            if time.monotonic() >= deadline:
+                break
+            stream = self._stream_chat_completion if method == 'chat' else self._stream_text_generation
+            try:
+                for text in stream(self._client_for(deadline), messages):
+                    started = True
+                    yield text
+            except Exception as hf_err:
+                if started:
+                    raise
+                last_err = hf_err
+                print(f"Hugging Face {method} stream failed: {hf_err}")
+                continue
+            self._remember(method)
+            return
+        raise last_err or TimeoutError("AI call budget exhausted")
@@ -0,0 +1,224 @@
+"""
+On-box inference with transformers/torch (AI_COACH_BACKEND=local).
+
+Needs the optional ``transformers`` and ``torch`` packages; they are only
+imported when the model is loaded. If they or the model are missing, every
+call fails and the coach answers with its canned responses.
+"""
+
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+from . import BackendWarmingUp, to_prompt
+
+
+class LocalGenerator:
+    """
+    Runs a small instruction model in-process with transformers on CPU.
+    
+    The model is loaded once by a single worker thread, started by
+    ``start()``. Until it has loaded, ``generate()`` raises BackendWarmingUp
+    at once, so a cold start (download, quantization) never eats a
+    request's time budget. Concurrent requests are queued; the worker takes
+    up to ``batch_size`` of them (waiting at most ``batch_wait`` seconds for
+    the batch to fill) and runs them through one padded ``generate()`` call.
+    Requests whose caller gave up (cancelled or past their deadline) are
+    dropped before generation.
+    
+    Args:
+        model_id: Hugging Face model id or local path
+        quantize: 'int8' for dynamic int8 quantization of Linear layers
+            (smaller and faster on CPU), or '' for full precision
+        max_new_tokens: Generation length cap per reply
+        batch_size: Most requests generated together
+        batch_wait: Seconds to wait for more requests before generating
+        threads: torch intra-op threads (0 keeps torch's default)
+    """
+    
+    def __init__(self, model_id, quantize='', max_new_tokens=256, batch_size=4,
+                 batch_wait=0.05, threads=0):
+        self.model_id = model_id
+        self.quantize = quantize
+        self.max_new_tokens = max_new_tokens
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.threads = threads
+        self._queue = queue.Queue()
+        self._worker = None
+        self._lock = threading.Lock()
+        self._load_error = None
+        self._loaded = threading.Event()  # set once loading has finished or failed
+        self._model = None
+        self._tokenizer = None
+    
+    def generate(self, messages, timeout=None):
+        """Generate a reply for one chat; blocks until its batch has run."""
+        if self._load_error is not None:
+            raise RuntimeError(f"Local model unavailable: {self._load_error}")
+        self.start()
+        if not self._loaded.is_set():
+            raise BackendWarmingUp(f"Local model {self.model_id} is still loading")
+        future = Future()
+        deadline = None if timeout is None else time.monotonic() + timeout
+        self._queue.put((messages, future, deadline))
+        try:
+            return future.result(timeout)
+        except FutureTimeout:
+            # Don't leave the worker generating a reply nobody will read
+            future.cancel()
+            raise
+    
+    def start(self):
+        """Start the worker, which loads the model in the background."""
+        self._ensure_worker()
+    
+    def _ensure_worker(self):
+        if self._worker is None:
+            with self._lock:
+                if self._worker is None:
+                    self._worker = threading.Thread(target=self._run, name='ai-coach-local', daemon=True)
+                    self._worker.start()
+    
+    def _load(self):
+        # Heavy imports only when a local backend is actually used
+        import torch
+        from transformers import AutoModelForCausalLM, AutoTokenizer
+        
+        if self.threads:
+            torch.set_num_threads(self.threads)
+        started = time.time()
+        tokenizer = AutoTokenizer.from_pretrained(self.model_id)
+        tokenizer.padding_side = 'left'  # decoder-only models generate after the padding
+        if tokenizer.pad_token is None:
+            tokenizer.pad_token = tokenizer.eos_token
+        model = AutoModelForCausalLM.from_pretrained(self.model_id, torch_dtype=torch.float32)
+        model.eval()
+        if self.quantize == 'int8':
+            model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+        self._tokenizer, self._model = tokenizer, model
+        print(f"Loaded local model {self.model_id} ({self.quantize or 'fp32'}) in {time.time() - started:.1f}s")
+    
+    def _run(self):
+        try:
+            self._load()
+        except Exception as e:
+            print(f"Failed to load local model {self.model_id}: {e}")
+            self._load_error = e
+        self._loaded.set()
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.batch_wait
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            batch = self._live(batch)
+            if not batch:
+                continue
+            if self._load_error is not None:
+                for _, future in batch:
+                    future.set_exception(RuntimeError(f"Local model unavailable: {self._load_error}"))
+                continue
+            try:
+                replies = self._generate_batch([messages for messages, _ in batch])
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            for (_, future), reply in zip(batch, replies):
+                future.set_result(reply)
+    
+    @staticmethod
+    def _live(batch):
+        """Drop requests that were cancelled or whose deadline has passed."""
+        now = time.monotonic()
+        live = []
+        for messages, future, deadline in batch:
+            if not future.set_running_or_notify_cancel():
+                continue
+            if deadline is not None and now >= deadline:
+                future.set_exception(FutureTimeout())
+                continue
+            live.append((messages, future))
+        return live
+    
+    def _prompt(self, messages):
+        # Chat templates often accept only one leading system message
+        system = "\n\n".join(m["content"] for m in messages if m["role"] == "system")
+        chat = [m for m in messages if m["role"] != "system"]
+        if system:
+            chat.insert(0, {"role": "system", "content": system})
+        if getattr(self._tokenizer, 'chat_template', None):
+            try:
+                return self._tokenizer.apply_chat_template(chat, tokenize=False, add_generation_prompt=True)
+            except Exception:
+                pass  # e.g. templates without a system role
+        return to_prompt(chat)
+    
+    def _generate_batch(self, chats):
+        import torch
+        
+        prompts = [self._prompt(messages) for messages in chats]
+        inputs = self._tokenizer(prompts, return_tensors='pt', padding=True)
+        with torch.inference_mode():
+            output = self._model.generate(
+                **inputs,
+                max_new_tokens=self.max_new_tokens,
+                do_sample=True,
+                temperature=0.7,
+                pad_token_id=self._tokenizer.pad_token_id,
+            )
+        new_tokens = output[:, inputs['input_ids'].shape[1]:]
+        return [text.strip() for text in self._tokenizer.batch_decode(new_tokens, skip_special_tokens=True)]
+
+
+_local_generators = {}
+_local_lock = threading.Lock()
+
+
+def get_local_generator(model_id, **options):
+    """Return the process-wide generator for ``model_id``, so weights load once."""
+    key = (model_id,) + tuple(sorted(options.items()))
+    with _local_lock:
+        generator = _local_generators.get(key)
+        if generator is None:
+            generator = _local_generators[key] = LocalGenerator(model_id, **options)
+    return generator
+
+
+class LocalBackend:
+    """
+    Backend over the process-wide LocalGenerator for ``model``.
+    
+    Settings come from AI_LOCAL_QUANTIZE, AI_LOCAL_MAX_NEW_TOKENS,
+    AI_LOCAL_BATCH_SIZE, AI_LOCAL_BATCH_WAIT_MS and AI_LOCAL_THREADS.
+    """
+    
+    name = 'local'
+    
+    def __init__(self, model, api_key=None, timeout=15):
+        self.model = model
+        self.generator = get_local_generator(
+            model,
+            quantize=os.environ.get('AI_LOCAL_QUANTIZE', '').strip().lower(),
+            max_new_tokens=int(os.environ.get('AI_LOCAL_MAX_NEW_TOKENS', '256')),
+            batch_size=int(os.environ.get('AI_LOCAL_BATCH_SIZE', '4')),
+            batch_wait=float(os.environ.get('AI_LOCAL_BATCH_WAIT_MS', '50')) / 1000,
+            threads=int(os.environ.get('AI_LOCAL_THREADS', '0')),
+        )
+        # Load the model now, in the background, rather than on a request's clock
+        self.generator.start()
+    
+    def generate(self, messages, deadline):
+        return self.generator.generate(messages, timeout=max(deadline - time.monotonic(), 0))
+    
+    def stream(self, messages, deadline):
+        # Batched generation finishes all replies together: one chunk
+        yield self.generate(messages, deadline)
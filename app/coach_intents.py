@@ -0,0 +1,373 @@
+"""
+Offline intent router for the AI coach fallback.
+
+When the Hugging Face API is unavailable the coach answers from the canned
+responses below. Intents, their trigger keywords and their responses are
+plain tables; ``IntentRouter`` normalizes every keyword once when the
+module is imported, so routing a message is one normalization plus a
+substring test per keyword in priority order.
+
+Keyword rules:
+    * Matching is case-insensitive and punctuation is ignored, so
+      "push-up" and "push up" are the same keyword.
+    * A keyword must start at the beginning of a word and matches as a
+      prefix: "squat" also matches "squats", "train" matches "training".
+    * End a keyword with a space to require a whole word ("how to ").
+"""
+
+import re
+
+_WORD = re.compile(r'[a-z0-9]+')
+
+# (intent, keywords) in priority order: the first intent that matches answers.
+# Exercise keywords from EXERCISES also trigger 'technique'.
+INTENTS = [
+    ('technique', ['how to ', 'how do ', 'form', 'technique', 'tutorial',
+                   'plank', 'lunge', 'shoulder press', 'row', 'curl', 'tricep dip']),
+    ('workout', ['workout', 'exercise', 'train', 'gym', 'fitness']),
+    ('nutrition', ['food', 'eat', 'nutrition', 'diet', 'meal', 'calorie', 'protein']),
+    ('motivation', ['motivat', 'inspir', 'lazy', 'tired', 'give up', 'quit', 'hard']),
+    ('progress', ['progress', 'improve', 'better', 'tip', 'advice', 'help']),
+]
+
+# Form guides, in priority order when a message names several exercises
+EXERCISES = [
+    {
+        'name': 'burpee',
+        'keywords': ['burpee'],
+        'title': 'How to do a Burpee (full-body)',
+        'steps': [
+            'Start standing, feet shoulder-width, core tight',
+            'Squat down and place hands on floor in front of you',
+            'Jump feet back into a plank (body straight, don’t sag)',
+            'Do an optional push-up, then jump feet back to hands',
+            'Explode upward into a jump, arms overhead',
+        ],
+        'tips': [
+            'Keep your chest up as you drop into the squat',
+            'Brace your core during the plank to protect your lower back',
+            'Scale it: step back instead of jumping, or skip the push-up',
+        ],
+    },
+    {
+        'name': 'push_up',
+        'keywords': ['push up', 'pushup'],
+        'title': 'Proper Push-up Form',
+        'steps': [
+            'Hands under shoulders, body in a straight line',
+            'Screw palms into the floor to engage lats',
+            'Lower chest towards floor, elbows ~45° from body',
+            'Keep core and glutes tight to avoid sagging',
+            'Press back up, fully extend without locking elbows',
+        ],
+        'tips': [
+            'If tough, elevate hands on a bench; if easy, add tempo or weight',
+        ],
+    },
+    {
+        'name': 'squat',
+        'keywords': ['squat'],
+        'title': 'Bodyweight Squat Basics',
+        'steps': [
+            'Stand shoulder-width, toes slightly out',
+            'Brace core and keep chest tall',
+            'Push hips back and bend knees, tracking over toes',
+            'Descend until thighs are at least parallel',
+            'Drive through mid-foot to stand up',
+        ],
+        'tips': [
+            'Knees track with toes, don’t cave in; keep heels down',
+        ],
+    },
+    {
+        'name': 'deadlift',
+        'keywords': ['deadlift'],
+        'title': 'Conventional Deadlift Cues',
+        'steps': [
+            'Feet hip-width, bar over mid-foot',
+            'Grip just outside knees, brace belly',
+            'Hips higher than squat, chest up, back neutral',
+            'Push floor away, bar stays close/shaves shins',
+            'Lock out by squeezing glutes, don’t lean back',
+        ],
+        'tips': [
+            'If rounding, reduce load; think ‘proud chest’',
+        ],
+    },
+    {
+        'name': 'bench_press',
+        'keywords': ['bench press'],
+        'title': 'Barbell Bench Press Essentials',
+        'steps': [
+            'Feet planted, slight arch, shoulder blades pinched',
+            'Grip so forearms are vertical at bottom',
+            'Unrack and set the bar over upper chest',
+            'Lower to mid/low chest, elbows ~45°',
+            'Press up, keep wrists straight and shoulder blades tight',
+        ],
+        'tips': [
+            'Use a spotter; touch chest softly—don’t bounce',
+        ],
+    },
+]
+
+GENERIC_TECHNIQUE = "🧭 Tell me the exercise name (e.g., burpees, squats, deadlift), and I’ll give you step-by-step form cues and tips!"
+
+GOAL_NAMES = {
+    'lose_weight': 'weight loss',
+    'gain_muscle': 'muscle gain',
+    'maintain_weight': 'maintaining fitness'
+}
+
+# intent -> {user goal: response}; the None entry answers any other goal.
+# 'default' answers messages that match no intent. Responses are
+# str.format templates and may use {name}, {display_name} and {goal_text}.
+RESPONSES = {
+    'workout': {
+        'lose_weight': """💪 Perfect timing to ask! For weight loss, here's your workout plan:
+
+**30-Minute Fat Burning Workout:**
+1. Warm-up (5 min): Light jogging or jumping jacks
+2. HIIT Circuit (20 min) - Do each for 45 sec, rest 15 sec:
+   • Burpees
+   • High knees
+   • Mountain climbers
+   • Jump squats
+   • Push-ups
+3. Cool-down (5 min): Stretching
+
+**Frequency:** 4-5 times per week
+**Tip:** Stay consistent and track your progress! 🔥""",
+        'gain_muscle': """💪 Let's build some muscle! Here's your workout:
+
+**Strength Training (45 min):**
+**Upper Body:**
+• Bench Press: 4 sets x 8-10 reps
+• Pull-ups: 4 sets x 6-8 reps
+• Shoulder Press: 3 sets x 10 reps
+• Bicep Curls: 3 sets x 12 reps
+
+**Lower Body:**
+• Squats: 4 sets x 8-10 reps
+• Deadlifts: 4 sets x 6-8 reps
+• Leg Press: 3 sets x 12 reps
+
+**Frequency:** 4-5 days/week
+**Pro Tip:** Eat protein within 30 min post-workout! 🏋️""",
+        None: """💪 Here's a balanced full-body workout for you:
+
+**40-Minute Complete Workout:**
+1. Warm-up (5 min): Dynamic stretching
+2. Circuit (30 min) - 3 rounds:
+   • Push-ups: 12 reps
+   • Squats: 15 reps
+   • Plank: 45 seconds
+   • Lunges: 10 each leg
+   • Dumbbell rows: 12 reps
+   • Rest: 60 seconds
+3. Cool-down (5 min): Static stretches
+
+Do this 3-4 times weekly for best results! 💯""",
+    },
+    'nutrition': {
+        'lose_weight': """🥗 Nutrition for Weight Loss:
+
+**Daily Calorie Target:** ~500 kcal deficit from maintenance
+
+**Meal Structure:**
+• **Breakfast:** Oatmeal with berries + eggs
+• **Lunch:** Grilled chicken salad with olive oil
+• **Dinner:** Baked fish with vegetables
+• **Snacks:** Greek yogurt, nuts (small portions)
+
+**Key Rules:**
+✅ Drink 3-4 liters water daily
+✅ Protein at every meal (keeps you full)
+✅ Avoid sugary drinks & processed foods
+✅ Eat slowly, track portions
+
+**Pro Tip:** Meal prep on Sundays for the week! 📝""",
+        'gain_muscle': """🥗 Nutrition for Muscle Gain:
+
+**Daily Calorie Target:** ~300-500 kcal surplus
+
+**Meal Structure (5-6 meals):**
+• **Meal 1:** Eggs, oats, banana
+• **Meal 2:** Chicken, rice, vegetables
+• **Meal 3:** Tuna sandwich, apple
+• **Meal 4 (Pre-workout):** Protein shake, banana
+• **Meal 5 (Post-workout):** Chicken, sweet potato
+• **Meal 6:** Cottage cheese, nuts
+
+**Macros Target:**
+• Protein: 1.6-2g per kg bodyweight
+• Carbs: 4-6g per kg
+• Fats: 1g per kg
+
+**Muscle-Building Foods:** Chicken, eggs, fish, rice, oats, sweet potato 💪""",
+        None: """🥗 Balanced Nutrition Guide:
+
+**Plate Method:**
+• 1/2 plate: Vegetables (colorful!)
+• 1/4 plate: Lean protein (chicken, fish, tofu)
+• 1/4 plate: Complex carbs (brown rice, quinoa)
+• Healthy fats: Olive oil, nuts, avocado
+
+**Daily Essentials:**
+✅ 8+ glasses water
+✅ 5 servings fruits/vegetables
+✅ Lean protein each meal
+✅ Whole grains over refined
+✅ Limit processed foods & sugar
+
+**Sample Day:**
+• Breakfast: Oats + banana + almonds
+• Lunch: Grilled chicken salad
+• Snack: Greek yogurt
+• Dinner: Salmon + quinoa + veggies
+
+Stay consistent and you'll see results! 🌟""",
+    },
+    'motivation': {
+        None: """🌟 Listen up, {name}!
+
+**Remember This:**
+• You didn't come this far to only come this far
+• Every workout counts, even the short ones
+• Progress > Perfection
+• You're stronger than your excuses
+
+**Quick Motivation Boost:**
+1. Think about WHY you started
+2. Visualize your goal body/strength
+3. Remember how good you feel AFTER working out
+4. You'll regret NOT doing it, never regret doing it
+
+**Right Now:** Put on your workout clothes. Once you're dressed, you're 90% there! 💪
+
+The hardest part is starting - and you're already thinking about it. That's a win! Now GO! 🔥
+
+You've got this! 💯""",
+    },
+    'progress': {
+        None: """� Tips to Maximize Your Progress:
+
+**Workout Tips:**
+✅ Track everything (reps, weight, time)
+✅ Progressive overload (increase gradually)
+✅ Rest 48 hours between muscle groups
+✅ Get 7-9 hours sleep
+✅ Stay hydrated (3-4L water daily)
+
+**Nutrition Tips:**
+✅ Meal prep weekly
+✅ Protein with every meal
+✅ Don't skip breakfast
+✅ Eat within 30 min post-workout
+✅ Limit cheat meals to 1-2/week
+
+**Mental Game:**
+✅ Set SMART goals
+✅ Take progress photos monthly
+✅ Find a workout buddy
+✅ Celebrate small wins
+✅ Be patient - results take time
+
+**Remember:** Consistency beats intensity! Show up even when motivation is low. 🎯""",
+    },
+    'default': {
+        None: """👋 Hey {display_name}!{goal_text}
+
+I'm your AI fitness coach, here to help with:
+
+🏋️ **Workouts** - Custom plans for your goals
+🥗 **Nutrition** - Meal plans and diet advice  
+💪 **Motivation** - Keep you fired up
+📊 **Progress** - Tips to see results faster
+
+**Try asking me:**
+• "Give me a workout for today"
+• "What should I eat to reach my goal?"
+• "I need motivation to stay consistent"
+• "How can I see results faster?"
+
+I'm here 24/7 to help you crush your fitness goals! What would you like to know? 💪""",
+    },
+}
+
+
+def render_guide(guide):
+    steps = guide['steps']
+    tips = guide.get('tips')
+    tips_text = f"\n\nPro tips:\n- " + "\n- ".join(tips) if tips else ""
+    return f"""📘 {guide['title']}
+
+1) {steps[0]}
+2) {steps[1]}
+3) {steps[2]}
+4) {steps[3]}
+5) {steps[4]}{tips_text}
+
+Want a short demo GIF or common mistakes to avoid?"""
+
+
+class IntentRouter:
+    """Routes messages by scanning the keyword tables in priority order.
+
+    Messages and keywords are normalized to lowercase words joined by single
+    spaces, with a space on each end of the message. A keyword is stored as
+    " word word" (plus a trailing space for whole-word keywords), so one
+    substring test checks that it starts at a word and, if asked, ends at
+    one. Exercise keywords come first, then the intents, and the first hit
+    decides the route.
+
+    Args:
+        intents: (intent, keywords) pairs in priority order
+        exercises: Form guides with 'name' and 'keywords', in priority order
+        responses: intent -> {goal: template} mapping
+    """
+
+    def __init__(self, intents=INTENTS, exercises=EXERCISES, responses=RESPONSES):
+        self._exercises = {guide['name']: guide for guide in exercises}
+        self._guides = {name: render_guide(guide) for name, guide in self._exercises.items()}
+        self._responses = responses
+        table = ([(('technique', guide['name']), guide['keywords']) for guide in exercises]
+                 + [((name, None), keywords) for name, keywords in intents])
+        self._keywords = [
+            (' ' + ' '.join(_WORD.findall(keyword.lower())) + (' ' if keyword.endswith(' ') else ''), route)
+            for route, keywords in table for keyword in keywords
+        ]
+
+    def route(self, message):
+        """Return ``(intent, exercise)`` for a message.
+
+        ``exercise`` is only set for technique questions naming a known
+        exercise; ``intent`` is None when nothing matched.
+        """
+        text = f" {' '.join(_WORD.findall(message.lower()))} "
+        for keyword, route in self._keywords:
+            if keyword in text:
+                return route
+        return None, None
+
+    def respond(self, message, user=None):
+        """Canned coach answer for ``message``, personalized for ``user``."""
+        intent, exercise = self.route(message)
+        if intent == 'technique':
+            return self._guides[exercise] if exercise else GENERIC_TECHNIQUE
+
+        templates = self._responses[intent or 'default']
+        goal = getattr(user, 'goal', None)
+        template = templates.get(goal, templates[None])
+        if '{' not in template:
+            return template
+        name = getattr(user, 'name', None)
+        goal_text = f" I see your goal is {GOAL_NAMES.get(goal, 'fitness')}." if goal else ""
+        return template.format(
+            name=name or 'Champion',
+            display_name=name or getattr(user, 'username', None) or 'there',
+            goal_text=goal_text,
+        )
+
+
+router = IntentRouter()
@@ -0,0 +1,202 @@
+"""
+Energy targets: BMR, TDEE, BMI and goal-adjusted calories.
+
+Per user, ``energy_targets()`` is the one place the goal math is done. Its
+result is stored in ``EnergyProfile``: profile() calls
+``refresh_energy_profile()`` when it saves changes. The dashboard, profile
+page and AI coach read the stored row, which is loaded together with the
+user.
+
+For reports over many users, ``energy_columns()`` takes one column per
+profile field and returns the four derived columns in one call, matching
+``calculate_bmr()``, ``calculate_tdee()``, ``calculate_bmi()`` and
+``calculate_target_calories()`` from app/utils.py row for row. Where a scalar function returns None
+(missing or zero weight, height, age or gender) the column holds NaN.
+
+NumPy is used when it is installed. It is imported on the first call, so app
+start-up does not pay for it. Without NumPy the columns are filled into
+``array('d')`` in a single pass without the per-row function calls
+(benchmarks/energy_targets.py compares both with the scalar loop).
+"""
+
+import math
+from array import array
+from collections import namedtuple
+from datetime import datetime
+from itertools import repeat
+
+from . import db
+from .models import EnergyProfile, User
+from .utils import (ACTIVITY_FACTORS, BMR_GENDER_OFFSETS, DEFAULT_ACTIVITY_FACTOR,
+                    GOAL_CALORIE_ADJUSTMENTS, calculate_bmi, calculate_bmr,
+                    calculate_target_calories, calculate_tdee)
+
+EnergyColumns = namedtuple('EnergyColumns', 'bmr tdee bmi target_calories')
+
+_numpy = None
+
+_PROFILE_FIELDS = ('weight', 'height', 'age', 'gender', 'activity_level', 'goal')
+
+
+def energy_targets(weight, height, age, gender, activity_level, goal=None):
+    """Compute one user's energy targets.
+
+    BMR, TDEE and target calories need weight, height, age, gender and
+    activity level; BMI only weight and height.
+
+    Returns:
+        dict with bmr, tdee, bmi and target_calories (None where unknown)
+    """
+    targets = {'bmr': None, 'tdee': None, 'bmi': calculate_bmi(weight, height), 'target_calories': None}
+    if all([weight, height, age, gender, activity_level]):
+        bmr = calculate_bmr(weight, height, age, gender)
+        tdee = calculate_tdee(bmr, activity_level)
+        targets.update(bmr=bmr, tdee=tdee, target_calories=calculate_target_calories(tdee, goal))
+    return targets
+
+
+def refresh_energy_profile(user):
+    """Recompute and store ``user``'s EnergyProfile (no commit).
+
+    Returns:
+        The EnergyProfile
+    """
+    profile = user.energy_profile
+    if profile is None:
+        profile = user.energy_profile = EnergyProfile(user_id=user.id)
+    for field, value in energy_targets(*(getattr(user, field) for field in _PROFILE_FIELDS)).items():
+        setattr(profile, field, value)
+    profile.updated_at = datetime.utcnow()
+    return profile
+
+
+def write_missing_energy_profiles(conn):
+    """Create EnergyProfile rows for users with profile data but none yet.
+
+    Args:
+        conn: A Connection (the migration's, or ``db.session.connection()``)
+    Returns:
+        Number of rows written.
+    """
+    user, profile = User.__table__, EnergyProfile.__table__
+    rows = conn.execute(
+        db.select(user.c.id, *(user.c[field] for field in _PROFILE_FIELDS))
+        .select_from(user.outerjoin(profile, profile.c.user_id == user.c.id))
+        .where(profile.c.user_id.is_(None), user.c.weight.isnot(None), user.c.height.isnot(None))
+    ).all()
+    now = datetime.utcnow()
+    values = [{'user_id': user_id, 'updated_at': now, **energy_targets(*fields)}
+              for user_id, *fields in rows]
+    if values:
+        conn.execute(db.insert(profile), values)
+    return len(values)
+
+
+def _load_numpy():
+    """The numpy module, or False if it is not installed (cached)."""
+    global _numpy
+    if _numpy is None:
+        try:
+            import numpy
+            _numpy = numpy
+        except ImportError:
+            _numpy = False
+    return _numpy
+
+
+def numpy_available():
+    """Whether energy_columns() will use NumPy by default."""
+    return bool(_load_numpy())
+
+
+def _lookup(np, column, table, default):
+    """Map a column of category strings to floats via ``table``.
+
+    One pass of dict lookups; faster than a comparison pass per category on
+    object arrays.
+    """
+    return np.fromiter(map(table.get, column, repeat(default)), float, count=len(column))
+
+
+def _numpy_columns(np, weights, heights, ages, genders, activity_levels, goals):
+    weight, height, age = (np.asarray(column, dtype=float) for column in (weights, heights, ages))
+    # Falsy values make the scalar functions return None
+    has_size = (weight != 0) & ~np.isnan(weight) & (height != 0) & ~np.isnan(height)
+    has_bmr = (has_size & (age != 0) & ~np.isnan(age)
+               & np.fromiter(map(bool, genders), bool, count=len(genders)))
+
+    bmr = 10 * weight + 6.25 * height - 5 * age + _lookup(np, genders, BMR_GENDER_OFFSETS, 0)
+    bmr[~has_bmr] = np.nan
+    tdee = bmr * _lookup(np, activity_levels, ACTIVITY_FACTORS, DEFAULT_ACTIVITY_FACTOR)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        bmi = weight / ((height / 100) ** 2)
+    bmi[~has_size] = np.nan
+    if goals is None:
+        target = tdee.copy()
+    else:
+        target = tdee + _lookup(np, goals, GOAL_CALORIE_ADJUSTMENTS, 0)
+    return EnergyColumns(bmr, tdee, bmi, target)
+
+
+def _array_columns(weights, heights, ages, genders, activity_levels, goals):
+    nan = math.nan
+    columns = EnergyColumns(array('d'), array('d'), array('d'), array('d'))
+    add_bmr, add_tdee, add_bmi, add_target = (column.append for column in columns)
+    offsets, factors, adjustments = BMR_GENDER_OFFSETS, ACTIVITY_FACTORS, GOAL_CALORIE_ADJUSTMENTS
+    rows = zip(weights, heights, ages, genders, activity_levels, repeat(None) if goals is None else goals)
+    for weight, height, age, gender, activity_level, goal in rows:
+        if weight and height:
+            add_bmi(weight / ((height / 100) ** 2))
+            if age and gender:
+                bmr = 10 * weight + 6.25 * height - 5 * age + offsets.get(gender, 0)
+                tdee = bmr * factors.get(activity_level, DEFAULT_ACTIVITY_FACTOR)
+                add_bmr(bmr)
+                add_tdee(tdee)
+                add_target(tdee + adjustments.get(goal, 0))
+                continue
+        else:
+            add_bmi(nan)
+        add_bmr(nan)
+        add_tdee(nan)
+        add_target(nan)
+    return columns
+
+
+def energy_columns(weights, heights, ages, genders, activity_levels, goals=None, use_numpy=None):
+    """Compute BMR, TDEE, BMI and target calories for whole columns at once.
+
+    Args:
+        weights: kg per row (None allowed)
+        heights: cm per row (None allowed)
+        ages: years per row (None allowed)
+        genders: 'male', 'female', anything else (no offset) or None
+        activity_levels: ACTIVITY_FACTORS keys; others count as sedentary
+        goals: Optional 'lose'/'gain'/'maintain' per row; maintain if omitted
+        use_numpy: Force (True) or skip (False) NumPy; default: if installed
+    Returns:
+        EnergyColumns of numpy float arrays, or of ``array('d')`` without
+        NumPy, with NaN where the scalar functions give None
+    """
+    np = _load_numpy() if use_numpy is not False else False
+    if use_numpy and not np:
+        raise RuntimeError("NumPy is not installed")
+    if np:
+        return _numpy_columns(np, weights, heights, ages, genders, activity_levels, goals)
+    return _array_columns(weights, heights, ages, genders, activity_levels, goals)
+
+
+def user_energy_columns(user_ids=None, use_numpy=None):
+    """Energy columns for every user (or ``user_ids``) from one query.
+
+    Returns:
+        (list of user ids, EnergyColumns) in user id order
+    """
+    query = db.select(User.id, User.weight, User.height, User.age, User.gender,
+                      User.activity_level, User.goal).order_by(User.id)
+    if user_ids is not None:
+        query = query.where(User.id.in_(list(user_ids)))
+    rows = db.session.execute(query).all()
+    if not rows:
+        return [], energy_columns([], [], [], [], [], [], use_numpy=use_numpy)
+    ids, *columns = zip(*rows)
+    return list(ids), energy_columns(*columns, use_numpy=use_numpy)
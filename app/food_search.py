@@ -0,0 +1,133 @@
+"""
+Food catalog search.
+
+On SQLite the catalog is indexed by an FTS5 table, ``food_fts``, which
+mirrors ``food.name``, ``description`` and ``category``. It is an
+external-content table, so it stores only the index and reads the text back
+from ``food``. Triggers on ``food`` keep it in sync for every writer,
+including the populate_* scripts. Searches are ranked prefix matches: every
+word of the query must prefix-match a word of the food, and name hits rank
+above description or category hits.
+
+Other databases, or SQLite builds without FTS5, fall back to ILIKE
+filtering ordered by category and name.
+"""
+
+import re
+
+from flask import current_app
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+
+from . import db
+from .models import Food
+
+FOOD_PAGE_SIZE = 24
+MAX_PAGE_SIZE = 100
+
+# bm25() column weights: name, description, category
+RANK_WEIGHTS = (10.0, 2.0, 1.0)
+
+_SCHEMA = [
+    """CREATE VIRTUAL TABLE food_fts USING fts5(
+        name, description, category,
+        content='food', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2', prefix='2 3'
+    )""",
+    """CREATE TRIGGER food_fts_insert AFTER INSERT ON food BEGIN
+        INSERT INTO food_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+    """CREATE TRIGGER food_fts_delete AFTER DELETE ON food BEGIN
+        INSERT INTO food_fts(food_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+    END""",
+    """CREATE TRIGGER food_fts_update AFTER UPDATE ON food BEGIN
+        INSERT INTO food_fts(food_fts, rowid, name, description, category)
+        VALUES ('delete', old.id, old.name, old.description, old.category);
+        INSERT INTO food_fts(rowid, name, description, category)
+        VALUES (new.id, new.name, new.description, new.category);
+    END""",
+]
+
+_WORD = re.compile(r'\w+')
+
+
+def ensure_food_search_index():
+    """Create the FTS5 index and its triggers if missing (SQLite only).
+
+    Returns:
+        bool: True if full-text search is available.
+    """
+    if db.engine.dialect.name != 'sqlite':
+        return False
+    try:
+        with db.engine.begin() as conn:
+            exists = conn.execute(text(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'food_fts'"
+            )).first()
+            if exists:
+                return True
+            for statement in _SCHEMA:
+                conn.execute(text(statement))
+            # Index the rows that were there before the triggers
+            conn.execute(text("INSERT INTO food_fts(food_fts) VALUES ('rebuild')"))
+    except OperationalError as e:
+        print(f"[migrate] Food full-text search unavailable ({e}); using LIKE search")
+        return False
+    print("[migrate] Created food_fts full-text index")
+    return True
+
+
+def _match_expression(query):
+    # Quote every word (so FTS operators in user input are inert) and make
+    # it a prefix term; terms are ANDed
+    return ' '.join(f'"{word}"*' for word in _WORD.findall(query.lower()))
+
+
+def search_foods(query='', category=None, page=1, per_page=FOOD_PAGE_SIZE):
+    """Return one page of foods matching ``query`` and ``category``.
+
+    Args:
+        query: Free text; empty browses the catalog by category and name
+        category: Optional exact category filter
+        page: 1-based page number
+        per_page: Page size (capped at MAX_PAGE_SIZE)
+    Returns:
+        (foods, has_more)
+    """
+    per_page = max(1, min(per_page, MAX_PAGE_SIZE))
+    offset = (max(page, 1) - 1) * per_page
+    match = _match_expression(query or '')
+
+    if match and current_app.config.get('FOOD_FTS'):
+        sql = ("SELECT food.* FROM food_fts JOIN food ON food.id = food_fts.rowid "
+               "WHERE food_fts MATCH :match")
+        params = {'match': match, 'limit': per_page + 1, 'offset': offset}
+        if category:
+            sql += " AND food.category = :category"
+            params['category'] = category
+        sql += " ORDER BY bm25(food_fts, {}, {}, {}), food.name LIMIT :limit OFFSET :offset".format(*RANK_WEIGHTS)
+        foods = db.session.scalars(db.select(Food).from_statement(text(sql)), params).all()
+    else:
+        foods_query = Food.query
+        if match:
+            foods_query = foods_query.filter(db.or_(
+                Food.name.ilike(f'%{query}%'),
+                Food.description.ilike(f'%{query}%')
+            ))
+        if category:
+            foods_query = foods_query.filter(Food.category == category)
+        foods = foods_query.order_by(Food.category, Food.name).offset(offset).limit(per_page + 1).all()
+
+    return foods[:per_page], len(foods) > per_page
+
+
+def food_to_dict(food):
+    return {
+        'id': food.id,
+        'name': food.name,
+        'category': food.category,
+        'calories_per_serving': food.calories_per_serving,
+        'serving_size': food.serving_size,
+    }
@@ -1,5 +1,6 @@
 from flask_wtf import FlaskForm
 from wtforms import StringField, PasswordField, SubmitField, IntegerField, FloatField, SelectField, BooleanField, TextAreaField, HiddenField
+from wtforms.widgets import HiddenInput
 from wtforms.validators import DataRequired, Email, EqualTo, Length, Optional
 from .models import Exercise, Food
 from datetime import datetime
@@ -44,7 +45,8 @@ class ExerciseLogForm(FlaskForm):
     submit = SubmitField('Log Exercise')
 
 class FoodLogForm(FlaskForm):
-    food = SelectField('Food', coerce=int, validators=[DataRequired()])
+    # Food id, set by the search/autocomplete widget on the food page
+    food = IntegerField('Food', widget=HiddenInput(), validators=[DataRequired(message='Pick a food from the search results')])
     meal_type = SelectField('Meal Type', choices=[
         ('breakfast', 'Breakfast'),
         ('lunch', 'Lunch'),
@@ -0,0 +1,144 @@
+"""
+Habit streaks and the weekly completion grid.
+
+``Habit`` stores its streak: ``current_streak`` is the run of consecutive
+completed days ending on ``last_completed_date``, ``longest_streak`` the best
+run ever. check_habit() moves them forward with
+``record_habit_completion()`` in the same transaction as the HabitLog row, so
+pages never derive streaks from the logs. ``rebuild_habit_streaks()``
+recomputes them from HabitLog for backfills and after direct imports.
+
+``weekly_completion()`` reads the last seven days for a page of habits in
+one query over the (habit_id, date) index.
+"""
+
+from datetime import date, timedelta
+
+from . import db
+from .models import Habit, HabitLog
+from .utils import as_date
+
+WEEK_DAYS = 7
+
+
+def record_habit_completion(habit_id, day):
+    """Extend (or restart) the habit's streak for a completion on ``day``.
+
+    Does not commit: callers commit together with the HabitLog row. Done in
+    one UPDATE so concurrent check-ins cannot double-count; completing the
+    same day twice leaves the streak unchanged.
+
+    Returns:
+        The habit's current streak after the update.
+    """
+    yesterday = day - timedelta(days=1)
+    streak = db.case(
+        (Habit.last_completed_date >= day, Habit.current_streak),
+        (Habit.last_completed_date == yesterday, Habit.current_streak + 1),
+        else_=1,
+    )
+    return db.session.execute(
+        db.update(Habit).where(Habit.id == habit_id).values(
+            current_streak=streak,
+            longest_streak=db.case((streak > Habit.longest_streak, streak), else_=Habit.longest_streak),
+            last_completed_date=db.case((Habit.last_completed_date >= day, Habit.last_completed_date),
+                                        else_=day),
+        ).returning(Habit.current_streak).execution_options(synchronize_session=False)
+    ).scalar()
+
+
+def active_streak(habit, today=None):
+    """The streak as of ``today``: 0 once a whole day has been missed."""
+    today = today or date.today()
+    if habit.last_completed_date and habit.last_completed_date >= today - timedelta(days=1):
+        return habit.current_streak
+    return 0
+
+
+def week_days(today=None):
+    """The seven dates ending ``today``, oldest first."""
+    today = today or date.today()
+    return [today - timedelta(days=offset) for offset in range(WEEK_DAYS - 1, -1, -1)]
+
+
+def weekly_completion(habits, today=None):
+    """Return ``{habit_id: [completed?] * 7}`` for the week ending ``today``.
+
+    Days are oldest first, so the last entry is today. One query for all of
+    ``habits``.
+    """
+    days = week_days(today)
+    grid = {habit.id: [False] * WEEK_DAYS for habit in habits}
+    if not grid:
+        return grid
+    rows = db.session.query(HabitLog.habit_id, HabitLog.date).filter(
+        HabitLog.habit_id.in_(list(grid)),
+        HabitLog.date >= days[0],
+        HabitLog.date <= days[-1],
+        HabitLog.completed == True,
+    )
+    for habit_id, day in rows:
+        grid[habit_id][(as_date(day) - days[0]).days] = True
+    return grid
+
+
+def streaks_from_dates(dates):
+    """Compute (current_streak, longest_streak, last_completed_date).
+
+    Args:
+        dates: Completed dates in ascending order (duplicates allowed)
+    """
+    current = longest = 0
+    last = None
+    for day in dates:
+        if day == last:
+            continue
+        current = current + 1 if last is not None and day - last == timedelta(days=1) else 1
+        longest = max(longest, current)
+        last = day
+    return current, longest, last
+
+
+def write_habit_streaks(conn, habit_ids=None):
+    """Recompute the streak columns from HabitLog on ``conn`` (no commit).
+
+    Args:
+        conn: A Connection (the migration's, or ``db.session.connection()``)
+        habit_ids: Optional iterable of habit ids; every habit if omitted.
+    Returns:
+        Number of habits with at least one completion.
+    """
+    habit, log = Habit.__table__, HabitLog.__table__
+    reset = db.update(habit).values(current_streak=0, longest_streak=0, last_completed_date=None)
+    logs = db.select(log.c.habit_id, log.c.date).where(log.c.completed == True).order_by(
+        log.c.habit_id, log.c.date)
+    if habit_ids is not None:
+        habit_ids = list(habit_ids)
+        reset = reset.where(habit.c.id.in_(habit_ids))
+        logs = logs.where(log.c.habit_id.in_(habit_ids))
+    conn.execute(reset)
+
+    dates = {}
+    for habit_id, day in conn.execute(logs):
+        dates.setdefault(habit_id, []).append(as_date(day))
+    values = []
+    for habit_id, days in dates.items():
+        current, longest, last = streaks_from_dates(days)
+        values.append({'habit_id': habit_id, 'current': current, 'longest': longest, 'last': last})
+    if values:
+        conn.execute(
+            db.update(habit).where(habit.c.id == db.bindparam('habit_id')).values(
+                current_streak=db.bindparam('current'),
+                longest_streak=db.bindparam('longest'),
+                last_completed_date=db.bindparam('last'),
+            ),
+            values,
+        )
+    return len(values)
+
+
+def rebuild_habit_streaks(habit_ids=None):
+    """Recompute and commit every (or the given) habit's streak columns."""
+    written = write_habit_streaks(db.session.connection(), habit_ids)
+    db.session.commit()
+    return written
@@ -6,7 +6,7 @@ class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(64), unique=True, nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password = db.Column(db.String(128), nullable=False)
+    password = db.Column(db.String(256), nullable=False)  # scrypt hashes exceed 128 chars
     name = db.Column(db.String(100))
     age = db.Column(db.Integer)
     gender = db.Column(db.String(10))
@@ -21,6 +21,8 @@ class User(UserMixin, db.Model):
     foods = db.relationship('FoodLog', backref='user', lazy=True)
     water_logs = db.relationship('WaterLog', backref='user', lazy=True)
     badges = db.relationship('Badge', backref='user', lazy=True)
+    # Joined so loading the user (every request) brings the targets along
+    energy_profile = db.relationship('EnergyProfile', uselist=False, lazy='joined')
 
 
 class FriendRequest(db.Model):
@@ -59,14 +61,26 @@ class Habit(db.Model):
     description = db.Column(db.String(256))
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    # Streak state, maintained by app/habits.py
+    current_streak = db.Column(db.Integer, nullable=False, default=0)  # run ending on last_completed_date
+    longest_streak = db.Column(db.Integer, nullable=False, default=0)
+    last_completed_date = db.Column(db.Date)
     logs = db.relationship('HabitLog', backref='habit', lazy=True)
 
+    __table_args__ = (
+        db.Index('ix_habit_user', 'user_id'),
+    )
+
 class HabitLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     habit_id = db.Column(db.Integer, db.ForeignKey('habit.id'), nullable=False)
     date = db.Column(db.Date, default=datetime.utcnow)
     completed = db.Column(db.Boolean, default=False)
 
+    __table_args__ = (
+        db.Index('ix_habitlog_habit_date', 'habit_id', 'date'),
+    )
+
 class Exercise(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False)
@@ -85,6 +99,10 @@ class Workout(db.Model):
     duration = db.Column(db.Integer)  # Total workout duration in minutes
     notes = db.Column(db.Text)  # Workout notes
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    last_exercise_order = db.Column(db.Integer, nullable=False, default=0)  # highest WorkoutExercise.order handed out
+
+# Workout history is always read newest-first per user
+db.Index('ix_workout_user_date', Workout.user_id, Workout.date.desc())
 
 class WorkoutExercise(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -93,11 +111,17 @@ class WorkoutExercise(db.Model):
     order = db.Column(db.Integer)  # Order of exercise in workout
     rest_time = db.Column(db.Integer)  # Rest time between sets in seconds
     notes = db.Column(db.Text)  # Exercise-specific notes
+    last_set_number = db.Column(db.Integer, nullable=False, default=0)  # highest ExerciseSet.set_number handed out
     
     # Relationships
     workout = db.relationship('Workout', backref='workout_exercises')
     exercise = db.relationship('Exercise', backref='workout_exercises')
 
+    __table_args__ = (
+        db.Index('ix_workoutexercise_workout', 'workout_id'),
+        db.Index('uq_workoutexercise_workout_order', 'workout_id', 'order', unique=True),
+    )
+
 class ExerciseSet(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     workout_exercise_id = db.Column(db.Integer, db.ForeignKey('workout_exercise.id'), nullable=False)
@@ -111,6 +135,28 @@ class ExerciseSet(db.Model):
     # Relationships
     workout_exercise = db.relationship('WorkoutExercise', backref='sets')
 
+    __table_args__ = (
+        db.Index('ix_exerciseset_workoutexercise', 'workout_exercise_id'),
+        db.Index('uq_exerciseset_workoutexercise_number', 'workout_exercise_id', 'set_number', unique=True),
+    )
+
+class WorkoutSyncOp(db.Model):
+    """A client operation already applied by ``/workout/<id>/sync``.
+
+    The session page queues operations offline under client-generated ids;
+    this ledger makes replays of the same id a no-op (see app/workout_sync.py).
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    workout_id = db.Column(db.Integer, db.ForeignKey('workout.id'), nullable=False)
+    op_id = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.String(16), nullable=False)  # applied, rejected
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'op_id', name='uq_workout_sync_op_user_op'),
+    )
+
 # Keep the old ExerciseLog for backward compatibility but mark as deprecated
 class ExerciseLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -121,6 +167,10 @@ class ExerciseLog(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     exercise = db.relationship('Exercise', backref='logs')
 
+    __table_args__ = (
+        db.Index('ix_exerciselog_user_date', 'user_id', 'date'),
+    )
+
 class Food(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(64), nullable=False)
@@ -139,15 +189,85 @@ class FoodLog(db.Model):
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     food = db.relationship('Food', backref='logs')
 
+    __table_args__ = (
+        db.Index('ix_foodlog_user_date', 'user_id', 'date'),
+    )
+
 class WaterLog(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     amount = db.Column(db.Float, nullable=False)  # in ml
     date = db.Column(db.Date, default=datetime.utcnow)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
+    __table_args__ = (
+        db.Index('ix_waterlog_user_date', 'user_id', 'date'),
+    )
+
 class Badge(db.Model):
     id = db.Column(db.Integer, primary_key=True)
+    # Rule that awarded it (see app/badges.py); unique per user
+    key = db.Column(db.String(64))
     name = db.Column(db.String(64), nullable=False)
     description = db.Column(db.String(256))
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
-    date_earned = db.Column(db.Date, default=datetime.utcnow) 
\ No newline at end of file
+    date_earned = db.Column(db.Date, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('uq_badge_user_key', 'user_id', 'key', unique=True),
+    )
+
+class BadgeCounter(db.Model):
+    """Running per-user total (or best) that badge rules are checked against.
+
+    Moved by the write routes through app/badges.py; rebuilt from history
+    by backfill_badges().
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    name = db.Column(db.String(32), primary_key=True)
+    value = db.Column(db.Float, nullable=False, default=0.0)
+
+class DailySummary(db.Model):
+    """Per-user, per-day rollup of logged activity.
+
+    Maintained incrementally by the write routes (see app/summaries.py) so
+    dashboard-style views read one row per day instead of every log row.
+    """
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    date = db.Column(db.Date, nullable=False)
+    calories_consumed = db.Column(db.Float, nullable=False, default=0.0)
+    calories_burned = db.Column(db.Float, nullable=False, default=0.0)
+    water_ml = db.Column(db.Float, nullable=False, default=0.0)
+    habits_completed = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.UniqueConstraint('user_id', 'date', name='uq_daily_summary_user_date'),
+    )
+
+class EnergyProfile(db.Model):
+    """A user's derived energy targets (BMR, TDEE, BMI, target calories).
+
+    Recomputed by refresh_energy_profile() (app/energy.py) when profile()
+    saves changes, so pages and the AI coach read stored numbers instead of
+    redoing the math on every request. BMR, TDEE and target are None until
+    weight, height, age, gender and activity level are all set.
+    """
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    bmr = db.Column(db.Float)
+    tdee = db.Column(db.Float)
+    bmi = db.Column(db.Float)
+    target_calories = db.Column(db.Float)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    @property
+    def complete(self):
+        return self.tdee is not None
+
+class CatalogVersion(db.Model):
+    """Change counter for a reference catalog ('exercise' or 'food').
+
+    Bumped by every catalog write so workers know when their cached copy
+    (see app/catalog.py) is stale.
+    """
+    name = db.Column(db.String(32), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
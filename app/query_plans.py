@@ -0,0 +1,68 @@
+"""
+Query-plan checks for the hot routes.
+
+Each entry in ``HOT_QUERIES`` mirrors a query issued on a frequently hit
+page. ``find_table_scans()`` runs ``EXPLAIN QUERY PLAN`` for each of them and
+reports any step where SQLite falls back to scanning a whole table (or a
+whole index) instead of searching one. It runs at startup (warnings only) and from
+``check_query_plans.py``, which exits non-zero so CI can fail on a regression.
+Only SQLite databases are checked.
+"""
+
+from . import db, get_conn
+
+# name -> (sql, sample parameters)
+HOT_QUERIES = {
+    'dashboard.food_logs': (
+        "SELECT * FROM food_log WHERE user_id = ? AND date >= ?", (1, '2024-01-01')),
+    'dashboard.exercise_logs': (
+        "SELECT * FROM exercise_log WHERE user_id = ? AND date >= ?", (1, '2024-01-01')),
+    'water.today': (
+        "SELECT * FROM water_log WHERE user_id = ? AND date = ?", (1, '2024-01-01')),
+    'dashboard.daily_summaries': (
+        "SELECT * FROM daily_summary WHERE user_id = ? AND date >= ? AND date <= ?",
+        (1, '2024-01-01', '2024-01-07')),
+    'habits.list': (
+        "SELECT * FROM habit WHERE user_id = ?", (1,)),
+    'habits.check': (
+        "SELECT * FROM habit_log WHERE habit_id = ? AND date = ?", (1, '2024-01-01')),
+    'friends.habits_completed_today': (
+        "SELECT count(*) FROM habit_log JOIN habit ON habit.id = habit_log.habit_id "
+        "WHERE habit.user_id = ? AND habit_log.date = ? AND habit_log.completed = 1",
+        (1, '2024-01-01')),
+    'workouts.history': (
+        "SELECT * FROM workout WHERE user_id = ? ORDER BY date DESC", (1,)),
+    'workout_session.exercises': (
+        "SELECT * FROM workout_exercise WHERE workout_id = ?", (1,)),
+    'add_set.reserve_set_number': (
+        "UPDATE workout_exercise SET last_set_number = last_set_number + 1 WHERE id = ? "
+        "RETURNING last_set_number", (1,)),
+    'workout_session.sets': (
+        "SELECT * FROM exercise_set JOIN workout_exercise "
+        "ON workout_exercise.id = exercise_set.workout_exercise_id WHERE workout_exercise.workout_id = ?", (1,)),
+}
+
+
+def find_table_scans(queries=None):
+    """Return ``[(query_name, plan_detail)]`` for every full-table scan found.
+
+    Args:
+        queries: Optional mapping in the ``HOT_QUERIES`` format.
+    """
+    queries = HOT_QUERIES if queries is None else queries
+    scans = []
+    if db.engine.dialect.name != 'sqlite':
+        # EXPLAIN QUERY PLAN is SQLite-specific; other backends are not checked
+        return scans
+    conn = get_conn()
+    try:
+        cur = conn.cursor()
+        for name, (sql, params) in queries.items():
+            cur.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            for row in cur.fetchall():
+                detail = row[-1]  # last column is the human-readable step
+                if detail.startswith('SCAN ') and detail != 'SCAN CONSTANT ROW':
+                    scans.append((name, detail))
+    finally:
+        conn.close()
+    return scans
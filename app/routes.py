@@ -1,13 +1,26 @@
-from flask import render_template, redirect, url_for, flash, request, jsonify, make_response
+from flask import abort, render_template, redirect, url_for, flash, request, session, jsonify, make_response, Response, stream_with_context
 from flask_login import login_user, logout_user, login_required, current_user
 from . import db, login_manager, csrf
 from .models import User, Habit, HabitLog, Exercise, ExerciseLog, Food, FoodLog, WaterLog, Badge, Workout, WorkoutExercise, ExerciseSet, FriendRequest, Friendship
 from .forms import RegistrationForm, LoginForm, ProfileForm, HabitForm, ExerciseLogForm, FoodLogForm, WaterLogForm, WorkoutForm, ExerciseSelectionForm, ExerciseSetForm, FriendSearchForm, FriendActionForm
-from .utils import calculate_bmr, calculate_tdee
+from .energy import refresh_energy_profile
 from .utils import get_exercise_video_info, normalize_video_url
+from .food_search import FOOD_PAGE_SIZE, search_foods, food_to_dict
+from .catalog import exercise_catalog, food_catalog, bump_catalog_version, EXERCISE
+from .summaries import (record_daily_totals, get_daily_summary, get_daily_summaries,
+                        get_activity_snapshot)
+from .habits import record_habit_completion, active_streak, week_days, weekly_completion
+from .badges import WATER_GOAL_ML, record_best, record_progress, record_sets, record_water_intake
+from .workout_sync import (MAX_OPS_PER_SYNC, apply_sync_operations, complete_workout, load_workout_session,
+                           reserve_exercise_orders, reserve_set_numbers, set_fields, workout_state)
+from .ai_jobs import get_job_queue, snapshot_user, async_mode_enabled, QueueFull, UserLimitReached
 from .models import Exercise
+from sqlalchemy.orm import joinedload
+from werkzeug.exceptions import HTTPException
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime, date, timedelta
+import json
+import secrets
 from flask import Blueprint
 
 from flask import current_app as app
@@ -24,6 +37,11 @@ def unauthorized():
         return jsonify({'success': False, 'error': 'unauthorized'}), 401
     return redirect(url_for('login'))
 
+def _flash_badges(badges):
+    """Announce badges just earned (BadgeRule list from app/badges.py)."""
+    for badge in badges:
+        flash(f'Badge earned: {badge.name} - {badge.description}!', 'success')
+
 @app.route('/')
 def index():
     return render_template('index.html')
@@ -72,30 +90,30 @@ def dashboard():
     habits = Habit.query.filter_by(user_id=current_user.id).limit(10).all()
     exercises = ExerciseLog.query.filter_by(user_id=current_user.id).filter(ExerciseLog.date >= week_ago).all()
     foods = FoodLog.query.filter_by(user_id=current_user.id).filter(FoodLog.date >= week_ago).all()
-    water_logs = WaterLog.query.filter_by(user_id=current_user.id).filter(WaterLog.date >= week_ago).all()
+
+    # Daily totals come from the rollup table (one row per day)
+    summaries = get_daily_summaries(current_user.id, today - timedelta(days=6), today)
+    today_summary = summaries[today]
+    weekly_days = sorted(summaries)
     
-    # Calculate BMR and TDEE only if user has complete profile
-    bmr = None
-    tdee = None
+    # Stored targets (see app/energy.py); only set once the profile is complete
+    energy = current_user.energy_profile
     remaining_calories = None
-    if all([current_user.weight, current_user.height, current_user.age, current_user.gender, current_user.activity_level]):
-        bmr = calculate_bmr(current_user.weight, current_user.height, current_user.age, current_user.gender)
-        tdee = calculate_tdee(bmr, current_user.activity_level)
-        
+    if energy and energy.complete:
         # Calculate remaining calories for TODAY only
-        foods_today = [food for food in foods if food.date == today]
-        exercises_today = [ex for ex in exercises if ex.date == today]
-        total_food_calories = sum(food.total_calories for food in foods_today if food.total_calories)
-        total_exercise_calories = sum(ex.calories_burned for ex in exercises_today if ex.calories_burned)
-        remaining_calories = tdee - total_food_calories + total_exercise_calories
+        remaining_calories = energy.tdee - today_summary.calories_consumed + today_summary.calories_burned
     
-    # Calculate total water intake for today only
-    water_today = [log for log in water_logs if log.date == today]
-    total_water = sum(log.amount for log in water_today)
+    total_water = today_summary.water_ml
+    weekly_chart = {
+        'labels': [day.strftime('%a') for day in weekly_days],
+        'burned': [round(summaries[day].calories_burned) for day in weekly_days],
+        'consumed': [round(summaries[day].calories_consumed) for day in weekly_days],
+    }
     
     return render_template('dashboard.html', habits=habits, exercises=exercises, foods=foods, 
-                         water_logs=water_logs, total_water=total_water,
-                         bmr=bmr, tdee=tdee, remaining_calories=remaining_calories)
+                         total_water=total_water, weekly_chart=weekly_chart,
+                         habits_completed_today=today_summary.habits_completed,
+                         energy=energy, remaining_calories=remaining_calories)
 
 @app.route('/profile', methods=['GET', 'POST'])
 @login_required
@@ -114,38 +132,25 @@ def profile():
                 current_user.target_date = datetime.strptime(form.target_date.data, '%Y-%m-%d').date()
             except:
                 current_user.target_date = None
+        refresh_energy_profile(current_user)
         db.session.commit()
         flash('Profile updated!', 'success')
         return redirect(url_for('dashboard'))
     
-    # Calculate fitness stats for display
-    bmr = None
-    tdee = None
-    target_calories = None
-    bmi = None
+    # Fitness stats were computed when the profile was last saved
+    energy = current_user.energy_profile
     days_to_goal = None
     
-    if all([current_user.weight, current_user.height, current_user.age, current_user.gender, current_user.activity_level]):
-        bmr = calculate_bmr(current_user.weight, current_user.height, current_user.age, current_user.gender)
-        tdee = calculate_tdee(bmr, current_user.activity_level)
-        bmi = current_user.weight / ((current_user.height / 100) ** 2)
-        
-        # Calculate target calories based on goal
-        if current_user.goal == 'lose':
-            target_calories = tdee - 500  # 500 calorie deficit
-        elif current_user.goal == 'gain':
-            target_calories = tdee + 500  # 500 calorie surplus
-        else:
-            target_calories = tdee  # maintain
-        
+    if energy and energy.complete:
         # Calculate days to goal
         if current_user.target_date:
             days_to_goal = (current_user.target_date - date.today()).days
             if days_to_goal < 0:
                 days_to_goal = 0
     
-    return render_template('profile.html', form=form, bmr=bmr, tdee=tdee, 
-                         target_calories=target_calories, bmi=bmi, days_to_goal=days_to_goal)
+    badges = Badge.query.filter_by(user_id=current_user.id).order_by(Badge.date_earned.desc(), Badge.id.desc()).all()
+    return render_template('profile.html', form=form, energy=energy, days_to_goal=days_to_goal,
+                         badges=badges)
 
 @app.route('/habits', methods=['GET', 'POST'])
 @login_required
@@ -158,28 +163,160 @@ def habits():
         flash('Habit added!', 'success')
         return redirect(url_for('habits'))
     habits = Habit.query.filter_by(user_id=current_user.id).all()
-    return render_template('habits.html', form=form, habits=habits)
+    # Streaks are stored on the habit; the week grid is one query for all habits
+    today = date.today()
+    week = weekly_completion(habits, today)
+    streaks = {habit.id: active_streak(habit, today) for habit in habits}
+    week_labels = [day.strftime('%a') for day in week_days(today)]
+    week_totals = [sum(days[i] for days in week.values()) for i in range(len(week_labels))]
+    return render_template('habits.html', form=form, habits=habits, week=week, streaks=streaks,
+                           week_labels=week_labels, week_totals=week_totals)
 
 @app.route('/habits/check/<int:habit_id>')
 @login_required
 def check_habit(habit_id):
     today = date.today()
-    log = HabitLog.query.filter_by(habit_id=habit_id, date=today).first()
+    habit = Habit.query.filter_by(id=habit_id, user_id=current_user.id).first_or_404()
+    log = HabitLog.query.filter_by(habit_id=habit.id, date=today).first()
     if not log:
-        log = HabitLog(habit_id=habit_id, date=today, completed=True)
+        log = HabitLog(habit_id=habit.id, date=today, completed=True)
         db.session.add(log)
+        record_daily_totals(current_user.id, today, habits_completed=1)
+        streak = record_habit_completion(habit.id, today)
+        badges = record_best(current_user.id, best_habit_streak=streak)
         db.session.commit()
-        flash('Habit checked for today!', 'success')
+        flash(f'Habit checked for today! Streak: {streak} day{"s" if streak != 1 else ""}.', 'success')
+        _flash_badges(badges)
     else:
         flash('Already checked today!', 'info')
     return redirect(url_for('habits'))
 
+WORKOUT_PAGE_SIZE = 12
+
+
+def _encode_workout_cursor(workout):
+    return f"{workout.date.isoformat()}_{workout.id}"
+
+
+def _decode_workout_cursor(cursor):
+    """Parse a ``<iso date>_<id>`` cursor; returns None if malformed."""
+    try:
+        started, workout_id = cursor.rsplit('_', 1)
+        return datetime.fromisoformat(started), int(workout_id)
+    except (AttributeError, ValueError):
+        return None
+
+
+def get_workout_history_page(user_id, before=None, limit=WORKOUT_PAGE_SIZE):
+    """Return one page of a user's workouts, newest first, with aggregates.
+
+    Uses keyset pagination on (date, id) and computes exercise count, set
+    count and total volume (reps x weight) in the same GROUP BY query, so a
+    page costs one round-trip regardless of how many sets it contains.
+
+    Returns:
+        (rows, next_cursor): rows are dicts with keys workout, exercise_count,
+        set_count and total_volume; next_cursor is None on the last page.
+    """
+    volume = db.func.coalesce(ExerciseSet.reps, 0) * db.func.coalesce(ExerciseSet.weight, 0)
+    query = db.session.query(
+        Workout,
+        db.func.count(db.distinct(WorkoutExercise.id)),
+        db.func.count(ExerciseSet.id),
+        db.func.coalesce(db.func.sum(volume), 0),
+    ).outerjoin(
+        WorkoutExercise, WorkoutExercise.workout_id == Workout.id
+    ).outerjoin(
+        ExerciseSet, ExerciseSet.workout_exercise_id == WorkoutExercise.id
+    ).filter(Workout.user_id == user_id)
+
+    position = _decode_workout_cursor(before) if before else None
+    if position:
+        started, workout_id = position
+        query = query.filter(db.or_(
+            Workout.date < started,
+            db.and_(Workout.date == started, Workout.id < workout_id),
+        ))
+
+    results = query.group_by(Workout.id).order_by(
+        Workout.date.desc(), Workout.id.desc()
+    ).limit(limit + 1).all()
+
+    rows = [
+        {
+            'workout': workout,
+            'exercise_count': exercise_count,
+            'set_count': set_count,
+            'total_volume': float(total_volume or 0),
+        }
+        for workout, exercise_count, set_count, total_volume in results[:limit]
+    ]
+    next_cursor = _encode_workout_cursor(rows[-1]['workout']) if len(results) > limit else None
+    return rows, next_cursor
+
+
 @app.route('/workouts')
 @login_required
 def workouts():
     """Display workout history and start new workout"""
-    user_workouts = Workout.query.filter_by(user_id=current_user.id).order_by(Workout.date.desc()).all()
-    return render_template('workouts.html', workouts=user_workouts)
+    rows, next_cursor = get_workout_history_page(current_user.id, before=request.args.get('before'))
+    return render_template('workouts.html', workouts=rows, next_cursor=next_cursor,
+                           is_first_page=not request.args.get('before'))
+
+
+@app.route('/workouts/history')
+@login_required
+def workout_history():
+    """Paginated workout history as JSON.
+
+    Query params:
+      before: cursor returned as next_cursor by the previous page
+      limit: page size (max 50)
+    """
+    limit = min(max(request.args.get('limit', WORKOUT_PAGE_SIZE, type=int), 1), 50)
+    rows, next_cursor = get_workout_history_page(current_user.id, before=request.args.get('before'), limit=limit)
+    return jsonify({
+        'success': True,
+        'workouts': [{
+            'id': row['workout'].id,
+            'name': row['workout'].name,
+            'date': row['workout'].date.isoformat(),
+            'duration': row['workout'].duration,
+            'notes': row['workout'].notes,
+            'exercise_count': row['exercise_count'],
+            'set_count': row['set_count'],
+            'total_volume': row['total_volume'],
+        } for row in rows],
+        'next_cursor': next_cursor,
+    })
+
+
+@app.route('/workouts/<int:workout_id>/exercises')
+@login_required
+def workout_exercise_detail(workout_id):
+    """Per-exercise breakdown for one workout card, loaded when it is expanded."""
+    workout = Workout.query.filter_by(id=workout_id, user_id=current_user.id).first_or_404()
+    rows = db.session.query(
+        Exercise.name,
+        Exercise.category,
+        db.func.count(ExerciseSet.id),
+        db.func.max(ExerciseSet.weight),
+    ).join(
+        WorkoutExercise, WorkoutExercise.exercise_id == Exercise.id
+    ).outerjoin(
+        ExerciseSet, ExerciseSet.workout_exercise_id == WorkoutExercise.id
+    ).filter(
+        WorkoutExercise.workout_id == workout.id
+    ).group_by(WorkoutExercise.id, Exercise.id).order_by(WorkoutExercise.order, WorkoutExercise.id).all()
+    return jsonify({
+        'success': True,
+        'exercises': [{
+            'name': name,
+            'category': category,
+            'set_count': set_count,
+            'top_weight': top_weight,
+        } for name, category, set_count, top_weight in rows],
+    })
 
 @app.route('/workout/new', methods=['GET', 'POST'])
 @login_required
@@ -207,14 +344,16 @@ def new_workout():
                 'Full Body': ['Jump Rope', 'Push-ups', 'Squats', 'Plank']
             }
             names = template_map.get(template, [])
+            by_name = exercise_catalog().by_name
             order = 0
             for name in names:
-                ex = Exercise.query.filter(Exercise.name.ilike(name)).first()
+                ex = by_name.get(name.lower())
                 if ex:
                     order += 1
                     we = WorkoutExercise(workout_id=workout.id, exercise_id=ex.id, order=order)
                     db.session.add(we)
             if order:
+                workout.last_exercise_order = order
                 db.session.commit()
 
         flash(f'Workout "{workout.name}" started!', 'success')
@@ -225,20 +364,36 @@ def new_workout():
 @login_required
 def workout_session(workout_id):
     """Active workout session - add exercises and sets"""
-    workout = Workout.query.get_or_404(workout_id)
+    # Workout, exercises and sets in a fixed number of queries
+    workout = load_workout_session(workout_id)
+    if workout is None:
+        abort(404)
     if workout.user_id != current_user.id:
         flash('Access denied.', 'danger')
         return redirect(url_for('workouts'))
     
-    # Get exercises grouped by category
-    exercises_by_category = {}
-    all_exercises = Exercise.query.order_by(Exercise.category, Exercise.name).all()
-    for exercise in all_exercises:
-        if exercise.category not in exercises_by_category:
-            exercises_by_category[exercise.category] = []
-        exercises_by_category[exercise.category].append(exercise)
+    # Exercises grouped by category, from the process-level catalog cache
+    exercises_by_category = exercise_catalog().by_category
     
-    return render_template('workout_session.html', workout=workout, exercises_by_category=exercises_by_category)
+    return render_template('workout_session.html', workout=workout, exercises_by_category=exercises_by_category,
+                           workout_state=workout_state(workout))
+
+@app.route('/workout/<int:workout_id>/state')
+@login_required
+def workout_session_state(workout_id):
+    """The session's exercises and sets as JSON, for partial page refreshes.
+
+    Carries an ETag, so polling an unchanged workout gets a bodiless 304.
+    """
+    workout = load_workout_session(workout_id)
+    if workout is None:
+        abort(404)
+    if workout.user_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+    res = jsonify(workout_state(workout))
+    res.headers['Cache-Control'] = 'private, no-cache'
+    res.add_etag()
+    return res.make_conditional(request)
 
 @app.route('/exercise/video')
 @login_required
@@ -252,8 +407,8 @@ def exercise_video_info():
     name = request.args.get('name', '').strip()
     if not name:
         return jsonify({ 'success': False }), 400
-    # 1) Check DB for a stored video URL (case-insensitive name match)
-    ex = Exercise.query.filter(Exercise.name.ilike(name)).first()
+    # 1) Check the catalog for a stored video URL (case-insensitive name match)
+    ex = exercise_catalog().by_name.get(name.lower())
     if ex and ex.video_url:
         return jsonify({
             'success': True,
@@ -280,11 +435,12 @@ def manage_exercise_videos():
             ex = Exercise.query.get(int(ex_id))
             if ex:
                 ex.video_url = vid or None
+                bump_catalog_version(EXERCISE)
                 db.session.commit()
                 flash(f'Video updated for {ex.name}', 'success')
         return redirect(url_for('manage_exercise_videos'))
 
-    exercises = Exercise.query.order_by(Exercise.category, Exercise.name).all()
+    exercises = exercise_catalog().exercises
     return render_template('manage_exercise_videos.html', exercises=exercises)
 
 @app.route('/workout/<int:workout_id>/add_exercise', methods=['POST'])
@@ -296,20 +452,22 @@ def add_exercise_to_workout(workout_id):
         return jsonify({'error': 'Access denied'}), 403
     
     exercise_id = request.json.get('exercise_id')
-    exercise = Exercise.query.get_or_404(exercise_id)
+    # The page sends ids read from data attributes, i.e. as strings
+    exercise = exercise_catalog().by_id.get(int(exercise_id)) if str(exercise_id).isdigit() else None
+    if exercise is None:
+        abort(404)
+    exercise_id = exercise.id
     
     # Check if exercise already exists in workout
     existing = WorkoutExercise.query.filter_by(workout_id=workout_id, exercise_id=exercise_id).first()
     if existing:
         return jsonify({'error': 'Exercise already added to workout'}), 400
     
-    # Get the order for this exercise (next in sequence)
-    max_order = db.session.query(db.func.max(WorkoutExercise.order)).filter_by(workout_id=workout_id).scalar() or 0
-    
+    # Next in sequence, reserved atomically on the workout row
     workout_exercise = WorkoutExercise(
         workout_id=workout_id,
         exercise_id=exercise_id,
-        order=max_order + 1
+        order=reserve_exercise_orders(workout_id)
     )
     db.session.add(workout_exercise)
     db.session.commit()
@@ -325,25 +483,29 @@ def add_exercise_to_workout(workout_id):
 @login_required
 def add_set(workout_exercise_id):
     """Add a set to an exercise in the workout"""
-    workout_exercise = WorkoutExercise.query.get_or_404(workout_exercise_id)
-    if workout_exercise.workout.user_id != current_user.id:
+    owner_id = db.session.query(Workout.user_id).join(
+        WorkoutExercise, WorkoutExercise.workout_id == Workout.id
+    ).filter(WorkoutExercise.id == workout_exercise_id).scalar()
+    if owner_id is None:
+        abort(404)
+    if owner_id != current_user.id:
         return jsonify({'error': 'Access denied'}), 403
     
     data = request.json
     
-    # Get the set number (next in sequence)
-    max_set = db.session.query(db.func.max(ExerciseSet.set_number)).filter_by(workout_exercise_id=workout_exercise_id).scalar() or 0
-    
+    # Next in sequence, reserved atomically on the exercise row
     exercise_set = ExerciseSet(
         workout_exercise_id=workout_exercise_id,
-        set_number=max_set + 1,
+        set_number=reserve_set_numbers(workout_exercise_id),
         reps=data.get('reps'),
         weight=data.get('weight'),
         duration=data.get('duration'),
         distance=data.get('distance')
     )
     db.session.add(exercise_set)
+    badges = record_sets(current_user.id, [data])
     db.session.commit()
+    _flash_badges(badges)
     
     return jsonify({
         'success': True,
@@ -351,6 +513,67 @@ def add_set(workout_exercise_id):
         'set_number': exercise_set.set_number
     })
 
+# Largest batch /workout/<id>/sets accepts in one request
+MAX_SETS_PER_BATCH = 100
+
+
+@app.route('/workout/<int:workout_id>/sets', methods=['POST'])
+@login_required
+def add_sets(workout_id):
+    """Add many sets, across any exercises of the workout, in one commit.
+
+    Body: {"sets": [{"workout_exercise_id", "reps"?, "weight"?, "duration"?,
+    "distance"?}, ...]}. Sets are numbered in the order given, after any
+    sets already stored for their exercise.
+    Response: {success, sets: [{workout_exercise_id, set_id, set_number}]}
+    in request order.
+    """
+    workout = Workout.query.get_or_404(workout_id)
+    if workout.user_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+
+    items = (request.get_json(silent=True) or {}).get('sets')
+    if not isinstance(items, list) or not items:
+        return jsonify({'error': 'Expected a non-empty "sets" list'}), 400
+    if len(items) > MAX_SETS_PER_BATCH:
+        return jsonify({'error': f'At most {MAX_SETS_PER_BATCH} sets per request'}), 413
+
+    parsed = []
+    for index, item in enumerate(items):
+        try:
+            parsed.append((int(item.get('workout_exercise_id')), set_fields(item)))
+        except (AttributeError, TypeError, ValueError):
+            return jsonify({'error': f'Invalid set at index {index}'}), 400
+
+    # One counter bump per exercise reserves all of its numbers (and checks
+    # the exercise belongs to this workout)
+    counts = {}
+    for workout_exercise_id, _ in parsed:
+        counts[workout_exercise_id] = counts.get(workout_exercise_id, 0) + 1
+    next_number = {}
+    for workout_exercise_id, count in counts.items():
+        first = reserve_set_numbers(workout_exercise_id, count, workout_id=workout_id)
+        if first is None:
+            db.session.rollback()
+            return jsonify({'error': f'Exercise {workout_exercise_id} is not in this workout'}), 400
+        next_number[workout_exercise_id] = first
+
+    new_sets = []
+    for workout_exercise_id, fields in parsed:
+        new_sets.append(ExerciseSet(workout_exercise_id=workout_exercise_id,
+                                    set_number=next_number[workout_exercise_id], **fields))
+        next_number[workout_exercise_id] += 1
+    db.session.add_all(new_sets)
+    db.session.flush()
+    # Read ids before the commit expires the objects (saves a SELECT per set)
+    created = [{'workout_exercise_id': s.workout_exercise_id, 'set_id': s.id, 'set_number': s.set_number}
+               for s in new_sets]
+    badges = record_sets(current_user.id, (fields for _, fields in parsed))
+    db.session.commit()
+    _flash_badges(badges)
+
+    return jsonify({'success': True, 'sets': created})
+
 @app.route('/workout/<int:workout_id>/finish', methods=['POST'])
 @login_required
 def finish_workout(workout_id):
@@ -362,10 +585,7 @@ def finish_workout(workout_id):
     duration = request.json.get('duration')  # in minutes
     notes = request.json.get('notes', '')
     
-    workout.duration = duration
-    if notes:
-        workout.notes = (workout.notes or '') + '\n' + notes
-    
+    badges = complete_workout(workout, duration, notes)
     db.session.commit()
     
     # Calculate some stats
@@ -376,8 +596,38 @@ def finish_workout(workout_id):
     total_exercises = WorkoutExercise.query.filter_by(workout_id=workout_id).count()
     
     flash(f'Workout completed! {total_exercises} exercises, {total_sets} sets, {duration} minutes', 'success')
+    _flash_badges(badges)
     return jsonify({'success': True})
 
+@app.route('/workout/<int:workout_id>/sync', methods=['POST'])
+@login_required
+def sync_workout(workout_id):
+    """Apply a batch of offline-queued session operations exactly once.
+
+    Body: {"ops": [...]} (see app/workout_sync.py; an empty list just reads
+    the state).
+    Response: {success, applied, duplicates, rejected, badges (names earned), state}
+    """
+    workout = Workout.query.get_or_404(workout_id)
+    if workout.user_id != current_user.id:
+        return jsonify({'error': 'Access denied'}), 403
+
+    ops = (request.get_json(silent=True) or {}).get('ops', [])
+    if not isinstance(ops, list):
+        return jsonify({'error': 'Expected an "ops" list'}), 400
+    if len(ops) > MAX_OPS_PER_SYNC:
+        return jsonify({'error': f'At most {MAX_OPS_PER_SYNC} operations per request'}), 413
+
+    result = apply_sync_operations(workout, ops)
+    state = workout_state(load_workout_session(workout_id))
+    if result.pop('finished'):
+        total_sets = sum(len(exercise['sets']) for exercise in state['exercises'])
+        flash(f"Workout completed! {len(state['exercises'])} exercises, {total_sets} sets, "
+              f"{workout.duration} minutes", 'success')
+    _flash_badges(result['badges'])
+    result['badges'] = [badge.name for badge in result['badges']]
+    return jsonify({'success': True, **result, 'state': state})
+
 # Keep the old exercise route for backward compatibility
 @app.route('/exercise', methods=['GET', 'POST'])
 @login_required
@@ -394,57 +644,68 @@ def food():
     # Get search query from request
     search_query = request.args.get('search', '').strip()
     category_filter = request.args.get('category', '').strip()
-    
-    # Base query
-    foods_query = Food.query
-    
-    # Apply search filter
-    if search_query:
-        foods_query = foods_query.filter(
-            db.or_(
-                Food.name.ilike(f'%{search_query}%'),
-                Food.description.ilike(f'%{search_query}%')
-            )
-        )
-    
-    # Apply category filter
-    if category_filter:
-        foods_query = foods_query.filter(Food.category == category_filter)
-    
-    # Get all foods for dropdown and filtered foods for display
-    all_foods = Food.query.order_by(Food.category, Food.name).all()
-    filtered_foods = foods_query.order_by(Food.category, Food.name).all()
-    
-    # Populate food choices for the form
-    form.food.choices = [(food.id, f"{food.name} ({food.category}) - {food.calories_per_serving} cal/{food.serving_size}") for food in all_foods]
+    page = request.args.get('page', 1, type=int)
     
     if form.validate_on_submit():
-        food = Food.query.get(form.food.data)
+        food = food_catalog().by_id.get(form.food.data)
+        if food is None:
+            flash('Pick a food from the search results.', 'danger')
+            return redirect(url_for('food'))
         total_calories = food.calories_per_serving * form.servings.data
         
         log = FoodLog(
-            food_id=form.food.data,
+            food_id=food.id,
             meal_type=form.meal_type.data,
             servings=form.servings.data,
             total_calories=total_calories,
+            date=date.today(),
             user_id=current_user.id
         )
         db.session.add(log)
+        record_daily_totals(current_user.id, log.date, calories_consumed=total_calories)
+        badges = record_progress(current_user.id, foods_logged=1)
         db.session.commit()
         flash(f'Food logged! {total_calories:.0f} calories consumed for {form.meal_type.data}.', 'success')
+        _flash_badges(badges)
         return redirect(url_for('food'))
     
+    # One page of ranked search results; the form picks foods via autocomplete
+    filtered_foods, has_more = search_foods(search_query, category_filter, page)
+    
     # Only load food logs from last 30 days - much faster
     thirty_days_ago = date.today() - timedelta(days=30)
     user_foods = FoodLog.query.filter_by(user_id=current_user.id).filter(FoodLog.date >= thirty_days_ago).order_by(FoodLog.date.desc()).all()
     
-    # Get unique categories for filter dropdown
-    categories = db.session.query(Food.category).distinct().order_by(Food.category).all()
-    categories = [cat[0] for cat in categories]
+    # Unique categories for the filter dropdown, from the catalog cache
+    categories = food_catalog().categories
     
     return render_template('food.html', form=form, foods=user_foods, 
                          all_foods=filtered_foods, categories=categories,
-                         search_query=search_query, category_filter=category_filter)
+                         search_query=search_query, category_filter=category_filter,
+                         page=page, has_more=has_more)
+
+
+@app.route('/food/search')
+@login_required
+def food_search():
+    """Ranked, paginated food search as JSON (used by the autocomplete).
+
+    Query args: q, category, page (1-based), per_page (max 100).
+    """
+    page = request.args.get('page', 1, type=int)
+    foods, has_more = search_foods(
+        request.args.get('q', '').strip(),
+        request.args.get('category', '').strip(),
+        page,
+        request.args.get('per_page', FOOD_PAGE_SIZE, type=int),
+    )
+    res = make_response(jsonify({
+        'items': [food_to_dict(food) for food in foods],
+        'page': page,
+        'has_more': has_more,
+    }))
+    res.headers['Cache-Control'] = 'private, max-age=60'
+    return res
 
 @app.route('/water', methods=['GET', 'POST'])
 @login_required
@@ -453,16 +714,21 @@ def water():
     if form.validate_on_submit():
         log = WaterLog(
             amount=form.amount.data,
+            date=date.today(),
             user_id=current_user.id
         )
         db.session.add(log)
+        totals = record_daily_totals(current_user.id, log.date, water_ml=form.amount.data)
+        badges = record_water_intake(current_user.id, totals['water_ml'] if totals else 0, form.amount.data)
         db.session.commit()
         flash(f'Water logged! {form.amount.data} ml added.', 'success')
+        _flash_badges(badges)
         return redirect(url_for('water'))
     
     water_logs = WaterLog.query.filter_by(user_id=current_user.id).all()
-    total_water = sum(log.amount for log in water_logs if log.date == date.today())
-    return render_template('water.html', form=form, water_logs=water_logs, total_water=total_water, today=date.today())
+    total_water = get_daily_summary(current_user.id).water_ml
+    return render_template('water.html', form=form, water_logs=water_logs, total_water=total_water, today=date.today(),
+                           water_goal=WATER_GOAL_ML)
 
 
 # ============================================
@@ -482,9 +748,11 @@ def ai_coach_chat():
     """Handle AI coach chat messages via AJAX"""
     print("=== AI Coach Chat Route Called ===")
     
+    from .ai_coach import get_coach
+    if _coach_request_too_large(get_coach()):
+        return jsonify({'error': 'Request too large'}), 413
+    
     try:
-        from .ai_coach import FitnessCoach
-        
         data = request.get_json()
         print(f"Received data: {data}")
         user_message = data.get('message', '').strip()
@@ -502,10 +770,12 @@ def ai_coach_chat():
         recent_data = get_user_recent_data(current_user) if current_user.is_authenticated else {}
         print(f"Recent data: {recent_data}")
         
-        # Initialize AI coach
-        print("Initializing FitnessCoach...")
-        coach = FitnessCoach()
-        print("FitnessCoach initialized successfully")
+        # Shared, process-wide AI coach
+        coach = get_coach()
+        
+        # Opt-in async mode: queue the model call and return a job id right away
+        if data.get('async') or async_mode_enabled():
+            return _enqueue_coach_chat(coach, user_message, recent_data, conversation_history)
         
         # Get AI response
         print("Getting AI response...")
@@ -527,6 +797,8 @@ def ai_coach_chat():
         res.headers['Cache-Control'] = 'no-store'
         return res
         
+    except HTTPException:
+        raise  # e.g. malformed JSON: an HTTP error, not a coach failure
     except Exception as e:
         print(f"=== AI Coach Error ===")
         print(f"Error type: {type(e).__name__}")
@@ -534,9 +806,9 @@ def ai_coach_chat():
         import traceback
         traceback.print_exc()
         # Return success with fallback response so user gets helpful answer
-        from .ai_coach import FitnessCoach
+        from .ai_coach import get_coach
         try:
-            coach = FitnessCoach()
+            coach = get_coach()
             safe_user = current_user if (hasattr(current_user, 'is_authenticated') and current_user.is_authenticated) else None
             fallback = coach._get_fallback_response(user_message if 'user_message' in locals() else '', safe_user)
             res = make_response(jsonify({
@@ -557,15 +829,126 @@ def ai_coach_chat():
             return res
 
 
+def _coach_request_too_large(coach):
+    """Check the body size against the coach's cap before parsing it.
+
+    Bodies sent without a Content-Length (chunked) are read here, at most
+    one byte past the cap: Werkzeug stops reading at max_content_length
+    without an error, which would otherwise surface as truncated JSON.
+    """
+    cap = coach.max_request_bytes
+    request.max_content_length = cap + 1
+    if request.content_length is not None:
+        return request.content_length > cap
+    return len(request.get_data(cache=True)) > cap
+
+
+def _coach_job_owner():
+    """Owner key for coach jobs; only the owner may poll a job.
+
+    Anonymous visitors get a random token in their signed session cookie,
+    since everyone behind one NAT or proxy shares a client address.
+    """
+    if current_user.is_authenticated:
+        return f"user:{current_user.id}"
+    if 'coach_job_token' not in session:
+        session['coach_job_token'] = secrets.token_urlsafe(16)
+    return f"anon:{session['coach_job_token']}"
+
+
+def _enqueue_coach_chat(coach, user_message, recent_data, conversation_history):
+    """Submit a chat call to the background pool (202 + job id)."""
+    user = snapshot_user(current_user) if current_user.is_authenticated else None
+    queue = get_job_queue()
+    try:
+        job = queue.submit(
+            _coach_job_owner(),
+            call=lambda: coach.chat(user_message, user, recent_data, conversation_history),
+            fallback=lambda: coach._get_fallback_response(user_message, user),
+        )
+    except UserLimitReached:
+        return jsonify({'success': False, 'error': 'Too many pending coach requests, please wait'}), 429
+    except QueueFull:
+        # Pool saturated: answer offline now rather than queueing more AI work
+        res = make_response(jsonify({
+            'success': True,
+            'response': coach._get_fallback_response(user_message, user),
+            'timestamp': datetime.now().isoformat()
+        }), 200)
+        res.headers['Cache-Control'] = 'no-store'
+        return res
+    res = make_response(jsonify({
+        'success': True,
+        'job_id': job.id,
+        'status': 'queued',
+        'result_url': url_for('ai_coach_job_result', job_id=job.id)
+    }), 202)
+    res.headers['Cache-Control'] = 'no-store'
+    return res
+
+
+@app.route('/ai-coach/jobs/<job_id>')
+def ai_coach_job_result(job_id):
+    """Poll a queued coach chat; returns the answer once it is ready."""
+    job = get_job_queue().get(job_id, _coach_job_owner())
+    if job is None:
+        return jsonify({'success': False, 'error': 'Job not found'}), 404
+    res = make_response(jsonify({'success': True, **job.to_dict(), 'timestamp': datetime.now().isoformat()}), 200)
+    res.headers['Cache-Control'] = 'no-store'
+    return res
+
+
+@app.route('/ai-coach/jobs/metrics')
+@login_required
+def ai_coach_job_metrics():
+    """Queue depth and throughput of the background coach pool."""
+    return jsonify({'success': True, **get_job_queue().stats()})
+
+
+@app.route('/ai-coach/chat/stream', methods=['POST'])
+@csrf.exempt
+def ai_coach_chat_stream():
+    """Stream the AI coach reply as Server-Sent Events.
+
+    Emits one ``data: {"token": ...}`` event per chunk, then ``event: done``.
+    """
+    from .ai_coach import get_coach
+
+    coach = get_coach()
+    if _coach_request_too_large(coach):
+        return jsonify({'error': 'Request too large'}), 413
+
+    data = request.get_json(silent=True) or {}
+    user_message = (data.get('message') or '').strip()
+    if not user_message:
+        return jsonify({'error': 'Message is required'}), 400
+
+    conversation_history = data.get('history', [])
+    user = current_user if current_user.is_authenticated else None
+    recent_data = get_user_recent_data(user) if user else {}
+
+    def events():
+        # Send something immediately so proxies and the browser start rendering
+        yield ': stream open\n\n'
+        for token in coach.stream_chat(user_message, user, recent_data, conversation_history):
+            yield f"data: {json.dumps({'token': token})}\n\n"
+        yield f"event: done\ndata: {json.dumps({'timestamp': datetime.now().isoformat()})}\n\n"
+
+    res = Response(stream_with_context(events()), mimetype='text/event-stream')
+    res.headers['Cache-Control'] = 'no-store'
+    res.headers['X-Accel-Buffering'] = 'no'  # disable nginx response buffering
+    return res
+
+
 @app.route('/ai-coach/motivation')
 @login_required
 def ai_coach_motivation():
     """Get daily motivation from AI coach"""
-    from .ai_coach import FitnessCoach
+    from .ai_coach import get_coach
     
     try:
         recent_data = get_user_recent_data(current_user)
-        coach = FitnessCoach()
+        coach = get_coach()
         motivation = coach.get_daily_motivation(current_user, recent_data)
         
         return jsonify({
@@ -583,10 +966,10 @@ def ai_coach_motivation():
 @login_required
 def ai_coach_workout():
     """Get workout suggestion from AI coach"""
-    from .ai_coach import FitnessCoach
+    from .ai_coach import get_coach
     
     try:
-        coach = FitnessCoach()
+        coach = get_coach()
         workout = coach.suggest_workout(current_user)
         
         return jsonify({
@@ -602,48 +985,17 @@ def ai_coach_workout():
 
 def get_user_recent_data(user):
     """Helper function to gather user's recent activity data"""
-    today = date.today()
-    week_ago = today - timedelta(days=7)
-    
-    # Get today's data
-    habits_today = HabitLog.query.join(Habit).filter(
-        Habit.user_id == user.id,
-        HabitLog.date == today,
-        HabitLog.completed == True
-    ).count()
-    
-    exercises_today = ExerciseLog.query.filter_by(
-        user_id=user.id,
-        date=today
-    ).all()
-    
-    calories_burned = sum(e.calories_burned for e in exercises_today)
-    
-    exercise_names = [
-        f"{e.exercise.name} ({e.duration} min)"
-        for e in exercises_today[:3]  # Show last 3 exercises
-    ] if exercises_today else []
-    
-    foods_today = FoodLog.query.filter_by(
-        user_id=user.id,
-        date=today
-    ).all()
+    # One query (memoized briefly per user) for today's totals and exercises
+    snapshot = get_activity_snapshot(user.id)
     
-    calories_consumed = sum(f.total_calories for f in foods_today)
-    
-    water_today = WaterLog.query.filter_by(
-        user_id=user.id,
-        date=today
-    ).all()
-    
-    water_intake = sum(w.amount for w in water_today)
+    exercise_names = [f"{name} ({duration} min)" for name, duration in snapshot['exercises']]
     
     return {
-        'habits_completed': habits_today,
+        'habits_completed': snapshot['habits_completed'],
         'exercises': ', '.join(exercise_names) if exercise_names else 'No exercises today',
-        'calories_burned': round(calories_burned, 0),
-        'calories_consumed': round(calories_consumed, 0),
-        'water_intake': water_intake,
+        'calories_burned': round(snapshot['calories_burned'], 0),
+        'calories_consumed': round(snapshot['calories_consumed'], 0),
+        'water_intake': snapshot['water_ml'],
     } 
 
 
@@ -710,11 +1062,15 @@ def friends():
                 flash('Request not found.', 'warning')
             else:
                 a, b = sorted([req.from_user_id, req.to_user_id])
+                badges = []
                 if not Friendship.query.filter_by(user_a_id=a, user_b_id=b).first():
                     db.session.add(Friendship(user_a_id=a, user_b_id=b))
+                    record_progress(req.from_user_id, friends=1)
+                    badges = record_progress(current_user.id, friends=1)
                 req.status = 'accepted'
                 db.session.commit()
                 flash('Friend request accepted.', 'success')
+                _flash_badges(badges)
 
         elif action == 'decline':
             req = FriendRequest.query.filter_by(id=int(request.form.get('request_id', 0)), to_user_id=current_user.id, status='pending').first()
@@ -735,6 +1091,8 @@ def friends():
             fr = Friendship.query.filter_by(user_a_id=a, user_b_id=b).first()
             if fr:
                 db.session.delete(fr)
+                record_progress(a, friends=-1)
+                record_progress(b, friends=-1)
                 db.session.commit()
                 flash('Friend removed.', 'info')
 
@@ -774,6 +1132,10 @@ def friends():
                            status_for=_friend_status)
 
 
+# Exercise and meal rows listed on a friend's progress page
+FRIEND_RECENT_LIMIT = 10
+
+
 @app.route('/friends/<int:user_id>')
 @login_required
 def friend_progress(user_id):
@@ -787,27 +1149,26 @@ def friend_progress(user_id):
     today = date.today()
     week_ago = today - timedelta(days=7)
 
-    # Fetch friend data similar to dashboard but read-only
-    habits = Habit.query.filter_by(user_id=user.id).limit(10).all()
-    exercises = ExerciseLog.query.filter_by(user_id=user.id).filter(ExerciseLog.date >= week_ago).all()
-    foods = FoodLog.query.filter_by(user_id=user.id).filter(FoodLog.date >= week_ago).all()
-    water_logs = WaterLog.query.filter_by(user_id=user.id).filter(WaterLog.date >= week_ago).all()
+    # Totals come from the rollup; raw logs only for the rows listed
+    daily = get_daily_summaries(user.id, week_ago, today)
+    summary = daily[today]
+    water_days = [daily[day] for day in sorted(daily, reverse=True) if daily[day].water_ml]
 
-    # Basic stats
-    habits_completed_today = HabitLog.query.join(Habit).filter(
-        Habit.user_id == user.id, HabitLog.date == today, HabitLog.completed == True
-    ).count()
-    total_water_today = sum(w.amount for w in water_logs if w.date == today)
-    total_food_cal_today = sum(f.total_calories for f in foods if f.date == today)
-    total_exercise_cal_today = sum(e.calories_burned for e in exercises if e.date == today)
+    habits = Habit.query.filter_by(user_id=user.id).limit(10).all()
+    exercises = ExerciseLog.query.options(joinedload(ExerciseLog.exercise)).filter(
+        ExerciseLog.user_id == user.id, ExerciseLog.date >= week_ago
+    ).order_by(ExerciseLog.date.desc(), ExerciseLog.id.desc()).limit(FRIEND_RECENT_LIMIT).all()
+    foods = FoodLog.query.options(joinedload(FoodLog.food)).filter(
+        FoodLog.user_id == user.id, FoodLog.date >= week_ago
+    ).order_by(FoodLog.date.desc(), FoodLog.id.desc()).limit(FRIEND_RECENT_LIMIT).all()
 
     return render_template('friend_progress.html',
                            friend=user,
                            habits=habits,
                            exercises=exercises,
                            foods=foods,
-                           water_logs=water_logs,
-                           habits_completed_today=habits_completed_today,
-                           total_water_today=total_water_today,
-                           total_food_cal_today=total_food_cal_today,
-                           total_exercise_cal_today=total_exercise_cal_today)
\ No newline at end of file
+                           water_days=water_days,
+                           habits_completed_today=summary.habits_completed,
+                           total_water_today=summary.water_ml,
+                           total_food_cal_today=summary.calories_consumed,
+                           total_exercise_cal_today=summary.calories_burned)
\ No newline at end of file
@@ -0,0 +1,287 @@
+"""
+Daily activity rollups.
+
+Every write route that changes a user's daily totals (food, water, habit
+check-ins, finished workouts) calls ``record_daily_totals()`` before its
+commit, so the ``DailySummary`` row moves in the same transaction as the
+log row itself. Views that only need per-day totals read the rollup instead
+of re-summing raw logs. ``rebuild_daily_summaries()`` recomputes everything
+from the log tables for backfills or after bulk imports.
+
+``get_activity_snapshot()`` serves the AI coach's "today" context from one
+query, memoized per user for a few seconds. ``record_daily_totals()`` marks
+the user on the session and the memo is dropped once that transaction
+commits, so the next chat message sees the write and a reader racing the
+commit cannot re-cache the old totals.
+"""
+
+import os
+import threading
+import time
+from datetime import date, timedelta
+
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from . import db, dialect_insert
+from .utils import as_date
+from .models import (DailySummary, FoodLog, WaterLog, ExerciseLog, Habit, HabitLog,
+                     Workout, WorkoutExercise, Exercise)
+
+# Used when a finished workout has no exercises attached
+DEFAULT_CALORIES_PER_MINUTE = 5.0
+
+_TOTAL_FIELDS = ('calories_consumed', 'calories_burned', 'water_ml', 'habits_completed')
+
+
+def record_daily_totals(user_id, day, calories_consumed=0.0, calories_burned=0.0,
+                        water_ml=0.0, habits_completed=0):
+    """Add the given deltas to the user's rollup row for ``day``.
+
+    Does not commit: callers commit together with the log row they wrote.
+    A single INSERT ... ON CONFLICT DO UPDATE adds the deltas in SQL, so
+    concurrent writers (including two first writes of the day) neither lose
+    updates nor trip the (user_id, date) unique constraint.
+
+    Returns:
+        dict of the day's totals after the update (None if every delta is 0)
+    """
+    day = as_date(day)
+    deltas = {
+        'calories_consumed': calories_consumed or 0.0,
+        'calories_burned': calories_burned or 0.0,
+        'water_ml': water_ml or 0.0,
+        'habits_completed': habits_completed or 0,
+    }
+    if not any(deltas.values()):
+        return None
+    db.session.info.setdefault(_STALE_SNAPSHOTS, set()).add(user_id)
+
+    stmt = dialect_insert(DailySummary).values(user_id=user_id, date=day, **deltas)
+    totals = db.session.execute(
+        stmt.on_conflict_do_update(
+            index_elements=['user_id', 'date'],
+            set_={field: getattr(DailySummary, field) + getattr(stmt.excluded, field) for field in deltas},
+        ).returning(*(getattr(DailySummary, field) for field in _TOTAL_FIELDS))
+    ).one()
+    return totals._asdict()
+
+
+def get_daily_summaries(user_id, start, end=None):
+    """Return ``{date: DailySummary}`` for ``start``..``end`` (inclusive).
+
+    Days without activity are filled with unsaved zero rows so templates can
+    index any day in the range.
+    """
+    end = end or date.today()
+    rows = DailySummary.query.filter(
+        DailySummary.user_id == user_id,
+        DailySummary.date >= start,
+        DailySummary.date <= end,
+    ).all()
+    by_day = {row.date: row for row in rows}
+    day = start
+    while day <= end:
+        if day not in by_day:
+            by_day[day] = DailySummary(user_id=user_id, date=day, calories_consumed=0.0,
+                                       calories_burned=0.0, water_ml=0.0, habits_completed=0)
+        day += timedelta(days=1)
+    return by_day
+
+
+def get_daily_summary(user_id, day=None):
+    """Return the rollup row for a single day (zeros if nothing was logged)."""
+    day = day or date.today()
+    return get_daily_summaries(user_id, day, day)[day]
+
+
+def workout_calories(workout_id, duration):
+    """Estimate calories burned by a workout of ``duration`` minutes.
+
+    Uses the mean ``calories_per_minute`` of the exercises in the workout.
+    """
+    if not duration:
+        return 0.0
+    rate = db.session.query(db.func.avg(Exercise.calories_per_minute)).join(
+        WorkoutExercise, WorkoutExercise.exercise_id == Exercise.id
+    ).filter(WorkoutExercise.workout_id == workout_id).scalar()
+    return float(duration) * (rate or DEFAULT_CALORIES_PER_MINUTE)
+
+
+def rebuild_daily_summaries(user_ids=None):
+    """Recompute rollup rows from the raw log tables.
+
+    Args:
+        user_ids: Optional iterable of user ids; rebuilds every user if omitted.
+    Returns:
+        Number of summary rows written.
+    """
+    user_ids = list(user_ids) if user_ids is not None else None
+
+    def scoped(query, column):
+        return query.filter(column.in_(user_ids)) if user_ids is not None else query
+
+    totals = {}
+
+    def add(user_id, day, field, value):
+        key = (user_id, as_date(day))
+        row = totals.setdefault(key, dict.fromkeys(_TOTAL_FIELDS, 0))
+        row[field] += value or 0
+
+    food_rows = scoped(db.session.query(
+        FoodLog.user_id, FoodLog.date, db.func.sum(FoodLog.total_calories)
+    ), FoodLog.user_id).group_by(FoodLog.user_id, FoodLog.date)
+    for user_id, day, value in food_rows:
+        add(user_id, day, 'calories_consumed', value)
+
+    water_rows = scoped(db.session.query(
+        WaterLog.user_id, WaterLog.date, db.func.sum(WaterLog.amount)
+    ), WaterLog.user_id).group_by(WaterLog.user_id, WaterLog.date)
+    for user_id, day, value in water_rows:
+        add(user_id, day, 'water_ml', value)
+
+    exercise_rows = scoped(db.session.query(
+        ExerciseLog.user_id, ExerciseLog.date, db.func.sum(ExerciseLog.calories_burned)
+    ), ExerciseLog.user_id).group_by(ExerciseLog.user_id, ExerciseLog.date)
+    for user_id, day, value in exercise_rows:
+        add(user_id, day, 'calories_burned', value)
+
+    habit_rows = scoped(db.session.query(
+        Habit.user_id, HabitLog.date, db.func.count(HabitLog.id)
+    ).join(Habit, HabitLog.habit_id == Habit.id).filter(
+        HabitLog.completed == True
+    ), Habit.user_id).group_by(Habit.user_id, HabitLog.date)
+    for user_id, day, value in habit_rows:
+        add(user_id, day, 'habits_completed', value)
+
+    rates = dict(db.session.query(
+        WorkoutExercise.workout_id, db.func.avg(Exercise.calories_per_minute)
+    ).join(Exercise, WorkoutExercise.exercise_id == Exercise.id).group_by(WorkoutExercise.workout_id))
+    workout_rows = scoped(db.session.query(
+        Workout.id, Workout.user_id, Workout.date, Workout.duration
+    ), Workout.user_id).filter(Workout.duration.isnot(None))
+    for workout_id, user_id, started, duration in workout_rows:
+        rate = rates.get(workout_id) or DEFAULT_CALORIES_PER_MINUTE
+        add(user_id, started, 'calories_burned', float(duration) * rate)
+
+    scoped(DailySummary.query, DailySummary.user_id).delete(synchronize_session='fetch')
+    db.session.add_all(
+        DailySummary(user_id=user_id, date=day, **values)
+        for (user_id, day), values in totals.items()
+    )
+    db.session.commit()
+    invalidate_activity_snapshot(*(user_ids or ()))
+    return len(totals)
+
+
+# Exercises listed in the snapshot (the coach only shows a few)
+SNAPSHOT_EXERCISES = 3
+
+# session.info key: users whose snapshot goes stale when the session commits
+_STALE_SNAPSHOTS = 'stale_activity_snapshots'
+
+_snapshot_lock = threading.Lock()
+
+
+def _snapshot_memo():
+    """App-scoped ``{user_id: (expires_at, day, snapshot)}``.
+
+    Also holds ``'generation'``, bumped by every invalidation, so a load that
+    raced an invalidation is not stored.
+    """
+    memo = current_app.extensions.get('activity_snapshots')
+    if memo is None:
+        with _snapshot_lock:
+            memo = current_app.extensions.setdefault('activity_snapshots', {'generation': 0})
+    return memo
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_committed_snapshots(session):
+    user_ids = session.info.pop(_STALE_SNAPSHOTS, None)
+    if user_ids and has_app_context():
+        invalidate_activity_snapshot(*user_ids)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_stale_snapshots(session):
+    session.info.pop(_STALE_SNAPSHOTS, None)
+
+
+def _load_activity_snapshot(user_id, day):
+    """Today's rollup totals and first exercises in a single UNION ALL query."""
+    totals = db.select(
+        db.literal_column("'totals'").label('kind'),
+        db.cast(db.null(), db.String).label('name'),
+        DailySummary.calories_consumed.label('a'),
+        DailySummary.calories_burned.label('b'),
+        DailySummary.water_ml.label('c'),
+        DailySummary.habits_completed.label('d'),
+    ).where(DailySummary.user_id == user_id, DailySummary.date == day)
+    exercises = db.select(
+        db.literal_column("'exercise'").label('kind'),
+        Exercise.name.label('name'),
+        ExerciseLog.duration.label('a'),
+        # Typed NULLs: PostgreSQL reads a bare NULL in a UNION as text
+        db.cast(db.null(), db.Float).label('b'),
+        db.cast(db.null(), db.Float).label('c'),
+        db.cast(db.null(), db.Integer).label('d'),
+    ).join_from(ExerciseLog, Exercise, ExerciseLog.exercise_id == Exercise.id).where(
+        ExerciseLog.user_id == user_id, ExerciseLog.date == day
+    ).order_by(ExerciseLog.id).limit(SNAPSHOT_EXERCISES).subquery()
+
+    snapshot = {'calories_consumed': 0.0, 'calories_burned': 0.0, 'water_ml': 0.0,
+                'habits_completed': 0, 'exercises': []}
+    for kind, name, a, b, c, d in db.session.execute(db.union_all(totals, db.select(exercises))):
+        if kind == 'totals':
+            snapshot.update(calories_consumed=a or 0.0, calories_burned=b or 0.0,
+                            water_ml=c or 0.0, habits_completed=d or 0)
+        else:
+            snapshot['exercises'].append((name, a))
+    return snapshot
+
+
+def get_activity_snapshot(user_id, day=None):
+    """Return the user's totals for ``day`` plus up to three logged exercises.
+
+    Results are memoized per user for ACTIVITY_SNAPSHOT_TTL seconds (default
+    30) so a burst of chat messages costs one query. The memo is per
+    process: writes in other workers show up once it expires.
+
+    Returns:
+        dict with calories_consumed, calories_burned, water_ml,
+        habits_completed and exercises (list of (name, duration) tuples)
+    """
+    day = day or date.today()
+    ttl = float(os.environ.get('ACTIVITY_SNAPSHOT_TTL', '30'))
+    memo = _snapshot_memo()
+    now = time.monotonic()
+    entry = memo.get(user_id)
+    if entry and entry[0] > now and entry[1] == day:
+        return entry[2]
+
+    generation = memo['generation']
+    snapshot = _load_activity_snapshot(user_id, day)
+    if ttl > 0:
+        with _snapshot_lock:
+            if memo['generation'] != generation:
+                return snapshot  # a write committed meanwhile; this read may predate it
+            if len(memo) > 1024:
+                for key in [k for k, v in list(memo.items()) if k != 'generation' and v[0] <= now]:
+                    memo.pop(key, None)
+            memo[user_id] = (now + ttl, day, snapshot)
+    return snapshot
+
+
+def invalidate_activity_snapshot(*user_ids):
+    """Forget memoized snapshots for ``user_ids`` (all users if none given)."""
+    memo = _snapshot_memo()
+    with _snapshot_lock:
+        memo['generation'] += 1
+        if not user_ids:
+            generation = memo['generation']
+            memo.clear()
+            memo['generation'] = generation
+        for user_id in user_ids:
+            memo.pop(user_id, None)
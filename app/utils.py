@@ -1,26 +1,59 @@
+from datetime import datetime
+
+# Mifflin-St Jeor: 10 x weight + 6.25 x height - 5 x age + offset by gender
+# (no offset for any other value)
+BMR_GENDER_OFFSETS = {'male': 5, 'female': -161}
+
+ACTIVITY_FACTORS = {
+    'sedentary': 1.2,
+    'light': 1.375,
+    'moderate': 1.55,
+    'active': 1.725,
+    'very_active': 1.9
+}
+DEFAULT_ACTIVITY_FACTOR = 1.2
+
+# Daily calorie deficit/surplus per goal ('maintain' and anything else: 0)
+GOAL_CALORIE_ADJUSTMENTS = {'lose': -500, 'gain': 500}
+
 def calculate_bmr(weight, height, age, gender):
     if not all([weight, height, age, gender]):
         return None
-    if gender == 'male':
-        return 10 * weight + 6.25 * height - 5 * age + 5
-    elif gender == 'female':
-        return 10 * weight + 6.25 * height - 5 * age - 161
-    else:
-        return 10 * weight + 6.25 * height - 5 * age
+    bmr = 10 * weight + 6.25 * height - 5 * age
+    if gender in BMR_GENDER_OFFSETS:
+        bmr += BMR_GENDER_OFFSETS[gender]
+    return bmr
 
 def calculate_tdee(bmr, activity_level):
-    factors = {
-        'sedentary': 1.2,
-        'light': 1.375,
-        'moderate': 1.55,
-        'active': 1.725,
-        'very_active': 1.9
-    }
-    return bmr * factors.get(activity_level, 1.2)
+    return bmr * ACTIVITY_FACTORS.get(activity_level, DEFAULT_ACTIVITY_FACTOR)
+
+def calculate_bmi(weight, height):
+    """Body mass index from kg and cm (None if either is missing)."""
+    if not weight or not height:
+        return None
+    return weight / ((height / 100) ** 2)
+
+def calculate_target_calories(tdee, goal):
+    """Daily calorie target: TDEE adjusted for a lose/gain goal."""
+    return tdee + GOAL_CALORIE_ADJUSTMENTS.get(goal, 0)
+
+def as_date(value):
+    """Log ``date`` columns may hold a datetime before the row is reloaded."""
+    if isinstance(value, datetime):
+        return value.date()
+    return value
 
 def check_and_award_badges(user):
-    # Example: award badge for 7-day streak
-    pass  # To be implemented 
+    """Award any badge the user's stored counters already qualify for.
+
+    Write routes award badges as they happen (see app/badges.py); this only
+    catches up after rules are added. Does not commit.
+
+    Returns:
+        List of BadgeRule for the badges awarded.
+    """
+    from .badges import award_due_badges
+    return [rule for _, rule in award_due_badges(user.id)]
 
 # ---------------------------------
 # Exercise How-To video references
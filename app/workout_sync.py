@@ -0,0 +1,274 @@
+"""
+Offline-first workout session sync.
+
+The session page records every change (add an exercise, log a set, finish)
+as an operation with a client-generated ``op_id``, keeps it in IndexedDB and
+posts queued operations in batches to ``/workout/<id>/sync``. The server
+applies a batch in order, in one transaction, and records each op_id in the
+``WorkoutSyncOp`` ledger. A batch resent after a lost response (or from a
+second tab) is therefore applied exactly once: known op_ids are reported as
+duplicates and skipped. Every response carries the workout's current state
+so the client can redraw from it.
+
+Operations (extra keys are ignored):
+    {"op_id", "type": "add_exercise", "exercise_id"}
+    {"op_id", "type": "add_set", "exercise_id", "reps"?, "weight"?, "duration"?, "distance"?}
+    {"op_id", "type": "finish", "duration"?, "notes"?}
+
+Sets refer to the catalog exercise rather than the WorkoutExercise row, so
+an exercise added offline can take sets before the server has seen it (a
+workout holds each exercise at most once).
+
+Set numbers and exercise orders come from counters on the parent row
+(``WorkoutExercise.last_set_number``, ``Workout.last_exercise_order``),
+bumped with a single UPDATE ... RETURNING. Every write path (this module,
+add_exercise_to_workout, add_set, the /sets batch) reserves numbers through
+``reserve_set_numbers()`` / ``reserve_exercise_orders()``, so concurrent
+writers never get the same number; unique indexes back this up.
+"""
+
+from datetime import date
+
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload, selectinload
+
+from . import db
+from .badges import record_progress, record_sets
+from .catalog import exercise_catalog
+from .models import ExerciseSet, Workout, WorkoutExercise, WorkoutSyncOp
+from .summaries import record_daily_totals, workout_calories
+
+# Largest batch /workout/<id>/sync accepts in one request
+MAX_OPS_PER_SYNC = 200
+
+_SET_FIELDS = {'reps': int, 'weight': float, 'duration': int, 'distance': float}
+
+
+class SyncRejected(ValueError):
+    """An operation that can never apply; it is recorded and not retried."""
+
+
+def set_fields(item):
+    """Coerce the numeric fields of one posted set; raises ValueError/TypeError."""
+    return {field: None if item.get(field) in (None, '') else cast(item[field])
+            for field, cast in _SET_FIELDS.items()}
+
+
+def _reserve(model, counter, row_id, count, *criteria):
+    last = db.session.execute(
+        db.update(model).where(model.id == row_id, *criteria)
+        .values({counter: counter + count})
+        .returning(counter)
+        .execution_options(synchronize_session=False)
+    ).scalar()
+    return None if last is None else last - count + 1
+
+
+def reserve_set_numbers(workout_exercise_id, count=1, workout_id=None):
+    """Atomically hand out ``count`` consecutive set numbers for an exercise.
+
+    The counter is bumped and read in one statement, which also locks the
+    row until commit, so concurrent writers are serialized.
+
+    Args:
+        workout_exercise_id: WorkoutExercise to number sets for
+        count: How many numbers to reserve
+        workout_id: If given, only reserve if the exercise belongs to it
+    Returns:
+        The first reserved number, or None if there is no such exercise.
+    """
+    criteria = [WorkoutExercise.workout_id == workout_id] if workout_id is not None else []
+    return _reserve(WorkoutExercise, WorkoutExercise.last_set_number, workout_exercise_id, count, *criteria)
+
+
+def reserve_exercise_orders(workout_id, count=1):
+    """Like ``reserve_set_numbers()``, for WorkoutExercise.order in a workout."""
+    return _reserve(Workout, Workout.last_exercise_order, workout_id, count)
+
+
+def complete_workout(workout, duration, notes=''):
+    """Record the workout's duration and notes and roll up its calories.
+
+    Does not commit. Finishing again replaces the earlier duration, so only
+    the difference is added to the daily totals (and the workout is counted
+    towards badges once).
+
+    Returns:
+        List of BadgeRule for badges earned by finishing.
+    """
+    burned_before = workout_calories(workout.id, workout.duration)
+    first_finish = workout.duration is None and duration is not None
+    workout.duration = duration
+    if notes:
+        workout.notes = (workout.notes or '') + '\n' + notes
+
+    burned_delta = workout_calories(workout.id, duration) - burned_before
+    record_daily_totals(workout.user_id, workout.date or date.today(), calories_burned=burned_delta)
+    return record_progress(workout.user_id, workouts_finished=1 if first_finish else 0)
+
+
+def load_workout_session(workout_id):
+    """Load a workout with its whole session tree in three queries.
+
+    Workout, then its WorkoutExercises joined to their Exercise, then all of
+    their sets. Already-loaded objects are refreshed, so this also gives the
+    current state right after a commit.
+
+    Returns:
+        The Workout, or None if there is no such workout.
+    """
+    return db.session.scalars(
+        db.select(Workout).where(Workout.id == workout_id).options(
+            selectinload(Workout.workout_exercises).options(
+                joinedload(WorkoutExercise.exercise),
+                selectinload(WorkoutExercise.sets),
+            )
+        ).execution_options(populate_existing=True)
+    ).first()
+
+
+def workout_state(workout):
+    """The workout's exercises and sets as a compact JSON-ready dict.
+
+    Expects a workout from ``load_workout_session()`` (anything else
+    lazy-loads per exercise).
+    """
+    exercises = []
+    for we in sorted(workout.workout_exercises, key=lambda we: (we.order or 0, we.id)):
+        exercises.append({
+            'workout_exercise_id': we.id,
+            'exercise_id': we.exercise_id,
+            'name': we.exercise.name,
+            'muscle_group': we.exercise.muscle_group,
+            'sets': [{'set_id': s.id, 'set_number': s.set_number, 'reps': s.reps, 'weight': s.weight,
+                      'duration': s.duration, 'distance': s.distance}
+                     for s in sorted(we.sets, key=lambda s: s.set_number)],
+        })
+    return {'workout_id': workout.id, 'name': workout.name, 'duration': workout.duration,
+            'exercises': exercises}
+
+
+class _SyncBatch:
+    """Applies one batch of operations to a workout inside the session."""
+
+    def __init__(self, workout):
+        self.workout = workout
+        self.exercises = {we.exercise_id: we for we in
+                          WorkoutExercise.query.filter_by(workout_id=workout.id)}
+        self.new_exercises = set()
+        # {exercise_id: [set fields]}, numbered and inserted by _add_sets()
+        self.pending_sets = {}
+        self.finished = False
+        self.badges = []
+
+    @staticmethod
+    def _exercise_id(op):
+        try:
+            return int(op.get('exercise_id'))
+        except (TypeError, ValueError):
+            raise SyncRejected('Invalid exercise_id')
+
+    def add_exercise(self, op):
+        exercise_id = self._exercise_id(op)
+        if exercise_id in self.exercises:
+            return  # already there (e.g. added from another tab)
+        if exercise_id not in exercise_catalog().by_id:
+            raise SyncRejected('Unknown exercise')
+        we = WorkoutExercise(workout_id=self.workout.id, exercise_id=exercise_id,
+                             order=reserve_exercise_orders(self.workout.id))
+        db.session.add(we)
+        self.exercises[exercise_id] = we
+        self.new_exercises.add(exercise_id)
+
+    def add_set(self, op):
+        exercise_id = self._exercise_id(op)
+        we = self.exercises.get(exercise_id)
+        if we is None:
+            raise SyncRejected('Exercise is not in this workout')
+        try:
+            fields = set_fields(op)
+        except (TypeError, ValueError):
+            raise SyncRejected('Invalid set')
+        self.pending_sets.setdefault(exercise_id, []).append(fields)
+
+    def _add_sets(self):
+        """Number the batch's sets with one counter bump per exercise."""
+        for exercise_id, sets in self.pending_sets.items():
+            we = self.exercises[exercise_id]
+            if exercise_id in self.new_exercises:
+                first = 1  # not visible to anyone else yet
+                we.last_set_number = len(sets)
+            else:
+                first = reserve_set_numbers(we.id, len(sets))
+            db.session.add_all(ExerciseSet(workout_exercise=we, set_number=first + i, **fields)
+                               for i, fields in enumerate(sets))
+        self.badges += record_sets(self.workout.user_id,
+                                   (fields for sets in self.pending_sets.values() for fields in sets))
+
+    def finish(self, op):
+        try:
+            duration = None if op.get('duration') in (None, '') else int(op['duration'])
+        except (TypeError, ValueError):
+            raise SyncRejected('Invalid duration')
+        notes = op.get('notes') or ''
+        if not isinstance(notes, str):
+            raise SyncRejected('Invalid notes')
+        self.badges += complete_workout(self.workout, duration, notes)
+        self.finished = True
+
+    def apply(self, ops):
+        handlers = {'add_exercise': self.add_exercise, 'add_set': self.add_set, 'finish': self.finish}
+        op_ids = [op.get('op_id') for op in ops if isinstance(op, dict)]
+        seen = set(db.session.scalars(db.select(WorkoutSyncOp.op_id).where(
+            WorkoutSyncOp.user_id == self.workout.user_id,
+            WorkoutSyncOp.op_id.in_([op_id for op_id in op_ids if isinstance(op_id, str)]),
+        )))
+
+        applied, duplicates, rejected = [], [], []
+        for op in ops:
+            op_id = op.get('op_id') if isinstance(op, dict) else None
+            if not isinstance(op_id, str) or not 0 < len(op_id) <= 64:
+                rejected.append({'op_id': op_id, 'error': 'Missing or invalid op_id'})
+                continue
+            if op_id in seen:
+                duplicates.append(op_id)
+                continue
+            seen.add(op_id)
+            handler = handlers.get(op.get('type'))
+            try:
+                if handler is None:
+                    raise SyncRejected('Unknown operation type')
+                handler(op)
+                applied.append(op_id)
+                status = 'applied'
+            except SyncRejected as e:
+                rejected.append({'op_id': op_id, 'error': str(e)})
+                status = 'rejected'
+            db.session.add(WorkoutSyncOp(user_id=self.workout.user_id, workout_id=self.workout.id,
+                                         op_id=op_id, status=status))
+        self._add_sets()
+        return {'applied': applied, 'duplicates': duplicates, 'rejected': rejected,
+                'finished': self.finished, 'badges': self.badges}
+
+
+def apply_sync_operations(workout, ops):
+    """Apply a batch of client operations to ``workout`` exactly once.
+
+    Commits. If another request commits some of the same op_ids first, the
+    ledger's unique constraint fails this transaction and the batch is
+    replayed once, which then skips them as duplicates.
+
+    Returns:
+        dict with applied (op_ids), duplicates (op_ids already applied
+        earlier), rejected ([{op_id, error}]), finished (bool) and badges
+        (BadgeRule list of badges earned)
+    """
+    for attempt in range(2):
+        try:
+            result = _SyncBatch(workout).apply(ops)
+            db.session.commit()
+            return result
+        except IntegrityError:
+            db.session.rollback()
+            if attempt:
+                raise
@@ -0,0 +1,22 @@
+"""
+Rebuild the badge counters from history and award every badge earned so far.
+
+Processes users in chunks, one transaction per chunk. Run it once after
+upgrading an existing database, after adding badge rules, or after
+importing data directly:
+
+    python backfill_badges.py              # chunks of 500 users
+    python backfill_badges.py 2000         # chunks of 2000 users
+"""
+
+import sys
+
+from app import create_app
+from app.badges import BACKFILL_CHUNK_SIZE, backfill_badges
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        chunk_size = int(sys.argv[1]) if len(sys.argv) > 1 else BACKFILL_CHUNK_SIZE
+        users, awarded = backfill_badges(chunk_size)
+        print(f"Processed {users} users, awarded {awarded} badges")
@@ -0,0 +1,100 @@
+"""
+Time set logging from many threads posting to the same exercise.
+
+Every thread logs in with its own client and posts sets for one exercise;
+the script reports sets/sec and failed requests. The numbering itself is
+checked by tests/test_set_numbering.py.
+
+    python benchmarks/concurrent_sets.py --threads 16 --sets 25
+    DATABASE_URL=postgresql://... python benchmarks/concurrent_sets.py --endpoint sync
+
+Without DATABASE_URL it runs against a scratch SQLite file.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+import uuid
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+ENDPOINTS = ('add_set', 'sets', 'sync')
+
+
+def post_set(client, endpoint, workout_id, workout_exercise_id, exercise_id, reps):
+    if endpoint == 'add_set':
+        return client.post(f'/workout_exercise/{workout_exercise_id}/add_set', json={'reps': reps})
+    if endpoint == 'sets':
+        return client.post(f'/workout/{workout_id}/sets',
+                           json={'sets': [{'workout_exercise_id': workout_exercise_id, 'reps': reps}]})
+    return client.post(f'/workout/{workout_id}/sync', json={'ops': [
+        {'op_id': str(uuid.uuid4()), 'type': 'add_set', 'exercise_id': exercise_id, 'reps': reps}]})
+
+
+def run(app, args):
+    from app import db
+    from app.models import Exercise, User, Workout, WorkoutExercise
+
+    username = f'bench-{uuid.uuid4().hex[:8]}'
+    setup = app.test_client()
+    setup.post('/register', data=dict(username=username, email=f'{username}@example.com',
+                                      password='bench-pass', confirm_password='bench-pass'))
+    with app.app_context():
+        user = User.query.filter_by(username=username).one()
+        workout = Workout(name='Concurrency check', user_id=user.id)
+        db.session.add(workout)
+        db.session.flush()
+        exercise_id = db.session.scalar(db.select(Exercise.id).limit(1))
+        workout_exercise = WorkoutExercise(workout_id=workout.id, exercise_id=exercise_id, order=1)
+        workout.last_exercise_order = 1
+        db.session.add(workout_exercise)
+        db.session.commit()
+        ids = (workout.id, workout_exercise.id, exercise_id)
+
+    failures = []
+    barrier = threading.Barrier(args.threads)
+
+    def worker():
+        client = app.test_client()
+        client.post('/login', data=dict(username=username, password='bench-pass'))
+        barrier.wait()
+        for i in range(args.sets):
+            response = post_set(client, args.endpoint, *ids, reps=i + 1)
+            if response.status_code != 200:
+                failures.append(response.status_code)
+
+    threads = [threading.Thread(target=worker) for _ in range(args.threads)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    expected = args.threads * args.sets
+    print(f"{args.endpoint}: {expected} sets from {args.threads} threads in {elapsed:.2f}s "
+          f"({expected / elapsed:.0f} sets/s), {len(failures)} failed requests")
+    if failures:
+        print(f"non-200 responses: {sorted(set(failures))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--threads', type=int, default=16)
+    parser.add_argument('--sets', type=int, default=25, help='sets posted per thread')
+    parser.add_argument('--endpoint', choices=ENDPOINTS, default='add_set')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ.setdefault('DATABASE_URL', f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}")
+        from app import create_app
+        app = create_app()
+        app.config['WTF_CSRF_ENABLED'] = False
+        run(app, args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Benchmark column-wise energy targets against the per-row scalar functions.
+
+Builds --rows synthetic profiles (including missing fields, zeros and
+unknown categories), computes BMR, TDEE, BMI and target calories with a loop
+over calculate_bmr()/calculate_tdee()/calculate_bmi()/
+calculate_target_calories() and with app.energy.energy_columns() (array
+fallback, and NumPy when installed), checks that every backend matches the
+scalar results row for row, and reports rows/sec. Exits non-zero on any
+mismatch (tests/test_energy.py covers the edge cases as unit tests):
+
+    python benchmarks/energy_targets.py --rows 1000000
+"""
+
+import argparse
+import math
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.energy import EnergyColumns, energy_columns, numpy_available  # noqa: E402
+from app.utils import (calculate_bmi, calculate_bmr, calculate_target_calories,  # noqa: E402
+                       calculate_tdee)
+
+GENDERS = ['male', 'female', 'other', None, '']
+ACTIVITY_LEVELS = ['sedentary', 'light', 'moderate', 'active', 'very_active', None, 'unknown']
+GOALS = ['lose', 'maintain', 'gain', None]
+
+
+def make_rows(count, seed):
+    rng = random.Random(seed)
+
+    def maybe(value):
+        # ~2% missing and ~1% zero, the cases the scalar functions reject
+        roll = rng.random()
+        return None if roll < 0.02 else 0 if roll < 0.03 else value
+
+    weights = [maybe(round(rng.uniform(40, 150), 1)) for _ in range(count)]
+    heights = [maybe(round(rng.uniform(140, 210), 1)) for _ in range(count)]
+    ages = [maybe(rng.randint(14, 90)) for _ in range(count)]
+    genders = [rng.choice(GENDERS) for _ in range(count)]
+    activity_levels = [rng.choice(ACTIVITY_LEVELS) for _ in range(count)]
+    goals = [rng.choice(GOALS) for _ in range(count)]
+    return weights, heights, ages, genders, activity_levels, goals
+
+
+def scalar_columns(weights, heights, ages, genders, activity_levels, goals):
+    columns = EnergyColumns([], [], [], [])
+    for weight, height, age, gender, activity_level, goal in zip(
+            weights, heights, ages, genders, activity_levels, goals):
+        bmr = calculate_bmr(weight, height, age, gender)
+        tdee = calculate_tdee(bmr, activity_level) if bmr is not None else None
+        columns.bmr.append(bmr)
+        columns.tdee.append(tdee)
+        columns.bmi.append(calculate_bmi(weight, height))
+        columns.target_calories.append(calculate_target_calories(tdee, goal) if tdee is not None else None)
+    return columns
+
+
+def mismatches(expected, actual):
+    """Yield (column, row, expected, actual) where the results differ."""
+    for name, want_column, got_column in zip(EnergyColumns._fields, expected, actual):
+        for row, (want, got) in enumerate(zip(want_column, got_column)):
+            got = float(got)
+            if want is None:
+                if not math.isnan(got):
+                    yield name, row, want, got
+            elif not math.isclose(want, got, rel_tol=1e-12):
+                yield name, row, want, got
+
+
+def timed(fn, *args):
+    started = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+
+    rows = make_rows(args.rows, args.seed)
+    expected, scalar_time = timed(scalar_columns, *rows)
+    print(f"scalar loop: {args.rows} rows in {scalar_time:.3f}s ({args.rows / scalar_time:,.0f} rows/s)")
+
+    backends = [('array', False)] + ([('numpy', True)] if numpy_available() else [])
+    failed = False
+    for name, use_numpy in backends:
+        actual, elapsed = timed(lambda *columns: energy_columns(*columns, use_numpy=use_numpy), *rows)
+        bad = list(mismatches(expected, actual))
+        print(f"{name}: {args.rows} rows in {elapsed:.3f}s ({args.rows / elapsed:,.0f} rows/s, "
+              f"{scalar_time / elapsed:.1f}x scalar), {len(bad)} mismatches")
+        for column, row, want, got in bad[:5]:
+            print(f"  FAIL {column}[{row}]: scalar {want!r}, {name} {got!r}")
+        failed = failed or bool(bad)
+    if not numpy_available():
+        print("numpy: not installed, skipped")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
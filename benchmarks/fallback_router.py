@@ -0,0 +1,82 @@
+"""
+Benchmark the offline coach's intent routing (messages/sec).
+
+Compares app.coach_intents.IntentRouter with the old if/elif cascade: a
+scan that lowercases the message and checks every keyword of an intent
+before moving to the next. --extra-intents pads both with synthetic
+intents to show how each scales as the tables grow:
+
+    python benchmarks/fallback_router.py --seconds 2 --extra-intents 200
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.coach_intents import EXERCISES, INTENTS, IntentRouter  # noqa: E402
+
+MESSAGES = [
+    "How do I do burpees properly?",
+    "Give me a workout for today",
+    "What should I eat to reach my goal?",
+    "I need motivation to stay consistent",
+    "How can I see results faster?",
+    "Proper push-up form please",
+    "I'm so tired today, I want to give up",
+    "Is a deadlift bad for my back?",
+    "Hello coach!",
+    "What's a good breakfast before the gym tomorrow morning?",
+]
+
+
+class LinearScan:
+    """One substring test per keyword, intents checked in priority order."""
+
+    def __init__(self, intents, exercises):
+        self.exercises = [(guide['name'], [k.strip().replace('-', ' ') for k in guide['keywords']])
+                          for guide in exercises]
+        self.intents = [(name, [k.strip() for k in keywords]) for name, keywords in intents]
+
+    def route(self, message):
+        text = message.lower().replace('-', ' ')
+        for name, keywords in self.exercises:
+            if any(k in text for k in keywords):
+                return 'technique', name
+        for name, keywords in self.intents:
+            if any(k in text for k in keywords):
+                return name, None
+        return None, None
+
+
+def synthetic_intents(count):
+    return [(f'topic{i}', [f'kw{i}a', f'kw{i}b', f'kw{i} phrase']) for i in range(count)]
+
+
+def measure(route, seconds):
+    done = 0
+    stop = time.perf_counter() + seconds
+    while time.perf_counter() < stop:
+        for message in MESSAGES:
+            route(message)
+        done += len(MESSAGES)
+    return done / seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--seconds', type=float, default=2.0)
+    parser.add_argument('--extra-intents', type=int, default=0)
+    args = parser.parse_args()
+
+    intents = INTENTS + synthetic_intents(args.extra_intents)
+    keywords = sum(len(k) for _, k in intents) + sum(len(g['keywords']) for g in EXERCISES)
+    print(f"{len(intents)} intents, {keywords} keywords, {args.seconds:.0f}s per router")
+    for name, router in [('cascade', LinearScan(intents, EXERCISES)), ('router', IntentRouter(intents, EXERCISES))]:
+        print(f"{name:>7}: {measure(router.route, args.seconds):10.0f} messages/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+"""
+Measure app start-up import cost with ``python -X importtime``.
+
+Runs each target in a fresh interpreter (against a scratch SQLite database),
+reports the best wall time over --runs, the slowest top-level imports, and
+whether any heavy AI SDK got imported. Worker boot should not pull in
+huggingface_hub, transformers or torch until the coach is first used:
+
+    python benchmarks/import_time.py --runs 5 --top 8
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+TARGETS = {
+    'create_app': "from app import create_app; create_app()",
+    'ai_coach': "import app.ai_coach",
+    'coach_ready': "from app import create_app\n"
+                   "app = create_app()\n"
+                   "with app.app_context():\n"
+                   "    from app.ai_coach import get_coach\n"
+                   "    get_coach()",
+}
+
+HEAVY_MODULES = ('huggingface_hub', 'transformers', 'torch', 'httpx')
+
+LINE = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)')
+
+
+def run(code, env):
+    started = time.perf_counter()
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, env=env,
+                          capture_output=True, text=True)
+    elapsed = time.perf_counter() - started
+    if proc.returncode:
+        raise RuntimeError(proc.stderr[-2000:])
+    top_level = {}
+    loaded = set()
+    for match in LINE.finditer(proc.stderr):
+        _, cumulative, indent, module = match.groups()
+        loaded.add(module.split('.')[0])
+        if len(indent) == 1:  # imported directly by the target code
+            top_level[module] = int(cumulative)
+    return elapsed, top_level, loaded
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=3)
+    parser.add_argument('--top', type=int, default=5)
+    parser.add_argument('targets', nargs='*', help=f"any of {', '.join(TARGETS)} (default: all)")
+    args = parser.parse_args()
+    unknown = set(args.targets) - set(TARGETS)
+    if unknown:
+        parser.error(f"unknown targets: {', '.join(sorted(unknown))}")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ, DATABASE_URL=f"sqlite:///{os.path.join(tmp, 'bench.sqlite')}")
+        for target in args.targets or list(TARGETS):
+            results = [run(TARGETS[target], env) for _ in range(args.runs)]
+            elapsed, top_level, loaded = min(results, key=lambda r: r[0])
+            heavy = [name for name in HEAVY_MODULES if name in loaded] or ['none']
+            print(f"{target}: {elapsed * 1000:.0f} ms wall (best of {args.runs}), "
+                  f"{sum(top_level.values()) / 1000:.0f} ms importing; heavy SDKs: {', '.join(heavy)}")
+            for module, micros in sorted(top_level.items(), key=lambda item: -item[1])[:args.top]:
+                print(f"    {micros / 1000:8.1f} ms  {module}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+"""
+Benchmark SQLite read/write concurrency with and without the tuning pragmas.
+
+Simulates the app's hot paths (add_set / water() inserts and dashboard
+reads) from several threads, each with its own connection, against a
+scratch database. Run once with the stock SQLite settings and once with the
+settings from app.SQLITE_PRAGMA_DEFAULTS (or your env overrides):
+
+    python benchmarks/sqlite_concurrency.py --writers 4 --readers 8 --seconds 5
+"""
+
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app import apply_sqlite_pragmas, sqlite_pragmas_from_env  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE water_log (id INTEGER PRIMARY KEY, amount FLOAT NOT NULL, date DATE, user_id INTEGER NOT NULL);
+CREATE INDEX ix_waterlog_user_date ON water_log (user_id, date);
+"""
+
+
+def run(db_path, pragmas, writers, readers, seconds):
+    stats = {'writes': 0, 'reads': 0, 'locked': 0, 'max_write_ms': 0.0}
+    lock = threading.Lock()
+    stop = time.perf_counter() + seconds
+
+    def connect():
+        # Driver defaults (5s lock timeout), same as the app used before tuning
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        if pragmas:
+            apply_sqlite_pragmas(conn, pragmas)
+        return conn
+
+    def writer(user_id):
+        conn = connect()
+        done = locked = 0
+        slowest = 0.0
+        while time.perf_counter() < stop:
+            started = time.perf_counter()
+            try:
+                conn.execute("INSERT INTO water_log (amount, date, user_id) VALUES (250, date('now'), ?)", (user_id,))
+                conn.commit()
+                done += 1
+            except sqlite3.OperationalError:
+                conn.rollback()
+                locked += 1
+            slowest = max(slowest, time.perf_counter() - started)
+        conn.close()
+        with lock:
+            stats['writes'] += done
+            stats['locked'] += locked
+            stats['max_write_ms'] = max(stats['max_write_ms'], slowest * 1000)
+
+    def reader(user_id):
+        conn = connect()
+        done = locked = 0
+        while time.perf_counter() < stop:
+            try:
+                conn.execute("SELECT sum(amount) FROM water_log WHERE user_id = ? AND date >= date('now', '-7 day')",
+                             (user_id,)).fetchone()
+                done += 1
+            except sqlite3.OperationalError:
+                locked += 1
+        conn.close()
+        with lock:
+            stats['reads'] += done
+            stats['locked'] += locked
+
+    threads = [threading.Thread(target=writer, args=(i % 10,)) for i in range(writers)]
+    threads += [threading.Thread(target=reader, args=(i % 10,)) for i in range(readers)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--writers', type=int, default=4)
+    parser.add_argument('--readers', type=int, default=8)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    args = parser.parse_args()
+
+    profiles = [('stock', {}), ('tuned', sqlite_pragmas_from_env())]
+    print(f"{args.writers} writers, {args.readers} readers, {args.seconds:.0f}s per profile")
+    for name, pragmas in profiles:
+        with tempfile.TemporaryDirectory() as tmp:
+            db_path = os.path.join(tmp, 'bench.sqlite')
+            conn = sqlite3.connect(db_path)
+            conn.executescript(SCHEMA)
+            conn.close()
+            stats = run(db_path, pragmas, args.writers, args.readers, args.seconds)
+        print(f"{name:>6}: {stats['writes'] / args.seconds:9.0f} writes/s "
+              f"{stats['reads'] / args.seconds:9.0f} reads/s "
+              f"{stats['max_write_ms']:8.0f} ms slowest write "
+              f"{stats['locked']:7d} 'database is locked' errors")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+"""
+Fail if any hot-route query falls back to a full table scan.
+
+    python check_query_plans.py
+
+Creates/migrates the database via create_app() first, so missing indexes on
+an existing database are added before the plans are checked.
+"""
+
+import sys
+
+from app import create_app
+from app.query_plans import HOT_QUERIES, find_table_scans
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        scans = find_table_scans()
+    for name, detail in scans:
+        print(f"FAIL {name}: {detail}")
+    print(f"Checked {len(HOT_QUERIES)} queries, {len(scans)} table scan(s)")
+    sys.exit(1 if scans else 0)
@@ -1,5 +1,6 @@
 from app import create_app, db
 from app.models import User, Habit, Exercise, Food
+from app.catalog import bump_catalog_version
 
 def init_db():
     app = create_app()
@@ -169,6 +170,7 @@ def init_db():
         for food in foods:
             db.session.add(food)
         
+        bump_catalog_version()
         db.session.commit()
         print("Database initialized with exercise and food data!")
 
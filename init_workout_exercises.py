@@ -3,6 +3,7 @@ Comprehensive exercise database for the workout system
 """
 from app import create_app, db
 from app.models import Exercise
+from app.catalog import bump_catalog_version, EXERCISE
 
 def init_workout_exercises():
     app = create_app()
@@ -80,6 +81,7 @@ def init_workout_exercises():
         for exercise in exercises:
             db.session.add(exercise)
         
+        bump_catalog_version(EXERCISE)
         db.session.commit()
         print(f"Added {len(exercises)} exercises to the database!")
 
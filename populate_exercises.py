@@ -1,5 +1,6 @@
 from app import create_app, db
 from app.models import Exercise
+from app.catalog import bump_catalog_version, EXERCISE
 
 app = create_app()
 with app.app_context():
@@ -50,6 +51,7 @@ with app.app_context():
     for exercise in exercises:
         db.session.add(exercise)
     
+    bump_catalog_version(EXERCISE)
     db.session.commit()
     print(f"Added {len(exercises)} exercises to the database!")
     
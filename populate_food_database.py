@@ -5,6 +5,7 @@ Run this script once to add hundreds of common foods with accurate nutritional d
 
 from app import create_app, db
 from app.models import Food
+from app.catalog import bump_catalog_version, FOOD
 
 app = create_app()
 
@@ -284,6 +285,7 @@ def populate_food_database():
         
         # Commit all changes
         try:
+            bump_catalog_version(FOOD)
             db.session.commit()
             print(f"\n✅ Successfully added {total_added} new foods to the database!")
             print(f"Total foods in database: {Food.query.count()}")
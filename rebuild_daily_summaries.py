@@ -0,0 +1,21 @@
+"""
+Rebuild the DailySummary rollup table from the raw log tables.
+
+Run after importing data directly into the database (e.g. add_sample_data.py)
+or whenever the rollups need to be backfilled:
+
+    python rebuild_daily_summaries.py            # all users
+    python rebuild_daily_summaries.py 3 7        # only users 3 and 7
+"""
+
+import sys
+
+from app import create_app
+from app.summaries import rebuild_daily_summaries
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        user_ids = [int(arg) for arg in sys.argv[1:]] or None
+        written = rebuild_daily_summaries(user_ids)
+        print(f"Rebuilt {written} daily summary rows")
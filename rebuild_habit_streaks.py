@@ -0,0 +1,21 @@
+"""
+Recompute the stored habit streaks from HabitLog.
+
+Run after importing habit logs directly into the database (add_sample_data.py
+does this itself) or if the streak columns ever need to be backfilled:
+
+    python rebuild_habit_streaks.py            # all habits
+    python rebuild_habit_streaks.py 3 7        # only habits 3 and 7
+"""
+
+import sys
+
+from app import create_app
+from app.habits import rebuild_habit_streaks
+
+if __name__ == '__main__':
+    app = create_app()
+    with app.app_context():
+        habit_ids = [int(arg) for arg in sys.argv[1:]] or None
+        written = rebuild_habit_streaks(habit_ids)
+        print(f"Rebuilt streaks for {written} habits")
@@ -0,0 +1,53 @@
+import os
+import sys
+import uuid
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+PASSWORD = 'test-pass'
+
+
+def make_app(database_url):
+    """Create an app on ``database_url`` with CSRF off.
+
+    Routes attach to the first app created in the process (app/routes.py
+    registers on current_app), so tests that post to routes use ``app``.
+    """
+    previous = os.environ.get('DATABASE_URL')
+    os.environ['DATABASE_URL'] = database_url
+    try:
+        from app import create_app
+        app = create_app()
+    finally:
+        if previous is None:
+            os.environ.pop('DATABASE_URL', None)
+        else:
+            os.environ['DATABASE_URL'] = previous
+    app.config.update(TESTING=True, WTF_CSRF_ENABLED=False)
+    return app
+
+
+@pytest.fixture(scope='session')
+def app(tmp_path_factory):
+    """The app with its routes, on a scratch SQLite file shared by threads."""
+    return make_app(f"sqlite:///{tmp_path_factory.mktemp('db') / 'test.sqlite'}")
+
+
+@pytest.fixture
+def register(app):
+    """Register a fresh user; returns ``(username, logged-in client factory)``."""
+    def register():
+        username = f'user-{uuid.uuid4().hex[:8]}'
+        app.test_client().post('/register', data=dict(
+            username=username, email=f'{username}@example.com',
+            password=PASSWORD, confirm_password=PASSWORD))
+
+        def login():
+            client = app.test_client()
+            response = client.post('/login', data=dict(username=username, password=PASSWORD))
+            assert response.status_code == 302
+            return client
+        return username, login
+    return register
@@ -0,0 +1,51 @@
+import threading
+import time
+
+import pytest
+
+from app.ai_jobs import CoachJobQueue, UserLimitReached
+
+
+@pytest.fixture
+def queue():
+    return CoachJobQueue(max_workers=2, per_user_limit=1, timeout=0.1, result_ttl=0.2)
+
+
+def test_timed_out_job_counts_until_its_call_returns(queue):
+    release = threading.Event()
+    job = queue.submit('a', lambda: release.wait(5) and 'late', lambda: 'fallback')
+    time.sleep(0.15)
+    assert queue.get(job.id, 'a').to_dict()['response'] == 'fallback'
+    with pytest.raises(UserLimitReached):
+        queue.submit('a', lambda: 'x', lambda: 'fallback')
+    release.set()
+    time.sleep(0.05)
+    queue.submit('a', lambda: 'x', lambda: 'fallback')
+
+
+def test_stats_expire_and_prune_abandoned_jobs(queue):
+    release = threading.Event()
+    queue.submit('a', lambda: release.wait(5), lambda: 'fallback')
+    time.sleep(0.15)
+    stats = queue.stats()  # nobody polled: the stats call applies the timeout
+    assert (stats['timeouts'], stats['running']) == (1, 1)
+    release.set()
+    time.sleep(0.25)
+    assert queue.stats()['running'] == 0
+    assert not queue._jobs
+
+
+def test_jobs_are_only_visible_to_their_owner(queue):
+    job = queue.submit('a', lambda: 'reply', lambda: 'fallback')
+    assert queue.get(job.id, 'b') is None
+    assert queue.get(job.id, 'a') is job
+
+
+def test_anonymous_jobs_are_bound_to_the_session(app):
+    first, second = app.test_client(), app.test_client()
+    response = first.post('/ai-coach/chat', json={'message': 'workout ideas', 'async': True})
+    assert response.status_code == 202
+    job_id = response.get_json()['job_id']
+    # Same client address, different session
+    assert second.get(f'/ai-coach/jobs/{job_id}').status_code == 404
+    assert first.get(f'/ai-coach/jobs/{job_id}').status_code == 200
@@ -0,0 +1,20 @@
+import pytest
+
+from app.coach_intents import router
+
+
+@pytest.mark.parametrize('message, expected', [
+    ("How do I do burpees properly?", ('technique', 'burpee')),
+    ("Proper push-up form please", ('technique', 'push_up')),
+    ("pushups and squats", ('technique', 'push_up')),        # exercise order decides
+    ("Give me a workout for today", ('workout', None)),
+    ("I'm training tomorrow", ('workout', None)),              # keywords match as prefixes
+    ("What should I eat?", ('nutrition', None)),
+    ("I'm so tired, I want to give up", ('motivation', None)),
+    ("how to stay consistent", ('technique', None)),          # "how to " is a whole phrase
+    ("howto", (None, None)),
+    ("borrowed time", (None, None)),                          # keywords start at a word
+    ("Hello coach!", (None, None)),
+])
+def test_route(message, expected):
+    assert router.route(message) == expected
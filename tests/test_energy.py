@@ -0,0 +1,73 @@
+"""energy_columns() must agree with the scalar functions row for row, on both paths."""
+
+import math
+import sys
+
+import pytest
+
+from app import energy
+from app.energy import energy_columns
+from app.utils import calculate_bmi, calculate_bmr, calculate_target_calories, calculate_tdee
+
+# weight, height, age, gender, activity_level, goal
+ROWS = [
+    (70.0, 175.0, 30, 'male', 'moderate', 'lose'),
+    (60.0, 165.0, 25, 'female', 'active', 'gain'),
+    (80.0, 180.0, 40, 'male', 'sedentary', 'maintain'),
+    (None, 170.0, 30, 'male', 'moderate', None),          # no weight
+    (70.0, None, 30, 'female', 'light', 'lose'),          # no height
+    (70.0, 175.0, 0, 'male', 'moderate', 'lose'),         # zero age: BMI only
+    (70.0, 175.0, 30, 'other', 'moderate', 'gain'),       # unknown gender: no offset
+    (70.0, 175.0, 30, None, 'moderate', 'gain'),          # no gender: BMI only
+    (70.0, 175.0, 30, 'female', 'couch', 'lose'),         # unknown activity level
+    (70.0, 175.0, 30, 'male', None, 'unknown'),           # no activity level, unknown goal
+    (0.0, 175.0, 30, 'male', 'moderate', 'lose'),         # zero weight
+]
+
+
+def scalar(weight, height, age, gender, activity_level, goal):
+    bmr = calculate_bmr(weight, height, age, gender)
+    tdee = None if bmr is None else calculate_tdee(bmr, activity_level)
+    target = None if tdee is None else calculate_target_calories(tdee, goal)
+    return bmr, tdee, calculate_bmi(weight, height), target
+
+
+def assert_matches(columns, rows):
+    for i, row in enumerate(rows):
+        for name, expected, actual in zip(columns._fields, scalar(*row), (column[i] for column in columns)):
+            if expected is None:
+                assert math.isnan(actual), (name, row)
+            else:
+                assert actual == pytest.approx(expected), (name, row)
+
+
+@pytest.fixture(params=['numpy', 'array'])
+def use_path(request, monkeypatch):
+    monkeypatch.setattr(energy, '_numpy', None)  # forget the cached import
+    if request.param == 'numpy':
+        pytest.importorskip('numpy')
+    else:
+        monkeypatch.setitem(sys.modules, 'numpy', None)  # makes "import numpy" fail
+    return request.param
+
+
+def test_columns_match_scalar_functions(use_path):
+    columns = energy_columns(*zip(*ROWS))
+    assert energy.numpy_available() == (use_path == 'numpy')
+    assert_matches(columns, ROWS)
+
+
+def test_goals_default_to_maintain(use_path):
+    rows = [row[:5] + (None,) for row in ROWS]
+    assert_matches(energy_columns(*list(zip(*rows))[:5]), rows)
+
+
+def test_empty_columns(use_path):
+    assert [len(column) for column in energy_columns([], [], [], [], [], [])] == [0, 0, 0, 0]
+
+
+def test_forcing_numpy_without_it_fails(monkeypatch):
+    monkeypatch.setattr(energy, '_numpy', None)
+    monkeypatch.setitem(sys.modules, 'numpy', None)
+    with pytest.raises(RuntimeError):
+        energy_columns([70.0], [175.0], [30], ['male'], ['moderate'], use_numpy=True)
@@ -0,0 +1,29 @@
+from datetime import date, timedelta
+
+from app import db
+from app.models import Food, FoodLog, Friendship, User, WaterLog
+from app.summaries import rebuild_daily_summaries
+
+
+def test_friend_progress_reads_rollups_and_limits_lists(app, register):
+    from app.routes import FRIEND_RECENT_LIMIT  # routes only import once the app exists
+    viewer, login = register()
+    friend, _ = register()
+    today = date.today()
+    with app.app_context():
+        viewer_id, friend_id = (User.query.filter_by(username=name).one().id for name in (viewer, friend))
+        db.session.add(Friendship(user_a_id=min(viewer_id, friend_id), user_b_id=max(viewer_id, friend_id)))
+        food = db.session.scalars(db.select(Food).limit(1)).one()
+        food_id, food_name = food.id, food.name
+        db.session.add_all([WaterLog(user_id=friend_id, amount=amount, date=today) for amount in (300, 450)])
+        db.session.add(WaterLog(user_id=friend_id, amount=1000, date=today - timedelta(days=2)))
+        db.session.add_all([FoodLog(user_id=friend_id, food_id=food_id, meal_type='lunch', servings=1,
+                                    total_calories=100, date=today) for _ in range(FRIEND_RECENT_LIMIT + 5)])
+        db.session.commit()
+        rebuild_daily_summaries([friend_id])
+
+    page = login().get(f'/friends/{friend_id}').get_data(as_text=True)
+    # Per-day water totals, not one row per log
+    assert page.count('750 ml') == 1 and page.count('1000 ml') == 1 and '300 ml' not in page
+    assert page.count(f'{food_name} (Lunch)') == FRIEND_RECENT_LIMIT
+    assert str(100 * (FRIEND_RECENT_LIMIT + 5)) in page  # calories in today, from the rollup
@@ -0,0 +1,153 @@
+"""
+The SQL that differs between SQLite and PostgreSQL, run against each backend.
+
+SQLite runs in memory. PostgreSQL runs when DATABASE_URL points at one
+(tables are created if needed and each test adds a throwaway user):
+
+    DATABASE_URL=postgresql://... python -m pytest tests/test_portable_queries.py
+"""
+
+import os
+import uuid
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from app import db, dialect_insert
+from app.badges import award_due_badges, record_best, record_progress
+from app.energy import energy_targets, write_missing_energy_profiles
+from app.habits import record_habit_completion
+from app.models import (Badge, BadgeCounter, DailySummary, EnergyProfile, Exercise, ExerciseLog, Habit,
+                        HabitLog, User, WaterLog, Workout, WorkoutExercise)
+from app.summaries import (_load_activity_snapshot, get_daily_summary, rebuild_daily_summaries,
+                           record_daily_totals)
+from app.workout_sync import reserve_exercise_orders, reserve_set_numbers
+
+from conftest import make_app
+
+PROFILE = dict(weight=70.0, height=175.0, age=30, gender='male', activity_level='moderate', goal='lose')
+
+_apps = {}
+
+
+@pytest.fixture(params=['sqlite', 'postgresql'])
+def backend_app(request, app):
+    # Depends on ``app`` so the routed app is always created first
+    if request.param == 'postgresql':
+        url = os.environ.get('DATABASE_URL', '')
+        if not url.startswith(('postgresql', 'postgres:')):
+            pytest.skip('DATABASE_URL does not point at PostgreSQL')
+    else:
+        url = 'sqlite:///:memory:'
+    if url not in _apps:
+        _apps[url] = make_app(url)
+    return _apps[url]
+
+
+@pytest.fixture
+def user_id(backend_app):
+    with backend_app.app_context():
+        username = f'portable-{uuid.uuid4().hex[:8]}'
+        user = User(username=username, email=f'{username}@example.com', password='x', **PROFILE)
+        db.session.add(user)
+        db.session.commit()
+        yield user.id
+        db.session.rollback()
+
+
+def test_daily_rollup_upsert_matches_rebuild(user_id):
+    today = date.today()
+    assert record_daily_totals(user_id, today, water_ml=300)['water_ml'] == 300
+    totals = record_daily_totals(user_id, today, water_ml=200, habits_completed=1)
+    assert (totals['water_ml'], totals['habits_completed']) == (500, 1)
+
+    db.session.add_all([WaterLog(user_id=user_id, amount=300, date=today),
+                        WaterLog(user_id=user_id, amount=200, date=today)])
+    habit = Habit(name='Stretch', user_id=user_id)
+    db.session.add(habit)
+    db.session.flush()
+    db.session.add(HabitLog(habit_id=habit.id, date=today, completed=True))
+    exercise_id = db.session.scalar(db.select(Exercise.id).limit(1))
+    db.session.add(ExerciseLog(user_id=user_id, exercise_id=exercise_id, duration=20,
+                               calories_burned=150, date=today))
+    record_daily_totals(user_id, today, calories_burned=150)
+    db.session.commit()
+
+    def totals():
+        row = get_daily_summary(user_id)
+        return row.water_ml, row.habits_completed, row.calories_burned
+
+    before = totals()
+    rebuild_daily_summaries([user_id])
+    assert totals() == before == (500, 1, 150)
+    assert db.session.scalar(db.select(db.func.count(DailySummary.id))
+                             .where(DailySummary.user_id == user_id)) == 1
+
+
+def test_activity_snapshot_union(user_id):
+    today = date.today()
+    exercise = db.session.scalars(db.select(Exercise).limit(1)).one()
+    db.session.add(ExerciseLog(user_id=user_id, exercise_id=exercise.id, duration=20,
+                               calories_burned=150, date=today))
+    record_daily_totals(user_id, today, water_ml=500, calories_burned=150)
+    db.session.commit()
+
+    snapshot = _load_activity_snapshot(user_id, today)
+    assert (snapshot['water_ml'], snapshot['calories_burned']) == (500, 150)
+    assert snapshot['exercises'] == [(exercise.name, 20)]
+
+
+def test_returning_counters(user_id):
+    exercise_id = db.session.scalar(db.select(Exercise.id).limit(1))
+    workout = Workout(name='Portable', user_id=user_id)
+    db.session.add(workout)
+    db.session.flush()
+    assert [reserve_exercise_orders(workout.id), reserve_exercise_orders(workout.id, 2)] == [1, 2]
+
+    workout_exercise = WorkoutExercise(workout_id=workout.id, exercise_id=exercise_id, order=1)
+    db.session.add(workout_exercise)
+    db.session.flush()
+    assert reserve_set_numbers(workout_exercise.id, 3) == 1
+    assert reserve_set_numbers(workout_exercise.id, workout_id=workout.id) == 4
+    assert reserve_set_numbers(workout_exercise.id, workout_id=-1) is None
+
+    habit = Habit(name='Stretch', user_id=user_id)
+    db.session.add(habit)
+    db.session.flush()
+    today = date.today()
+    assert [record_habit_completion(habit.id, today - timedelta(days=1)),
+            record_habit_completion(habit.id, today),
+            record_habit_completion(habit.id, today)] == [1, 2, 2]
+    db.session.commit()
+
+
+def test_badge_counter_upserts(user_id):
+    assert [rule.key for rule in record_progress(user_id, foods_logged=1)] == ['foods_logged_1']
+    assert record_progress(user_id, foods_logged=1) == []
+    assert [rule.key for rule in record_best(user_id, best_habit_streak=8)] == ['habit_streak_7']
+    assert record_best(user_id, best_habit_streak=3) == []
+    assert award_due_badges(user_id) == []
+    db.session.commit()
+
+    counters = dict(db.session.execute(db.select(BadgeCounter.name, BadgeCounter.value)
+                                       .where(BadgeCounter.user_id == user_id)).all())
+    assert (counters['foods_logged'], counters['best_habit_streak']) == (2, 8)
+    assert db.session.scalar(db.select(db.func.count(Badge.id)).where(Badge.user_id == user_id)) == 2
+
+
+def test_energy_profiles_from_a_connection(user_id):
+    with db.engine.begin() as conn:
+        conn.execute(db.delete(EnergyProfile).where(EnergyProfile.user_id == user_id))
+        write_missing_energy_profiles(conn)
+    profile = db.session.get(EnergyProfile, user_id)
+    assert profile is not None
+    assert profile.target_calories == energy_targets(**PROFILE)['target_calories']
+
+
+def test_dialect_insert_rejects_other_backends(backend_app, monkeypatch):
+    with backend_app.app_context():
+        monkeypatch.setattr(db.session, 'get_bind',
+                            lambda *args, **kwargs: SimpleNamespace(dialect=SimpleNamespace(name='mysql')))
+        with pytest.raises(NotImplementedError, match='mysql'):
+            dialect_insert(BadgeCounter)
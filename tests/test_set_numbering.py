@@ -0,0 +1,103 @@
+"""Concurrent writers must get contiguous, unique set numbers and exercise orders."""
+
+import threading
+import uuid
+
+import pytest
+
+from app import db
+from app.models import Exercise, ExerciseSet, User, Workout, WorkoutExercise
+
+THREADS = 8
+PER_THREAD = 5
+
+
+def run_concurrently(login, action, threads=THREADS):
+    """Run ``action(client, thread_index)`` from several logged-in threads at once."""
+    clients = [login() for _ in range(threads)]
+    barrier = threading.Barrier(threads)
+    statuses = []
+
+    def worker(index):
+        barrier.wait()
+        statuses.extend(action(clients[index], index))
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return statuses
+
+
+def make_workout(app, username, with_exercise=True):
+    with app.app_context():
+        user = User.query.filter_by(username=username).one()
+        workout = Workout(name='Concurrency', user_id=user.id)
+        db.session.add(workout)
+        db.session.flush()
+        exercise_id = db.session.scalar(db.select(Exercise.id).order_by(Exercise.id).limit(1))
+        workout_exercise_id = None
+        if with_exercise:
+            workout_exercise = WorkoutExercise(workout_id=workout.id, exercise_id=exercise_id, order=1)
+            workout.last_exercise_order = 1
+            db.session.add(workout_exercise)
+            db.session.flush()
+            workout_exercise_id = workout_exercise.id
+        db.session.commit()
+        return workout.id, workout_exercise_id, exercise_id
+
+
+def post_set(client, endpoint, workout_id, workout_exercise_id, exercise_id, reps):
+    if endpoint == 'add_set':
+        return client.post(f'/workout_exercise/{workout_exercise_id}/add_set', json={'reps': reps})
+    if endpoint == 'sets':
+        return client.post(f'/workout/{workout_id}/sets',
+                           json={'sets': [{'workout_exercise_id': workout_exercise_id, 'reps': reps}]})
+    return client.post(f'/workout/{workout_id}/sync', json={'ops': [
+        {'op_id': str(uuid.uuid4()), 'type': 'add_set', 'exercise_id': exercise_id, 'reps': reps}]})
+
+
+@pytest.mark.parametrize('endpoint', ['add_set', 'sets', 'sync'])
+def test_concurrent_sets_are_numbered_contiguously(app, register, endpoint):
+    username, login = register()
+    workout_id, workout_exercise_id, exercise_id = make_workout(app, username)
+
+    statuses = run_concurrently(login, lambda client, _: [
+        post_set(client, endpoint, workout_id, workout_exercise_id, exercise_id, reps).status_code
+        for reps in range(1, PER_THREAD + 1)
+    ])
+
+    assert statuses == [200] * (THREADS * PER_THREAD)
+    with app.app_context():
+        numbers = sorted(db.session.scalars(
+            db.select(ExerciseSet.set_number).where(ExerciseSet.workout_exercise_id == workout_exercise_id)))
+        counter = db.session.get(WorkoutExercise, workout_exercise_id).last_set_number
+    assert numbers == list(range(1, THREADS * PER_THREAD + 1))
+    assert counter == THREADS * PER_THREAD
+
+
+@pytest.mark.parametrize('endpoint', ['add_exercise', 'sync'])
+def test_concurrent_exercises_are_ordered_contiguously(app, register, endpoint):
+    username, login = register()
+    workout_id, _, _ = make_workout(app, username, with_exercise=False)
+    with app.app_context():
+        exercise_ids = list(db.session.scalars(db.select(Exercise.id).order_by(Exercise.id).limit(THREADS)))
+    assert len(exercise_ids) == THREADS
+
+    def add_exercise(client, index):
+        exercise_id = exercise_ids[index]
+        if endpoint == 'add_exercise':
+            response = client.post(f'/workout/{workout_id}/add_exercise', json={'exercise_id': exercise_id})
+        else:
+            response = client.post(f'/workout/{workout_id}/sync', json={'ops': [
+                {'op_id': str(uuid.uuid4()), 'type': 'add_exercise', 'exercise_id': exercise_id}]})
+        return [response.status_code]
+
+    assert run_concurrently(login, add_exercise) == [200] * THREADS
+    with app.app_context():
+        orders = sorted(db.session.scalars(
+            db.select(WorkoutExercise.order).where(WorkoutExercise.workout_id == workout_id)))
+        counter = db.session.get(Workout, workout_id).last_exercise_order
+    assert orders == list(range(1, THREADS + 1))
+    assert counter == THREADS